@@ -2,36 +2,67 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
-from typing import List, Tuple, Optional
+from collections import defaultdict
+from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import csv
+import hashlib
 import tempfile
 import sys
-import io
+import math
+import os
+import threading
 import warnings
 import psutil
 
 import matplotlib
 matplotlib.use('Agg')
+# Ajustes de render fijados una vez por proceso: simplificar trazados y
+# trocearlos acelera el dibujo de contornos de parcela complejos en Agg
+matplotlib.rcParams.update({
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,
+    'agg.path.chunksize': 10000,
+})
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path as MplPath
+from matplotlib.lines import Line2D
+from matplotlib.figure import Figure
+from matplotlib import font_manager
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    import requests_cache
+    REQUESTS_CACHE_AVAILABLE = True
+except ImportError:
+    REQUESTS_CACHE_AVAILABLE = False
+from urllib.parse import urlparse
 import xml.etree.ElementTree as ET
 import geopandas as gpd
+import shapely
 import contextily as cx
 import fiona
-from PIL import Image
-from io import BytesIO
+from PIL import Image, ImageDraw
 from shapely.geometry import box
+from shapely.geometry.polygon import orient
+from pyproj import CRS, Transformer
 
 # Ignorar advertencias de geometrías medidas (M) para limpiar la consola
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# Configurar salida estándar a UTF-8 para evitar errores de emojis en Windows
-if sys.stdout and hasattr(sys.stdout, 'buffer'):
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-if sys.stderr and hasattr(sys.stderr, 'buffer'):
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+# Configurar salida estándar a UTF-8 para evitar errores de emojis en Windows.
+# Se reconfigura el flujo existente en lugar de envolver su búfer: un segundo
+# TextIOWrapper cerraría el búfer compartido al liberarse el primero
+for _flujo in (sys.stdout, sys.stderr):
+    if _flujo and hasattr(_flujo, 'reconfigure'):
+        _flujo.reconfigure(encoding='utf-8', errors='replace')
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CONFIGURACIÓN GLOBAL
@@ -42,10 +73,348 @@ USER_AGENT = (
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0"
 )
 
+# Conexiones HTTP abiertas por host (planos y teselas se piden en paralelo)
+HTTP_POOL = 32
+
+# Peticiones simultáneas máximas contra un mismo servidor (evita ser limitados)
+PETICIONES_POR_HOST = 6
+
+# Exportación tabular: xlsxwriter escribe en streaming (más rápido y ligero que openpyxl)
+EXCEL_ENGINE = "xlsxwriter"
+CSV_CHUNKSIZE = 10000
+
+# Cabecera y cierre de los KML generados, precodificados una sola vez
+_KML_PRE = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+    "<kml xmlns=\"http://www.opengis.net/kml/2.2\">\n"
+    "<Document>\n"
+).encode("utf-8")
+_KML_POST = (
+    "\n"
+    "</Document>\n"
+    "</kml>"
+).encode("utf-8")
+
+# Formatos de capa reconocidos en la carpeta de afecciones
+EXTENSIONES_CAPAS = ('.gpkg', '.shp', '.geojson', '.json', '.kml', '.kmz', '.gml')
+
+# Columnas de atributos que describen una afección (por orden de preferencia)
+COLUMNAS_INTERES = (
+    'nombre', 'name', 'tipo', 'type', 'uso', 'uso_sigpac',
+    'categoria', 'codigo', 'code', 'zona', 'descripcion',
+    'clase', 'class', 'espacio', 'figura'
+)
+
+# Caché en disco de teselas de mapa base (son estáticas y se reutilizan entre expedientes)
+CACHE_TESELAS = Path.home() / ".cache" / "web_mapas"
+try:
+    CACHE_TESELAS.mkdir(parents=True, exist_ok=True)
+    cx.set_cache_dir(str(CACHE_TESELAS))
+except OSError:
+    pass  # Sin permisos: contextily usa su caché temporal por defecto
+
+# Caché HTTP de las imágenes WMS/WMTS: mismo encuadre = misma imagen. Solo se
+# cachean los servicios cartográficos; las consultas catastrales van siempre a red.
+CACHE_WMS_SQLITE = CACHE_TESELAS / "wms.sqlite"
+CACHE_WMS_EXPIRA = 30 * 24 * 3600  # 30 días
+CACHE_WMS_URLS = (
+    "ovc.catastro.meh.es/Cartografia/WMS",
+    "www.ign.es/wms",
+    "www.ign.es/wms-inspire",
+    "www.ign.es/wmts",
+    "wms.mapama.gob.es",
+    "wms-pendientes.idee.es",
+)
+
 # Habilitar soporte para archivos KML en Fiona
 if 'KML' not in fiona.supported_drivers:
     fiona.drvsupport.supported_drivers['KML'] = 'rw'
 
+# Usar pyogrio (lectura/escritura vectorial en C) si está instalado; si no, Fiona
+try:
+    import pyogrio
+    gpd.options.io_engine = "pyogrio"
+    PYOGRIO_AVAILABLE = True
+except ImportError:
+    PYOGRIO_AVAILABLE = False
+
+# Con pyarrow, pyogrio entrega las entidades como tabla Arrow (sin dicts por entidad)
+try:
+    import pyarrow  # noqa: F401
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Copia GeoParquet de capas locales grandes (ya en EPSG:3857): filas ordenadas
+# espacialmente y agrupadas para que el filtro por encuadre salte grupos enteros
+# usando las estadísticas min/max de las columnas de límites
+PARQUET_FILAS_GRUPO = 50_000
+PARQUET_LIMITES = ["_xmin", "_ymin", "_xmax", "_ymax"]
+
+# Las copias se guardan en la caché local, no junto a la capa (FUENTES puede
+# ser de solo lectura o compartida). Capas cuya conversión ha fallado, con la
+# fecha de modificación que tenían, para no reintentarla en cada plano
+CACHE_PARQUET = CACHE_TESELAS / "parquet"
+_PARQUET_FALLIDOS: Dict[Path, int] = {}
+
+# Resolver la fuente por defecto al importar (el fontManager ya se carga con
+# matplotlib; findfont queda cacheado para los títulos y leyendas posteriores)
+font_manager.findfont(font_manager.FontProperties())
+
+# Conexiones simultáneas para descargar las teselas de un mapa base: solo los
+# servicios WMTS públicos españoles admiten muchas; OpenStreetMap y el resto de
+# proveedores de terceros piden no pasar de 2 por cliente
+TESELAS_CONEXIONES = 16
+TESELAS_CONEXIONES_TERCEROS = 2
+TESELAS_HOSTS_PROPIOS = ("ign.es", "idee.es")
+
+# Lado en píxeles del plano catastral (encuadre de 1000 m -> 1 m/píxel)
+PX_CATASTRAL = 1000
+
+
+def _leer_capa(ruta: Path, **kwargs) -> gpd.GeoDataFrame:
+    """
+    Lee una capa vectorial (KML, GPKG, SHP...) por la vía más rápida disponible.
+    
+    Con pyogrio y pyarrow las entidades llegan como tabla Arrow, sin crear un
+    diccionario Python por entidad como hace Fiona (notable en KML con muchas
+    marcas de posición).
+    
+    Args:
+        ruta: Ruta de la capa
+        **kwargs: Argumentos adicionales para gpd.read_file (layer, bbox, columns...)
+        
+    Returns:
+        GeoDataFrame con la capa
+    """
+    if PYOGRIO_AVAILABLE:
+        return gpd.read_file(str(ruta), engine="pyogrio", use_arrow=ARROW_AVAILABLE, **kwargs)
+    return gpd.read_file(str(ruta), **kwargs)
+
+
+def _ruta_parquet(ruta_capa: Path) -> Path:
+    """
+    Ruta en CACHE_PARQUET de la copia GeoParquet de una capa local.
+    
+    El nombre lleva un resumen de la ruta absoluta de la capa, así que dos capas
+    con el mismo nombre en carpetas distintas no comparten copia.
+    
+    Args:
+        ruta_capa: Capa de origen (GPKG, SHP...)
+        
+    Returns:
+        Ruta del GeoParquet (puede no existir todavía)
+    """
+    resumen = hashlib.sha1(str(ruta_capa.resolve()).encode("utf-8")).hexdigest()[:12]
+    return CACHE_PARQUET / f"{ruta_capa.stem}-{resumen}.3857.parquet"
+
+
+def _anillos(geometrias) -> List[np.ndarray]:
+    """
+    Extrae los anillos (exteriores e interiores) de un conjunto de polígonos.
+    
+    Usa las funciones vectorizadas de shapely 2.0: una sola llamada devuelve
+    todas las coordenadas como array (N, 2), que se parte por anillo.
+    
+    Args:
+        geometrias: GeoSeries o array de geometrías poligonales
+        
+    Returns:
+        Lista de arrays (n, 2) con las coordenadas de cada anillo
+    """
+    lineas = shapely.get_parts(shapely.boundary(np.asarray(geometrias)))
+    coords, idx = shapely.get_coordinates(lineas, return_index=True)
+    if len(coords) == 0:
+        return []
+    return np.split(coords, np.flatnonzero(np.diff(idx)) + 1)
+
+
+def _rellenos(geometrias) -> List[MplPath]:
+    """
+    Convierte un conjunto de polígonos en trayectos de matplotlib rellenables.
+    
+    Cada polígono (las multi-geometrías se separan en partes) da un único
+    trayecto compuesto por su anillo exterior y sus huecos, listo para una
+    PatchCollection. Los anillos se orientan (exterior antihorario, huecos
+    horarios) para que matplotlib, que rellena con la regla nonzero, deje los
+    huecos vacíos.
+    
+    Args:
+        geometrias: GeoSeries o array de geometrías poligonales
+        
+    Returns:
+        Lista de trayectos, uno por polígono
+    """
+    poligonos = shapely.get_parts(np.asarray(geometrias))
+    poligonos = poligonos[shapely.get_type_id(poligonos) == 3]
+    return [
+        MplPath.make_compound_path(*(
+            MplPath(shapely.get_coordinates(anillo), closed=True)
+            for anillo in shapely.get_rings(orient(poligono))
+        ))
+        for poligono in poligonos
+    ]
+
+
+def _trazos(geometrias) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Extrae las líneas de un conjunto de geometrías junto con su registro de origen.
+    
+    Las multi-geometrías se separan en partes y de los polígonos se toma el
+    contorno, de modo que el resultado se puede pasar tal cual a una
+    LineCollection y colorear por registro.
+    
+    Args:
+        geometrias: GeoSeries o array de geometrías lineales o poligonales
+        
+    Returns:
+        Tupla (trazos, origen): lista de arrays (n, 2) y, para cada trazo,
+        la posición de la geometría de la que procede
+    """
+    geoms = np.asarray(geometrias)
+    poligonos = np.isin(shapely.get_type_id(geoms), (3, 6))
+    geoms = np.where(poligonos, shapely.boundary(geoms), geoms)
+    partes, origen = shapely.get_parts(geoms, return_index=True)
+    coords, idx = shapely.get_coordinates(partes, return_index=True)
+    if len(coords) == 0:
+        return [], np.empty(0, dtype=int)
+    cortes = np.flatnonzero(np.diff(idx)) + 1
+    return np.split(coords, cortes), origen[idx[np.r_[0, cortes]]]
+
+
+# Reproyección de capas grandes repartida en hilos (pyproj libera el GIL)
+REPROYECCION_HILOS = min(8, os.cpu_count() or 1)
+REPROYECCION_MIN_COORDS = 100_000
+
+
+def _reproyectar(gdf: gpd.GeoDataFrame, epsg: int) -> gpd.GeoDataFrame:
+    """
+    Equivalente a gdf.to_crs(epsg=epsg) que reparte las coordenadas entre hilos.
+    
+    Extrae todas las coordenadas como un único array (N, 2), las transforma por
+    bloques en paralelo y las vuelve a asignar con shapely.set_coordinates. Las
+    capas pequeñas, sin CRS o con Z se delegan en to_crs.
+    
+    Args:
+        gdf: Capa a reproyectar
+        epsg: Código EPSG de destino
+        
+    Returns:
+        Nuevo GeoDataFrame en el CRS de destino
+    """
+    destino = CRS.from_epsg(epsg)
+    if gdf.crs is not None and gdf.crs == destino:
+        return gdf
+    
+    geometrias = np.asarray(gdf.geometry.values).copy()
+    if (gdf.crs is None or REPROYECCION_HILOS < 2
+            or shapely.get_num_coordinates(geometrias).sum() < REPROYECCION_MIN_COORDS
+            or shapely.has_z(geometrias).any()):
+        return gdf.to_crs(epsg=epsg)
+    
+    origen = gdf.crs
+    
+    def transformar(bloque: np.ndarray) -> np.ndarray:
+        # Un Transformer por hilo: los objetos de pyproj no son thread-safe
+        transformer = Transformer.from_crs(origen, destino, always_xy=True)
+        return np.column_stack(transformer.transform(bloque[:, 0], bloque[:, 1]))
+    
+    coords = shapely.get_coordinates(geometrias)
+    with ThreadPoolExecutor(max_workers=REPROYECCION_HILOS) as executor:
+        bloques = list(executor.map(transformar, np.array_split(coords, REPROYECCION_HILOS)))
+    
+    shapely.set_coordinates(geometrias, np.vstack(bloques))
+    return gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=destino))
+
+
+def _conexiones_teselas(source) -> int:
+    """
+    Conexiones simultáneas permitidas para un proveedor de teselas.
+    
+    Args:
+        source: Proveedor de contextily o URL XYZ
+        
+    Returns:
+        TESELAS_CONEXIONES para los servicios IGN/IDEE y
+        TESELAS_CONEXIONES_TERCEROS para el resto (OpenStreetMap, Esri...)
+    """
+    url = source if isinstance(source, str) else source.get("url", "")
+    host = urlparse(url).netloc.lower()
+    if any(host == propio or host.endswith("." + propio) for propio in TESELAS_HOSTS_PROPIOS):
+        return TESELAS_CONEXIONES
+    return TESELAS_CONEXIONES_TERCEROS
+
+
+def _add_basemap(
+    ax,
+    source,
+    zoom="auto",
+    crs: Optional[str] = None,
+    interpolation: str = "bilinear",
+    zorder: int = 1,
+    attribution_size: int = 8
+) -> None:
+    """
+    Equivalente a cx.add_basemap, pero descargando las teselas en paralelo.
+    
+    cx.add_basemap pide las teselas de una en una; cx.bounds2img admite
+    n_connections, así que se obtiene el mosaico con él y se dibuja con imshow.
+    El número de conexiones depende del proveedor (ver _conexiones_teselas).
+    
+    Args:
+        ax: Eje de matplotlib con los límites ya fijados
+        source: Proveedor de contextily o URL XYZ
+        zoom: Nivel de zoom ('auto' para calcularlo según el encuadre)
+        crs: CRS del eje (None o EPSG:3857 = Web Mercator, EPSG:4326 = lon/lat)
+        interpolation: Interpolación de imshow
+        zorder: Orden de dibujo del mapa base
+        attribution_size: Tamaño de letra de la atribución
+    """
+    if crs not in (None, "EPSG:3857", "EPSG:4326"):
+        cx.add_basemap(ax, source=source, zoom=zoom, crs=crs, interpolation=interpolation,
+                       zorder=zorder, attribution_size=attribution_size)
+        return
+    
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    geograficas = crs == "EPSG:4326"
+    img, extent = cx.bounds2img(
+        xlim[0], ylim[0], xlim[1], ylim[1],
+        zoom=zoom, source=source, ll=geograficas,
+        n_connections=_conexiones_teselas(source)
+    )
+    if geograficas:
+        img, extent = cx.warp_tiles(img, extent, t_crs=crs)
+    
+    ax.imshow(img, extent=extent, interpolation=interpolation, zorder=zorder)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    
+    # Mantener la atribución que añade add_basemap para los proveedores conocidos
+    atribucion = source.get("attribution") if isinstance(source, dict) else None
+    if atribucion:
+        cx.add_attribution(ax, atribucion, font_size=attribution_size)
+
+
+def _zoom_para(ancho_m: float, ancho_px: int, minimo: int = 10, maximo: int = 17) -> int:
+    """
+    Nivel de zoom XYZ cuya resolución se ajusta a la del plano final.
+    
+    En Web Mercator una tesela de zoom z tiene 156543.03 / 2**z m/píxel; se
+    busca el z que da ~ancho_m / ancho_px, en lugar del zoom automático de
+    contextily, que suele pedir un nivel más (4 veces más teselas).
+    
+    Args:
+        ancho_m: Ancho del encuadre en unidades EPSG:3857
+        ancho_px: Ancho en píxeles del plano guardado
+        minimo: Zoom mínimo permitido
+        maximo: Zoom máximo permitido
+        
+    Returns:
+        Nivel de zoom entero
+    """
+    zoom = round(math.log2(156543.03 * ancho_px / ancho_m))
+    return max(minimo, min(maximo, zoom))
+
 # ═══════════════════════════════════════════════════════════════════════════
 # CLASE DE DATOS: PARCELA
 # ═══════════════════════════════════════════════════════════════════════════
@@ -125,6 +494,252 @@ class ParcelaData:
         }
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# CLASE DE DATOS: KML MAESTRO PROYECTADO
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class KMLProyectado:
+    """
+    KML maestro del expediente leído y proyectado una sola vez.
+
+    Todos los planos parten de las mismas geometrías, así que se comparten
+    las tres proyecciones en lugar de reproyectar en cada método.
+
+    Attributes:
+        gdf: Parcelas en EPSG:4326 (coordenadas originales del KML)
+        gdf_3857: Parcelas en EPSG:3857 (Web Mercator, teselas y WMS)
+        gdf_25830: Parcelas en EPSG:25830 (UTM 30N, WMS de Catastro)
+        bounds: Límites (minx, miny, maxx, maxy) por código EPSG
+    """
+    gdf: gpd.GeoDataFrame
+    gdf_3857: gpd.GeoDataFrame
+    gdf_25830: gpd.GeoDataFrame
+    bounds: dict = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Calcula los límites de cada proyección una sola vez."""
+        self.bounds = {
+            4326: tuple(self.gdf.total_bounds),
+            3857: tuple(self.gdf_3857.total_bounds),
+            25830: tuple(self.gdf_25830.total_bounds),
+        }
+
+    def get_bounds(self, epsg: int) -> Tuple[float, float, float, float]:
+        """Devuelve (minx, miny, maxx, maxy) de las parcelas en el EPSG indicado."""
+        return self.bounds[epsg]
+
+    def get_centro(self, epsg: int) -> Tuple[float, float]:
+        """Devuelve el centro del encuadre de las parcelas en el EPSG indicado."""
+        minx, miny, maxx, maxy = self.bounds[epsg]
+        return (minx + maxx) / 2, (miny + maxy) / 2
+
+    @property
+    def sindex(self):
+        """Índice espacial de las parcelas en EPSG:3857 (geopandas lo construye en el primer uso)."""
+        return self.gdf_3857.sindex
+
+    @cached_property
+    def union_3857(self):
+        """Unión de todas las parcelas en EPSG:3857 (máscara de recorte), calculada una sola vez."""
+        return self.gdf_3857.geometry.unary_union
+
+    @cached_property
+    def centroide_3857(self) -> Tuple[float, float]:
+        """Centroide de la unión de las parcelas en EPSG:3857, calculado una sola vez."""
+        centroide = self.union_3857.centroid
+        return centroide.x, centroide.y
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ANÁLISIS DE AFECCIONES POR CAPA (EJECUTADO EN PROCESOS HIJOS)
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _analizar_capa(
+    archivo_capa: Path,
+    idx: int,
+    total: int,
+    parcela_utm_wkb: pd.DataFrame,
+    crs: str,
+    area_total_m2: float,
+    carpeta: Path,
+    con_basemap: bool = True
+) -> Tuple[Optional[dict], List[str]]:
+    """
+    Analiza la afección de una capa sobre la parcela y genera su mapa de evidencia.
+
+    Se ejecuta en un proceso hijo: la parcela llega como DataFrame con la
+    geometría en WKB (barato de serializar) y se reconstruye aquí.
+
+    Args:
+        archivo_capa: Ruta al archivo de la capa
+        idx: Posición de la capa (para nombrar el mapa)
+        total: Número total de capas analizadas
+        parcela_utm_wkb: Parcela en EPSG:25830 con la geometría en WKB
+        crs: CRS de la parcela
+        area_total_m2: Área total de la parcela en m²
+        carpeta: Carpeta donde guardar el mapa
+        con_basemap: Descargar mapa base OSM (False: cuadrícula de referencia)
+
+    Returns:
+        Tupla (resultado, mensajes). resultado es None si no hay afección.
+    """
+    nombre_capa = archivo_capa.stem
+    mensajes = [f"\n[{idx}/{total}] 📡 Analizando: {nombre_capa}"]
+
+    try:
+        # Configurar GDAL para restaurar archivos .shx faltantes automáticamente
+        os.environ['SHAPE_RESTORE_SHX'] = 'YES'
+
+        # Reconstruir la parcela desde WKB
+        parcela_df = parcela_utm_wkb.copy()
+        parcela_df['geometry'] = gpd.GeoSeries.from_wkb(parcela_df['geometry'])
+        parcela_utm = gpd.GeoDataFrame(parcela_df, geometry='geometry', crs=crs)
+
+        # Cargar capa
+        capa_gdf = _leer_capa(archivo_capa)
+
+        if capa_gdf.empty:
+            mensajes.append(f"   ⚪ Capa vacía: {nombre_capa}")
+            return None, mensajes
+
+        # Asegurar proyección correcta
+        if capa_gdf.crs is None:
+            mensajes.append(f"   ⚠️  Sin CRS, asumiendo EPSG:25830")
+            capa_gdf.set_crs(epsg=25830, inplace=True)
+        else:
+            capa_gdf = capa_gdf.to_crs(epsg=25830)
+
+        mensajes.append(f"   ↪ Geometrías cargadas: {len(capa_gdf)}")
+
+        # CALCULAR INTERSECCIÓN
+        interseccion = gpd.overlay(
+            parcela_utm,
+            capa_gdf,
+            how='intersection',
+            keep_geom_type=False
+        )
+
+        if interseccion.empty:
+            mensajes.append(f"   ⚪ Sin intersección con {nombre_capa}")
+            return None, mensajes
+
+        # Áreas calculadas una sola vez (se reutilizan en la agrupación por atributo)
+        areas = interseccion.geometry.area
+        area_afectada = areas.sum()
+        porcentaje = (area_afectada / area_total_m2) * 100
+
+        # Si el porcentaje es despreciable, ignorar
+        if porcentaje < 0.01:
+            mensajes.append(f"   ⚪ Afección despreciable (<0.01%) en {nombre_capa}")
+            return None, mensajes
+
+        # ═══════════════════════════════════════════════════════════
+        # ANÁLISIS DE ATRIBUTOS (detectar columnas relevantes)
+        # ═══════════════════════════════════════════════════════════
+        detalles = []
+
+        # Buscar coincidencia case-insensitive con un índice minúsculas → nombre real
+        columnas_lut = {}
+        for col_real in interseccion.columns:
+            columnas_lut.setdefault(str(col_real).lower(), col_real)
+        columna_encontrada = next(
+            (columnas_lut[c] for c in COLUMNAS_INTERES if c in columnas_lut), None
+        )
+
+        if columna_encontrada is not None:
+            # Agrupar por tipo
+            grupos = areas.groupby(interseccion[columna_encontrada]).sum()
+            for etiqueta, sup in grupos.items():
+                detalles.append(f"{etiqueta}: {sup/10000:.4f} ha")
+
+            detalle_texto = " | ".join(detalles[:5])  # Limitar a 5 para legibilidad
+        else:
+            detalle_texto = f"{len(interseccion)} geometría(s) afectada(s)"
+
+        resultado = {
+            'capa': nombre_capa,
+            'archivo': archivo_capa.name,
+            'afecta': 'SÍ',
+            'superficie_ha': round(area_afectada / 10000, 4),
+            'porcentaje': round(porcentaje, 2),
+            'detalle': detalle_texto,
+            'geometrias': len(interseccion)
+        }
+
+        # ═══════════════════════════════════════════════════════════
+        # GENERAR MAPA DE EVIDENCIA
+        # ═══════════════════════════════════════════════════════════
+        fig, ax = plt.subplots(figsize=(12, 10))
+
+        # 1. Capa completa (contexto en gris claro)
+        try:
+            capa_gdf.to_crs(epsg=3857).plot(
+                ax=ax,
+                color='lightgray',
+                alpha=0.3,
+                edgecolor='gray',
+                linewidth=0.5,
+                zorder=1,
+                label='Capa completa'
+            )
+        except:
+            pass
+
+        # 2. Intersección (zona afectada en rojo)
+        interseccion.to_crs(epsg=3857).plot(
+            ax=ax,
+            color='red',
+            alpha=0.6,
+            edgecolor='darkred',
+            linewidth=1.5,
+            zorder=5,
+            label='Zona afectada'
+        )
+
+        # 3. Parcela (borde azul): solo contorno, una LineCollection basta
+        ax.add_collection(LineCollection(
+            _anillos(parcela_utm.to_crs(epsg=3857).geometry),
+            colors="blue", linewidths=3, zorder=10, label="Parcela"
+        ))
+        ax.autoscale_view()
+
+        # 4. Mapa Base (en modo lote se sustituye por una cuadrícula de referencia)
+        if con_basemap:
+            try:
+                _add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik, zoom='auto')
+            except:
+                pass  # Si falla internet, mapa sin fondo
+            ax.set_axis_off()
+        else:
+            ax.grid(True, linestyle=':', linewidth=0.5, alpha=0.6)
+        ax.legend(loc='upper right', fontsize=10)
+        ax.set_title(
+            f"{nombre_capa}\n"
+            f"Afección: {porcentaje:.2f}% ({area_afectada/10000:.4f} ha)\n"
+            f"{detalle_texto[:100]}",  # Limitar longitud
+            fontsize=11,
+            pad=20
+        )
+
+        # Guardar mapa
+        nombre_mapa = f"mapa_afeccion_{idx:02d}_{nombre_capa[:30]}.png"
+        ruta_mapa = carpeta / nombre_mapa
+        plt.savefig(ruta_mapa, dpi=150, bbox_inches='tight')
+        plt.close()
+
+        mensajes.append(f"   ✅ AFECCIÓN DETECTADA: {porcentaje:.2f}%")
+        mensajes.append(f"      ↪ {detalle_texto[:80]}")
+        mensajes.append(f"      ↪ Mapa guardado: {nombre_mapa}")
+        return resultado, mensajes
+
+    except Exception as e:
+        mensajes.append(f"   ❌ Error procesando {nombre_capa}: {str(e)}")
+        import traceback
+        mensajes.append(f"      {traceback.format_exc()}")
+        return None, mensajes
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # CLASE PRINCIPAL: ORQUESTADOR DEL PIPELINE
 # ═══════════════════════════════════════════════════════════════════════════
@@ -142,7 +757,8 @@ class OrquestadorPipeline:
         base_dir: Path,
         fuentes_dir: Optional[Path] = None,
         progress_callback: Optional[callable] = None,
-        geometry_callback: Optional[callable] = None
+        geometry_callback: Optional[callable] = None,
+        basemap_afecciones: bool = True
     ) -> None:
         """
         Inicializa el orquestador y crea las carpetas necesarias.
@@ -152,6 +768,8 @@ class OrquestadorPipeline:
             fuentes_dir: Directorio de FUENTES (por defecto /app/FUENTES en producción)
             progress_callback: Función para reportar progreso (callable)
             geometry_callback: Función para reportar geometrías encontradas (callable)
+            basemap_afecciones: Añadir mapa base OSM a los mapas de afección
+                (desactivar en ejecuciones por lotes)
         """
         self.base_dir = base_dir
         self.inputs = base_dir / "INPUTS"
@@ -169,10 +787,34 @@ class OrquestadorPipeline:
         # Callback para progreso
         self.progress_callback = progress_callback or (lambda x: print(x))
         self.geometry_callback = geometry_callback
+        self.basemap_afecciones = basemap_afecciones
         
-        # Sesión HTTP reutilizable para eficiencia
-        self.session = requests.Session()
+        # Sesión HTTP reutilizable para eficiencia (pool amplio: los planos se piden en paralelo).
+        # Las conexiones keep-alive se reutilizan por host y los 502/503/504 se reintentan.
+        self.session = self._crear_sesion()
         self.session.headers.update({"User-Agent": USER_AGENT})
+        adaptador = HTTPAdapter(
+            pool_connections=HTTP_POOL,
+            pool_maxsize=HTTP_POOL,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+        )
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+        
+        # Un semáforo por servidor: acota la concurrencia total contra cada host
+        self._host_semaphores: Dict[str, threading.Semaphore] = defaultdict(
+            lambda: threading.Semaphore(PETICIONES_POR_HOST)
+        )
+        self._host_lock = threading.Lock()
+        
+        # Los planos se generan en hilos: serializa las llamadas al callback
+        self._log_lock = threading.Lock()
+        
+        # Figuras de matplotlib reutilizadas por hilo de generación de planos
+        self._figuras = threading.local()
+        
+        # KML maestro ya leído y proyectado: {ruta_kml: (mtime_ns, KMLProyectado)}
+        self._gdf_cache: Dict[Path, Tuple[int, KMLProyectado]] = {}
         
         # Crear estructura de directorios
         self.inputs.mkdir(parents=True, exist_ok=True)
@@ -182,6 +824,74 @@ class OrquestadorPipeline:
         self.log(f"📂 Base: {self.base_dir}")
         self.log(f"📦 Fuentes: {self.fuentes}")
 
+    @staticmethod
+    def _crear_sesion() -> requests.Session:
+        """
+        Crea la sesión HTTP, con caché en disco para los servicios WMS/WMTS si
+        requests-cache está instalado.
+        
+        Returns:
+            CachedSession (SQLite, solo GET, stale-if-error) o requests.Session
+        """
+        if not REQUESTS_CACHE_AVAILABLE:
+            return requests.Session()
+        
+        try:
+            return requests_cache.CachedSession(
+                str(CACHE_WMS_SQLITE),
+                backend="sqlite",
+                allowable_methods=("GET",),
+                expire_after=requests_cache.DO_NOT_CACHE,
+                urls_expire_after={url: CACHE_WMS_EXPIRA for url in CACHE_WMS_URLS},
+                stale_if_error=True,
+            )
+        except Exception:
+            # Caché no disponible (sin permisos de escritura, SQLite bloqueado...)
+            return requests.Session()
+
+    def _fetch(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET con la sesión compartida respetando el límite de peticiones por host.
+        
+        Con stream=True el cuerpo se lee después de volver, así que el hueco del
+        host no se libera hasta cerrar la respuesta: usar siempre
+        `with self._fetch(..., stream=True) as r:`.
+        
+        Args:
+            url: URL a consultar
+            **kwargs: Argumentos de requests (params, timeout, stream...)
+            
+        Returns:
+            Respuesta HTTP
+        """
+        host = urlparse(url).netloc
+        with self._host_lock:
+            semaforo = self._host_semaphores[host]
+        if not kwargs.get("stream"):
+            with semaforo:
+                return self.session.get(url, **kwargs)
+        
+        semaforo.acquire()
+        try:
+            respuesta = self.session.get(url, **kwargs)
+        except BaseException:
+            semaforo.release()
+            raise
+        
+        cerrar = respuesta.close
+        liberar = [semaforo.release]
+        
+        def close() -> None:
+            try:
+                cerrar()
+            finally:
+                # Solo la primera vez (close puede llamarse varias veces)
+                while liberar:
+                    liberar.pop()()
+        
+        respuesta.close = close
+        return respuesta
+
     def log(self, mensaje: str) -> None:
         """
         Envía un mensaje al callback de progreso.
@@ -190,7 +900,8 @@ class OrquestadorPipeline:
             mensaje: Mensaje a reportar
         """
         if self.progress_callback:
-            self.progress_callback(mensaje)
+            with self._log_lock:
+                self.progress_callback(mensaje)
 
     def _verificar_memoria(self) -> None:
         """Verifica si el uso de memoria supera el límite de seguridad (70%)."""
@@ -269,54 +980,13 @@ class OrquestadorPipeline:
         
         self._verificar_memoria()
         
-        # FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS (Pasos 9-10)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS")
-        self.log(f"{'─'*80}")
-        self._generar_plano_emplazamiento(carpeta)
-        self._generar_plano_ortofoto(carpeta)
-        
-        self._verificar_memoria()
-        
-        # FASE 7: PLANOS CATASTRALES (Paso 11)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 7: PLANOS CATASTRALES")
-        self.log(f"{'─'*80}")
-        self._generar_plano_catastral(carpeta)
-        
-        # FASE 8: PLANOS IGN DETALLADOS (Paso 12)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 8: PLANOS IGN DETALLADOS")
-        self.log(f"{'─'*80}")
-        self._generar_planos_ign(carpeta)
-        
-        # FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL (Paso 13)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL")
-        self.log(f"{'─'*80}")
-        self._generar_planos_provinciales(carpeta)
-        
-        # FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS (Paso 14)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS")
-        self.log(f"{'─'*80}")
-        self._generar_planos_historicos(carpeta)
-        
-        # FASE 11: PLANOS TEMÁTICOS AMBIENTALES (Pasos 16-17)
+        # FASES 6-12: PLANOS CARTOGRÁFICOS (Pasos 9-19, en paralelo)
         self.log(f"{'─'*80}")
-        self.log(f"FASE 11: PLANOS TEMÁTICOS AMBIENTALES")
+        self.log(f"FASES 6-12: PLANOS CARTOGRÁFICOS (EN PARALELO)")
         self.log(f"{'─'*80}")
-        self._generar_plano_pendientes(carpeta)
+        self._generar_planos(carpeta)
         
         self._verificar_memoria()
-        self._generar_plano_natura2000(carpeta)
-        
-        # FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL (Pasos 18-19)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL")
-        self.log(f"{'─'*80}")
-        self._generar_plano_montes_publicos(carpeta)
-        self._generar_plano_vias_pecuarias(carpeta)
         
         # FASE 13: INFORMES SIGPAC (Paso 20)
         self.log(f"{'─'*80}")
@@ -399,7 +1069,7 @@ class OrquestadorPipeline:
                     "limit": 100
                 }
                 
-                response = self.session.get(url_recintos, params=params, timeout=30)
+                response = self._fetch(url_recintos, params=params, timeout=30)
                 response.raise_for_status()
                 data = response.json()
                 
@@ -500,7 +1170,7 @@ class OrquestadorPipeline:
             # Excel con datos completos
             df_resumen = pd.DataFrame(resumen_recintos)
             excel_path = carpeta / "SIGPAC-RECINTOS-RESUMEN.xlsx"
-            df_resumen.to_excel(excel_path, index=False, engine='openpyxl')
+            df_resumen.to_excel(excel_path, index=False, engine=EXCEL_ENGINE)
             
             # HTML con enlaces clickeables
             html_path = carpeta / "SIGPAC-ENLACES-PDF.html"
@@ -594,50 +1264,11 @@ class OrquestadorPipeline:
             print(f"{'─'*80}")
             self._procesar_afecciones(carpeta)
             
-            # FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS (Pasos 9-10)
-            print(f"\n{'─'*80}")
-            print(f"FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS")
-            print(f"{'─'*80}")
-            self._generar_plano_emplazamiento(carpeta)
-            self._generar_plano_ortofoto(carpeta)
-            
-            # FASE 7: PLANOS CATASTRALES (Paso 11)
-            print(f"\n{'─'*80}")
-            print(f"FASE 7: PLANOS CATASTRALES")
-            print(f"{'─'*80}")
-            self._generar_plano_catastral(carpeta)
-            
-            # FASE 8: PLANOS IGN DETALLADOS (Paso 12)
-            print(f"\n{'─'*80}")
-            print(f"FASE 8: PLANOS IGN DETALLADOS")
-            print(f"{'─'*80}")
-            self._generar_planos_ign(carpeta)
-            
-            # FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL (Paso 13)
-            print(f"\n{'─'*80}")
-            print(f"FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL")
-            print(f"{'─'*80}")
-            self._generar_planos_provinciales(carpeta)
-            
-            # FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS (Paso 14)
-            print(f"\n{'─'*80}")
-            print(f"FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS")
-            print(f"{'─'*80}")
-            self._generar_planos_historicos(carpeta)
-            
-            # FASE 11: PLANOS TEMÁTICOS AMBIENTALES (Pasos 16-17)
-            print(f"\n{'─'*80}")
-            print(f"FASE 11: PLANOS TEMÁTICOS AMBIENTALES")
-            print(f"{'─'*80}")
-            self._generar_plano_pendientes(carpeta)
-            self._generar_plano_natura2000(carpeta)
-            
-            # FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL (Pasos 18-19) 🆕
+            # FASES 6-12: PLANOS CARTOGRÁFICOS (Pasos 9-19, en paralelo)
             print(f"\n{'─'*80}")
-            print(f"FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL 🆕")
+            print(f"FASES 6-12: PLANOS CARTOGRÁFICOS (EN PARALELO)")
             print(f"{'─'*80}")
-            self._generar_plano_montes_publicos(carpeta)
-            self._generar_plano_vias_pecuarias(carpeta)
+            self._generar_planos(carpeta)
             
             # FASE 13: INFORMES SIGPAC (Paso 20)
             print(f"\n{'─'*80}")
@@ -756,7 +1387,7 @@ class OrquestadorPipeline:
         )
         
         try:
-            respuesta = self.session.get(url, timeout=20)
+            respuesta = self._fetch(url, timeout=20)
             respuesta.raise_for_status()
             
             # Verificar que la respuesta es XML y no HTML (error del servidor)
@@ -803,26 +1434,30 @@ class OrquestadorPipeline:
         )
         
         try:
-            respuesta = self.session.get(url, timeout=20)
-            respuesta.raise_for_status()
-            
-            # Verificar que la respuesta es PDF y no HTML
-            content_type = respuesta.headers.get('Content-Type', '').lower()
-            
-            # Si es HTML, probablemente hay un error
-            if 'text/html' in content_type:
-                contenido = respuesta.content.decode('utf-8', errors='ignore')
-                if 'MANTENIMIENTO' in contenido.upper() or 'MAINTENANCE' in contenido.upper():
-                    self.log(f"⚠️ Servicio de Catastro en MANTENIMIENTO - no se pudo descargar PDF para {rc}")
-                else:
-                    self.log(f"⚠️ No se pudo descargar el PDF para {rc} (servidor devolvió HTML)")
-                return
+            # Descarga en streaming: las cabeceras se inspeccionan antes de leer el cuerpo
+            with self._fetch(url, timeout=20, stream=True) as respuesta:
+                respuesta.raise_for_status()
+                
+                # Verificar que la respuesta es PDF y no HTML
+                content_type = respuesta.headers.get('Content-Type', '').lower()
+                
+                # Si es HTML, probablemente hay un error: basta con los primeros 16 KB
+                if 'text/html' in content_type:
+                    inicio = next(respuesta.iter_content(chunk_size=16384), b'')
+                    contenido = inicio.decode('utf-8', errors='ignore').upper()
+                    if 'MANTENIMIENTO' in contenido or 'MAINTENANCE' in contenido:
+                        self.log(f"⚠️ Servicio de Catastro en MANTENIMIENTO - no se pudo descargar PDF para {rc}")
+                    else:
+                        self.log(f"⚠️ No se pudo descargar el PDF para {rc} (servidor devolvió HTML)")
+                    return
+                
+                datos = b''.join(respuesta.iter_content(chunk_size=65536))
             
             # Validación adicional por tamaño (PDFs válidos suelen ser > 8KB)
-            if len(respuesta.content) > 8000:
-                destino.write_bytes(respuesta.content)
+            if len(datos) > 8000:
+                destino.write_bytes(datos)
             else:
-                self.log(f"⚠️ PDF descargado para {rc} parece incompleto (tamaño: {len(respuesta.content)} bytes)")
+                self.log(f"⚠️ PDF descargado para {rc} parece incompleto (tamaño: {len(datos)} bytes)")
             
         except requests.RequestException as exc:
             self.log(f"❌ Error de conexión descargando PDF para {rc}: {exc}")
@@ -859,16 +1494,19 @@ class OrquestadorPipeline:
             pos_list = root.find(".//gml:posList", ns)
             if pos_list is not None and pos_list.text:
                 raw = pos_list.text.split()
-                for i in range(0, len(raw), 2):
-                    lat = float(raw[i])
-                    lon = float(raw[i + 1])
-                    coords.append((lon, lat))  # Guardamos como (lon, lat)
+                # Conversión y emparejado en C: map(float) + slicing, sin indexar por vértice
+                nums = list(map(float, raw))
+                if len(nums) % 2:
+                    raise ValueError(
+                        f"posList de {ruta_xml.name} con un número impar de valores ({len(nums)})"
+                    )
+                coords = list(zip(nums[1::2], nums[0::2]))  # Guardamos como (lon, lat)
                     
         except ET.ParseError as exc:
             self.log(f"❌ XML corrupto o inválido en {ruta_xml.name}")
             self.log(f"   Causa probable: El servidor devolvió HTML en lugar de XML (mantenimiento o error)")
             self.log(f"   Detalle técnico: {exc}")
-        except (ValueError, IndexError) as exc:
+        except ValueError as exc:
             self.log(f"⚠️ Lista de coordenadas incompleta en {ruta_xml.name}")
             self.log(f"   Detalle: {exc}")
             
@@ -890,28 +1528,28 @@ class OrquestadorPipeline:
             carpeta: Carpeta donde guardar los KML
             parcelas: Lista de parcelas a procesar
         """
-        elementos: List[str] = []
+        elementos: List[bytes] = []
         
         for parcela in parcelas:
             if not parcela.has_geometry():
                 continue
                 
-            # Crear Placemark KML para esta parcela
+            # Crear Placemark KML para esta parcela (ya codificado en UTF-8)
             bloque = self._crear_placemark(parcela)
             elementos.append(bloque)
             
             # Guardar KML individual
             archivo_kml = carpeta / f"{parcela.refcat}.kml"
-            archivo_kml.write_text(self._envoltorio_kml(bloque), encoding="utf-8")
+            archivo_kml.write_bytes(self._envoltorio_kml(bloque))
             parcela.rutas["kml"] = str(archivo_kml)
         
         if elementos:
             maestro = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-            maestro.write_text(self._envoltorio_kml("".join(elementos)), encoding="utf-8")
+            maestro.write_bytes(self._envoltorio_kml(b"".join(elementos)))
             self.log(f"🗺️  KML maestro generado: {maestro.name}")
 
     @staticmethod
-    def _crear_placemark(parcela: ParcelaData) -> str:
+    def _crear_placemark(parcela: ParcelaData) -> bytes:
         """
         Crea un elemento Placemark KML para una parcela.
         
@@ -919,7 +1557,7 @@ class OrquestadorPipeline:
             parcela: Datos de la parcela
             
         Returns:
-            String XML con el Placemark
+            XML del Placemark codificado en UTF-8
         """
         # Convertir coordenadas al formato KML: lon,lat,alt
         coords = " ".join(f"{lon},{lat},0" for lon, lat in parcela.geometria)
@@ -936,27 +1574,20 @@ class OrquestadorPipeline:
             f"<coordinates>{coords}</coordinates>"
             "</LinearRing></outerBoundaryIs></Polygon>"
             "</Placemark>"
-        )
+        ).encode("utf-8")
 
     @staticmethod
-    def _envoltorio_kml(contenido: str) -> str:
+    def _envoltorio_kml(contenido: bytes) -> bytes:
         """
         Envuelve el contenido en la estructura XML de un archivo KML válido.
         
         Args:
-            contenido: Contenido (uno o más Placemarks)
+            contenido: Contenido UTF-8 (uno o más Placemarks)
             
         Returns:
-            String con el KML completo
+            Bytes con el KML completo
         """
-        return (
-            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
-            "<kml xmlns=\"http://www.opengis.net/kml/2.2\">\n"
-            "<Document>\n"
-            f"{contenido}\n"
-            "</Document>\n"
-            "</kml>"
-        )
+        return _KML_PRE + contenido + _KML_POST
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 5: GENERACIÓN DE PNG (SILUETAS)
@@ -992,8 +1623,8 @@ class OrquestadorPipeline:
             self._dibujar_parcelas(siluetas, conjunto, title="Conjunto total", color="blue")
             self.log(f"🖼️  PNG conjunto generado: {conjunto.name}")
 
-    @staticmethod
     def _dibujar_parcelas(
+        self,
         lista_parcelas: List[List[Tuple[float, float]]],
         destino: Path,
         *,
@@ -1003,6 +1634,9 @@ class OrquestadorPipeline:
         """
         Dibuja una o más parcelas como siluetas PNG.
         
+        Usa la figura reutilizable del hilo (ver _figura): con una silueta por
+        parcela, crear y cerrar una figura pyplot en cada llamada dominaba el paso.
+        
         Args:
             lista_parcelas: Lista de geometrías (cada una es una lista de coordenadas)
             destino: Ruta donde guardar el PNG
@@ -1012,7 +1646,8 @@ class OrquestadorPipeline:
         if not lista_parcelas:
             return
             
-        fig, ax = plt.subplots(figsize=(6, 6))
+        fig = self._figura((6, 6))
+        ax = fig.add_subplot()
         
         for coords in lista_parcelas:
             x, y = zip(*coords)
@@ -1026,7 +1661,6 @@ class OrquestadorPipeline:
             ax.set_title(title)
         
         fig.savefig(destino, transparent=True, bbox_inches="tight", pad_inches=0)
-        plt.close(fig)
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 6: CREAR TABLAS EXCEL/CSV
@@ -1056,8 +1690,8 @@ class OrquestadorPipeline:
         excel = carpeta / "DATOS_CATASTRALES.xlsx"
         csv_path = carpeta / "DATOS_CATASTRALES.csv"
         
-        df.to_excel(excel, index=False)
-        df.to_csv(csv_path, sep=";", encoding="utf-8-sig", index=False)
+        df.to_excel(excel, index=False, engine=EXCEL_ENGINE)
+        df.to_csv(csv_path, sep=";", encoding="utf-8-sig", index=False, chunksize=CSV_CHUNKSIZE)
         
         self.log(f"📊 Tablas generadas: {excel.name} / {csv_path.name}")
 
@@ -1081,20 +1715,23 @@ class OrquestadorPipeline:
         """
         log_path = carpeta / "log.txt"
         
-        with log_path.open("w", encoding="utf-8") as f:
-            f.write(f"RESUMEN DE EXPEDIENTE: {carpeta.name}\n")
-            f.write(f"FECHA DE PROCESO: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            f.write("-" * 50 + "\n\n")
-            
-            total_m2 = 0
-            for parcela in parcelas:
-                m2 = parcela.info_catastral.get("m2", 0)
-                total_m2 += m2
-                f.write(f"RC: {parcela.refcat} | Superficie: {m2:,.0f} m2 | ({m2/10000:.4f} Ha)\n")
-            
-            f.write("\n" + "-" * 50 + "\n")
-            f.write(f"TOTAL PARCELAS: {len(parcelas)}\n")
-            f.write(f"SUPERFICIE TOTAL: {total_m2:,.0f} m2 | ({total_m2/10000:.4f} Ha)\n")
+        # Acumular las líneas y escribir el archivo de una sola vez
+        partes = [
+            f"RESUMEN DE EXPEDIENTE: {carpeta.name}\n",
+            f"FECHA DE PROCESO: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n",
+            "-" * 50 + "\n\n",
+        ]
+        
+        superficies = [parcela.info_catastral.get("m2", 0) for parcela in parcelas]
+        for parcela, m2 in zip(parcelas, superficies):
+            partes.append(f"RC: {parcela.refcat} | Superficie: {m2:,.0f} m2 | ({m2/10000:.4f} Ha)\n")
+        
+        total_m2 = sum(superficies)
+        partes.append("\n" + "-" * 50 + "\n")
+        partes.append(f"TOTAL PARCELAS: {len(parcelas)}\n")
+        partes.append(f"SUPERFICIE TOTAL: {total_m2:,.0f} m2 | ({total_m2/10000:.4f} Ha)\n")
+        
+        log_path.write_text("".join(partes), encoding="utf-8")
         
         self.log(f"📝 Archivo log.txt generado con éxito.")
 
@@ -1126,17 +1763,18 @@ class OrquestadorPipeline:
             self.log(f"   Crea la carpeta y coloca allí tus archivos .gpkg, .shp, .geojson, etc.")
             return
 
-        resultados = []
+        # {índice de la capa: resultado}, para no depender del orden de llegada
+        resultados_por_capa = {}
 
         try:
             # 1. Cargar Geometría de la Parcela (AOI)
             self.log(f"📍 Cargando parcela desde {archivo_parcela.name}...")
-            parcela_gdf = gpd.read_file(str(archivo_parcela), driver='KML')
-            if parcela_gdf.crs is None:
-                parcela_gdf.crs = "EPSG:4326"
+            kml = self._cargar_kml(carpeta)
+            if kml is None:
+                return
             
-            # Proyectar a UTM 30N (Estándar para España Peninsular)
-            parcela_utm = parcela_gdf.to_crs(epsg=25830)
+            # UTM 30N (Estándar para España Peninsular)
+            parcela_utm = kml.gdf_25830
             area_total_m2 = parcela_utm.area.sum()
             
             self.log(f"   ✓ Área total de la parcela: {area_total_m2/10000:.4f} ha")
@@ -1144,19 +1782,15 @@ class OrquestadorPipeline:
             # ═══════════════════════════════════════════════════════════════
             # BUSCAR AUTOMÁTICAMENTE ARCHIVOS GEOESPACIALES
             # ═══════════════════════════════════════════════════════════════
-            extensiones = ['.gpkg', '.shp', '.geojson', '.json', '.kml', '.kmz', '.gml']
-            archivos_capa = []
-            
-            for ext in extensiones:
-                archivos_capa.extend(carpeta_capas.glob(f"*{ext}"))
-                archivos_capa.extend(carpeta_capas.glob(f"**/*{ext}"))  # Buscar en subcarpetas
-            
-            # Eliminar duplicados y ordenar
-            archivos_capa = sorted(list(set(archivos_capa)))
+            # Un único recorrido del árbol (incluye subcarpetas) filtrando por extensión
+            archivos_capa = sorted(
+                p for p in carpeta_capas.rglob('*')
+                if p.suffix.lower() in EXTENSIONES_CAPAS
+            )
             
             if not archivos_capa:
                 self.log(f"❌ No se encontraron capas geoespaciales en {carpeta_capas}")
-                self.log(f"   Extensiones buscadas: {', '.join(extensiones)}")
+                self.log(f"   Extensiones buscadas: {', '.join(EXTENSIONES_CAPAS)}")
                 return
             
             self.log(f"\n🗂️  Encontradas {len(archivos_capa)} capas para analizar:")
@@ -1168,166 +1802,44 @@ class OrquestadorPipeline:
             # ═══════════════════════════════════════════════════════════════
             self.log(f"\n🌍 Iniciando análisis de afecciones con capas locales...")
 
-            for idx, archivo_capa in enumerate(archivos_capa, 1):
-                nombre_capa = archivo_capa.stem
-                self.log(f"\n[{idx}/{len(archivos_capa)}] 📡 Analizando: {nombre_capa}")
-                
-                try:
-                    # Configurar GDAL para restaurar archivos .shx faltantes automáticamente
-                    import os
-                    os.environ['SHAPE_RESTORE_SHX'] = 'YES'
-                    
-                    # Cargar capa
-                    capa_gdf = gpd.read_file(str(archivo_capa))
-                    
-                    if capa_gdf.empty:
-                        self.log(f"   ⚪ Capa vacía: {nombre_capa}")
-                        continue
-                    
-                    # Asegurar proyección correcta
-                    if capa_gdf.crs is None:
-                        self.log(f"   ⚠️  Sin CRS, asumiendo EPSG:25830")
-                        capa_gdf.set_crs(epsg=25830, inplace=True)
-                    else:
-                        capa_gdf = capa_gdf.to_crs(epsg=25830)
-                    
-                    self.log(f"   ↪ Geometrías cargadas: {len(capa_gdf)}")
-
-                    # CALCULAR INTERSECCIÓN
-                    interseccion = gpd.overlay(
-                        parcela_utm, 
-                        capa_gdf, 
-                        how='intersection', 
-                        keep_geom_type=False
-                    )
-                    
-                    if interseccion.empty:
-                        self.log(f"   ⚪ Sin intersección con {nombre_capa}")
-                        continue
-
-                    area_afectada = interseccion.area.sum()
-                    porcentaje = (area_afectada / area_total_m2) * 100
+            # La parcela viaja a los procesos hijos como WKB + CRS (pickle barato)
+            parcela_utm_wkb = parcela_utm.to_wkb()
+            crs_parcela = parcela_utm.crs.to_string()
+            max_workers = min(8, os.cpu_count() or 1)
+            self.log(f"   ↪ Procesos en paralelo: {max_workers}")
+
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        _analizar_capa,
+                        archivo_capa,
+                        idx,
+                        len(archivos_capa),
+                        parcela_utm_wkb,
+                        crs_parcela,
+                        area_total_m2,
+                        carpeta,
+                        self.basemap_afecciones
+                    ): (idx, archivo_capa)
+                    for idx, archivo_capa in enumerate(archivos_capa, 1)
+                }
 
-                    # Si el porcentaje es despreciable, ignorar
-                    if porcentaje < 0.01:
-                        self.log(f"   ⚪ Afección despreciable (<0.01%) en {nombre_capa}")
+                # Registrar cada capa conforme termina
+                for future in as_completed(futures):
+                    idx, archivo_capa = futures[future]
+                    try:
+                        resultado, mensajes = future.result()
+                    except Exception as e:
+                        self.log(f"   ❌ Error procesando {archivo_capa.stem}: {str(e)}")
                         continue
 
-                    # ═══════════════════════════════════════════════════════════
-                    # ANÁLISIS DE ATRIBUTOS (detectar columnas relevantes)
-                    # ═══════════════════════════════════════════════════════════
-                    detalles = []
-                    
-                    # Buscar columnas que puedan contener información útil
-                    columnas_interes = [
-                        'nombre', 'name', 'tipo', 'type', 'uso', 'uso_sigpac', 
-                        'categoria', 'codigo', 'code', 'zona', 'descripcion',
-                        'clase', 'class', 'espacio', 'figura'
-                    ]
-                    
-                    columna_encontrada = None
-                    for col_buscar in columnas_interes:
-                        # Buscar coincidencia case-insensitive
-                        for col_real in interseccion.columns:
-                            if col_buscar.lower() == col_real.lower():
-                                columna_encontrada = col_real
-                                break
-                        if columna_encontrada:
-                            break
-                    
-                    if columna_encontrada and columna_encontrada in interseccion.columns:
-                        # Agrupar por tipo
-                        grupos = interseccion.groupby(columna_encontrada).apply(
-                            lambda x: x.area.sum()
-                        )
-                        for etiqueta, sup in grupos.items():
-                            detalles.append(f"{etiqueta}: {sup/10000:.4f} ha")
-                        
-                        detalle_texto = " | ".join(detalles[:5])  # Limitar a 5 para legibilidad
-                    else:
-                        detalle_texto = f"{len(interseccion)} geometría(s) afectada(s)"
-
-                    # Guardar resultado
-                    resultados.append({
-                        'capa': nombre_capa,
-                        'archivo': archivo_capa.name,
-                        'afecta': 'SÍ',
-                        'superficie_ha': round(area_afectada / 10000, 4),
-                        'porcentaje': round(porcentaje, 2),
-                        'detalle': detalle_texto,
-                        'geometrias': len(interseccion)
-                    })
-
-                    # ═══════════════════════════════════════════════════════════
-                    # GENERAR MAPA DE EVIDENCIA
-                    # ═══════════════════════════════════════════════════════════
-                    fig, ax = plt.subplots(figsize=(12, 10))
-                    
-                    # 1. Capa completa (contexto en gris claro)
-                    try:
-                        capa_gdf.to_crs(epsg=3857).plot(
-                            ax=ax, 
-                            color='lightgray', 
-                            alpha=0.3, 
-                            edgecolor='gray',
-                            linewidth=0.5,
-                            zorder=1,
-                            label='Capa completa'
-                        )
-                    except:
-                        pass
-                    
-                    # 2. Intersección (zona afectada en rojo)
-                    interseccion.to_crs(epsg=3857).plot(
-                        ax=ax, 
-                        color='red', 
-                        alpha=0.6, 
-                        edgecolor='darkred',
-                        linewidth=1.5,
-                        zorder=5,
-                        label='Zona afectada'
-                    )
-                    
-                    # 3. Parcela (borde azul)
-                    parcela_utm.to_crs(epsg=3857).plot(
-                        ax=ax, 
-                        facecolor="none", 
-                        edgecolor="blue", 
-                        linewidth=3,
-                        zorder=10,
-                        label="Parcela"
-                    )
-                    
-                    # 4. Mapa Base
-                    try:
-                        cx.add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik, zoom='auto')
-                    except:
-                        pass  # Si falla internet, mapa sin fondo
-                    
-                    ax.set_axis_off()
-                    ax.legend(loc='upper right', fontsize=10)
-                    ax.set_title(
-                        f"{nombre_capa}\n"
-                        f"Afección: {porcentaje:.2f}% ({area_afectada/10000:.4f} ha)\n"
-                        f"{detalle_texto[:100]}",  # Limitar longitud
-                        fontsize=11,
-                        pad=20
-                    )
-                    
-                    # Guardar mapa
-                    nombre_mapa = f"mapa_afeccion_{idx:02d}_{nombre_capa[:30]}.png"
-                    ruta_mapa = carpeta / nombre_mapa
-                    plt.savefig(ruta_mapa, dpi=150, bbox_inches='tight')
-                    plt.close()
-                    
-                    self.log(f"   ✅ AFECCIÓN DETECTADA: {porcentaje:.2f}%")
-                    self.log(f"      ↪ {detalle_texto[:80]}")
-                    self.log(f"      ↪ Mapa guardado: {nombre_mapa}")
+                    for mensaje in mensajes:
+                        self.log(mensaje)
+                    if resultado:
+                        resultados_por_capa[idx] = resultado
 
-                except Exception as e:
-                    self.log(f"   ❌ Error procesando {nombre_capa}: {str(e)}")
-                    import traceback
-                    self.log(f"      {traceback.format_exc()}")
+            # Mismo orden que el recorrido secuencial de las capas
+            resultados = [resultados_por_capa[idx] for idx in sorted(resultados_por_capa)]
 
             # ═══════════════════════════════════════════════════════════════
             # EXPORTAR INFORME FINAL
@@ -1335,14 +1847,15 @@ class OrquestadorPipeline:
             if resultados:
                 df = pd.DataFrame(resultados)
                 
-                # Ordenar por porcentaje de afección (mayor a menor)
-                df = df.sort_values('porcentaje', ascending=False)
+                # Ordenar por porcentaje de afección (mayor a menor); orden estable
+                # para que los empates salgan siempre en el mismo orden
+                df = df.sort_values('porcentaje', ascending=False, kind='mergesort')
                 
                 csv_path = carpeta / "afecciones_analisis.csv"
                 excel_path = carpeta / "afecciones_analisis.xlsx"
                 
-                df.to_csv(csv_path, index=False, sep=";", encoding='utf-8-sig')
-                df.to_excel(excel_path, index=False, engine='openpyxl')
+                df.to_csv(csv_path, index=False, sep=";", encoding='utf-8-sig', chunksize=CSV_CHUNKSIZE)
+                df.to_excel(excel_path, index=False, engine=EXCEL_ENGINE)
                 
                 self.log(f"\n📄 ═══════════════════════════════════════")
                 self.log(f"   INFORME DE AFECCIONES GENERADO")
@@ -1368,11 +1881,327 @@ class OrquestadorPipeline:
             import traceback
             self.log(traceback.format_exc())
 
+    # ═══════════════════════════════════════════════════════════════════════
+    # PASOS 9-19: GENERACIÓN DE PLANOS EN PARALELO
+    # ═══════════════════════════════════════════════════════════════════════
+    
+    def _generar_planos(self, carpeta: Path) -> None:
+        """
+        Genera todos los planos cartográficos (pasos 9-19) en paralelo.
+        
+        Cada plano pasa la mayor parte del tiempo esperando peticiones
+        WMS/WMTS y solo comparte la sesión HTTP y el KML, así que se lanzan
+        en un ThreadPoolExecutor. Cada método dibuja sobre su propia Figure
+        (API orientada a objetos), sin tocar el estado global de pyplot.
+        
+        Args:
+            carpeta: Carpeta con el KML maestro y donde guardar los planos
+        """
+        kml = self._cargar_kml(carpeta)
+        if kml is None:
+            return
+
+        generadores = {
+            "PLANO-EMPLAZAMIENTO.jpg": self._generar_plano_emplazamiento,
+            "PLANO-EMPLAZAMIENTO-ORTO.jpg": self._generar_plano_ortofoto,
+            "PLANO-CATASTRAL-map.jpg": self._generar_plano_catastral,
+            "PLANO-IGN-V1/V2.jpg": self._generar_planos_ign,
+            "PLANO-PROVINCIAL-V1-*.jpg": self._generar_planos_provinciales,
+            "PLANO-MTN25/MTN50/CATASTRONES.jpg": self._generar_planos_historicos,
+            "PLANO-PENDIENTES-LEYENDA.jpg": self._generar_plano_pendientes,
+            "PLANO-NATURA-2000.jpg": self._generar_plano_natura2000,
+            "PLANO-MONTES-PUBLICOS.jpg": self._generar_plano_montes_publicos,
+            "PLANO-VIAS-PECUARIAS.jpg": self._generar_plano_vias_pecuarias,
+        }
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = {
+                executor.submit(generador, carpeta, kml): nombre
+                for nombre, generador in generadores.items()
+            }
+            for future in as_completed(futures):
+                nombre = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self.log(f"❌ Error generando {nombre}: {e}")
+
+    def _cargar_kml(self, carpeta: Path) -> Optional[KMLProyectado]:
+        """
+        Lee MAPA_MAESTRO_TOTAL.kml y lo proyecta a EPSG:3857 y EPSG:25830.
+
+        El resultado se guarda en self._gdf_cache y se reutiliza mientras la
+        fecha de modificación del KML no cambie (afecciones y planos leen así
+        el mismo fichero una única vez por expediente).
+
+        Args:
+            carpeta: Carpeta con el KML maestro
+
+        Returns:
+            KMLProyectado, o None si el KML no existe, está vacío o no se puede leer
+        """
+        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
+        if not ruta_kml.exists():
+            self.log(f"⚠️  No se encontró {ruta_kml.name}")
+            return None
+
+        try:
+            mtime = ruta_kml.stat().st_mtime_ns
+            cacheado = self._gdf_cache.get(ruta_kml)
+            if cacheado and cacheado[0] == mtime:
+                return cacheado[1]
+
+            gdf = _leer_capa(ruta_kml)
+            if gdf.empty:
+                self.log("⚠️ KML vacío")
+                return None
+            if gdf.crs is None:
+                gdf.crs = "EPSG:4326"
+
+            kml = KMLProyectado(
+                gdf=gdf,
+                gdf_3857=gdf.to_crs(epsg=3857),
+                gdf_25830=gdf.to_crs(epsg=25830),
+            )
+            # Solo se conserva el expediente en curso para no acumular memoria en lotes
+            self._gdf_cache.clear()
+            self._gdf_cache[ruta_kml] = (mtime, kml)
+            return kml
+        except Exception as e:
+            self.log(f"❌ Error leyendo {ruta_kml.name}: {e}")
+            return None
+
+    def _imagenes_paralelo(self, peticiones: dict, timeout: int = 45) -> dict:
+        """
+        Descarga varias imágenes WMS simultáneas con la sesión compartida.
+        
+        Cada hilo lee y cierra su propia respuesta, de modo que ninguna
+        conexión (ni su hueco en el límite por host) queda retenida mientras
+        se espera al resto de peticiones.
+        
+        Args:
+            peticiones: Diccionario {clave: (url, params)} o
+                {clave: (url, params, tamano)} (ver _leer_imagen)
+            timeout: Timeout de cada petición en segundos
+            
+        Returns:
+            Diccionario {clave: imagen PIL o None si hay error}
+        """
+        with ThreadPoolExecutor(max_workers=len(peticiones)) as executor:
+            futures = {
+                clave: executor.submit(self._descargar_imagen_wms, *peticion, timeout=timeout)
+                for clave, peticion in peticiones.items()
+            }
+            return {clave: future.result() for clave, future in futures.items()}
+
+    def _figura(self, figsize: Tuple[float, float]) -> Figure:
+        """
+        Devuelve una figura del tamaño indicado reutilizada por el hilo actual.
+        
+        Cada plano la limpia al pedirla en lugar de reservar un lienzo Agg nuevo
+        (~10 MB a 12x9 pulgadas y 150 DPI). Al ser local a cada hilo, los planos
+        que se generan en paralelo nunca comparten figura.
+        
+        Args:
+            figsize: Tamaño (ancho, alto) en pulgadas
+            
+        Returns:
+            Figura vacía (sin ejes)
+        """
+        figuras = getattr(self._figuras, "por_tamano", None)
+        if figuras is None:
+            figuras = self._figuras.por_tamano = {}
+        
+        fig = figuras.get(figsize)
+        if fig is None:
+            fig = figuras[figsize] = Figure(figsize=figsize)
+        else:
+            fig.clear()
+        return fig
+
+    @staticmethod
+    def _leer_imagen(respuesta: requests.Response,
+                     tamano: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """
+        Decodifica una imagen leyendo directamente del socket de la respuesta.
+        
+        Con stream=True el cuerpo no se guarda en respuesta.content, así que los
+        bytes comprimidos se liberan en cuanto PIL termina de decodificar.
+        
+        Si se indica el tamaño de destino y el servidor devuelve un JPEG mayor,
+        se decodifica directamente a escala reducida (1/2, 1/4 o 1/8) con
+        Image.draft, que es mucho más barato que decodificar y reescalar.
+        
+        Args:
+            respuesta: Respuesta HTTP pedida con stream=True
+            tamano: Tamaño (ancho, alto) en píxeles en que se va a usar la imagen
+            
+        Returns:
+            Imagen PIL ya cargada en memoria
+        """
+        try:
+            respuesta.raw.decode_content = True
+            img = Image.open(respuesta.raw)
+            if tamano and img.format == "JPEG" and (img.width > tamano[0] or img.height > tamano[1]):
+                img.draft("RGB", tamano)
+            img.load()
+            return img
+        finally:
+            respuesta.close()
+
+    @staticmethod
+    def _tamano_wms(ax, dpi: int) -> Tuple[int, int]:
+        """
+        Calcula los píxeles que ocupará el eje en la imagen final.
+        
+        Pedir al WMS exactamente ese tamaño evita descargar y decodificar
+        píxeles que después se descartan (o reescalar una imagen pequeña).
+        
+        Args:
+            ax: Eje donde se dibujará la imagen WMS
+            dpi: Resolución con la que se guardará la figura
+            
+        Returns:
+            Tupla (ancho, alto) en píxeles
+        """
+        ancho_in, alto_in = ax.figure.get_size_inches()
+        pos = ax.get_position()
+        return round(ancho_in * pos.width * dpi), round(alto_in * pos.height * dpi)
+
+    @staticmethod
+    def _dibujar_contornos_pil(
+        img: Image.Image,
+        gdf: gpd.GeoDataFrame,
+        extent: Tuple[float, float, float, float],
+        color: Tuple[int, int, int],
+        ancho: int = 3
+    ) -> None:
+        """
+        Dibuja el contorno de las parcelas directamente sobre una imagen PIL.
+        
+        Args:
+            img: Imagen georreferenciada (se modifica en el sitio)
+            gdf: Parcelas en el mismo CRS que la imagen
+            extent: Encuadre de la imagen (xmin, ymin, xmax, ymax)
+            color: Color RGB del contorno
+            ancho: Grosor de línea en píxeles
+        """
+        xmin, ymin, xmax, ymax = extent
+        origen = np.array([xmin, ymax])
+        escala = np.array([img.width / (xmax - xmin), -img.height / (ymax - ymin)])
+        draw = ImageDraw.Draw(img)
+        
+        for anillo in _anillos(gdf.geometry):
+            puntos = ((anillo - origen) * escala).ravel().tolist()
+            draw.line(puntos, fill=color, width=ancho, joint="curve")
+
+    @staticmethod
+    def _dibujar_chincheta_pil(
+        img: Image.Image,
+        punto: Tuple[float, float],
+        extent: Tuple[float, float, float, float],
+        color: Tuple[int, int, int],
+        tamano: int = 46
+    ) -> None:
+        """
+        Dibuja la chincheta (triángulo hacia abajo con borde blanco) sobre una imagen PIL.
+        
+        Args:
+            img: Imagen georreferenciada (se modifica en el sitio)
+            punto: Coordenadas (x, y) en el CRS de la imagen
+            extent: Encuadre de la imagen (xmin, ymin, xmax, ymax)
+            color: Color RGB de relleno
+            tamano: Lado del triángulo en píxeles (22 pt a 150 DPI ≈ 46 px)
+        """
+        xmin, ymin, xmax, ymax = extent
+        px = (punto[0] - xmin) / (xmax - xmin) * img.width
+        py = (ymax - punto[1]) / (ymax - ymin) * img.height
+        r = tamano / 2
+        ImageDraw.Draw(img).polygon(
+            [(px - r, py - r), (px + r, py - r), (px, py + r)],
+            fill=color, outline=(255, 255, 255), width=5
+        )
+
+    @staticmethod
+    def _pegar_leyenda_pil(
+        img: Image.Image,
+        leyenda: Image.Image,
+        caja: Tuple[float, float, float, float]
+    ) -> None:
+        """
+        Pega una leyenda escalada dentro de una caja relativa de la imagen.
+        
+        Args:
+            img: Imagen destino (se modifica en el sitio)
+            leyenda: Imagen de la leyenda (GetLegendGraphic)
+            caja: (izquierda, abajo, ancho, alto) en fracciones de la imagen,
+                como en fig.add_axes
+        """
+        izq, abajo, ancho, alto = caja
+        caja_w, caja_h = int(img.width * ancho), int(img.height * alto)
+        escala = min(caja_w / leyenda.width, caja_h / leyenda.height)
+        leyenda = leyenda.convert('RGBA').resize(
+            (max(1, int(leyenda.width * escala)), max(1, int(leyenda.height * escala)))
+        )
+        x = int(img.width * izq) + (caja_w - leyenda.width) // 2
+        y = img.height - int(img.height * abajo) - caja_h + (caja_h - leyenda.height) // 2
+        img.paste(leyenda, (x, y), leyenda)
+
+    @staticmethod
+    def _dibujar_contornos(ax, gdf: gpd.GeoDataFrame, color: str, linewidth: float, zorder: int) -> None:
+        """
+        Dibuja el contorno de las parcelas como una única LineCollection.
+        
+        Equivale a gdf.plot(facecolor='none', ...) pero con una sola llamada de
+        dibujo. No ajusta los límites del eje (se fijan antes en cada plano).
+        
+        Args:
+            ax: Eje de matplotlib
+            gdf: Parcelas en el CRS del eje
+            color: Color del contorno
+            linewidth: Grosor de línea
+            zorder: Orden de dibujo
+        """
+        ax.add_collection(LineCollection(
+            _anillos(gdf.geometry), colors=color, linewidths=linewidth, zorder=zorder
+        ))
+
+    @staticmethod
+    def _dibujar_poligonos(
+        ax,
+        gdf: gpd.GeoDataFrame,
+        facecolor: str,
+        edgecolor: str,
+        linewidth: float,
+        zorder: int,
+        alpha: Optional[float] = None,
+    ) -> None:
+        """
+        Dibuja las parcelas rellenas como una única PatchCollection.
+        
+        Equivale a gdf.plot(facecolor=..., edgecolor=...) pero sobre el eje de
+        la Figure, sin pasar por pyplot (gdf.plot termina en plt.draw(), que
+        no es seguro desde los hilos de generación de planos).
+        
+        Args:
+            ax: Eje de matplotlib
+            gdf: Parcelas en el CRS del eje
+            facecolor: Color de relleno
+            edgecolor: Color del contorno
+            linewidth: Grosor de línea
+            zorder: Orden de dibujo
+            alpha: Transparencia de relleno y contorno
+        """
+        ax.add_collection(PatchCollection(
+            [PathPatch(trayecto) for trayecto in _rellenos(gdf.geometry)], facecolors=facecolor, edgecolors=edgecolor,
+            linewidths=linewidth, alpha=alpha, zorder=zorder
+        ))
+
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 9: PLANO DE EMPLAZAMIENTO (MAPA BASE)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_plano_emplazamiento(self, carpeta: Path) -> None:
+    def _generar_plano_emplazamiento(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de emplazamiento sobre mapa base OpenStreetMap.
         
@@ -1386,26 +2215,18 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar KML
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
+            gdf = kml.gdf
             
             # Configurar figura en formato 4:3
-            fig, ax = plt.subplots(figsize=(12, 9))
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
             
             # Calcular límites con margen
-            minx, miny, maxx, maxy = gdf.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+            minx, miny, maxx, maxy = kml.get_bounds(4326)
+            centro_x, centro_y = kml.get_centro(4326)
             
             ancho_parcelas = (maxx - minx) * 1.8  # Margen 1.8x
             alto_parcelas = (maxy - miny) * 1.8
@@ -1422,16 +2243,15 @@ class OrquestadorPipeline:
             ax.set_ylim(centro_y - alto_final/2, centro_y + alto_final/2)
 
             # Dibujar parcelas en rojo
-            gdf.plot(ax=ax, facecolor='red', alpha=0.3, edgecolor='darkred', linewidth=1.5, zorder=2)
+            self._dibujar_poligonos(ax, gdf, facecolor='red', edgecolor='darkred', linewidth=1.5, zorder=2, alpha=0.3)
             
             # Añadir mapa base OpenStreetMap
-            cx.add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.OpenStreetMap.Mapnik, zorder=1)
+            _add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.OpenStreetMap.Mapnik, zorder=1)
             
             ax.set_axis_off()
             
             ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO.jpg"
-            plt.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
-            plt.close()
+            fig.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
             self.log(f"✅ PLANO-EMPLAZAMIENTO.jpg generado (300 DPI)")
             
         except Exception as e:
@@ -1441,7 +2261,7 @@ class OrquestadorPipeline:
     # PASO 10: PLANO DE EMPLAZAMIENTO (ORTOFOTO)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_plano_ortofoto(self, carpeta: Path) -> None:
+    def _generar_plano_ortofoto(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de emplazamiento sobre ortofoto satelital Esri.
         
@@ -1456,26 +2276,18 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar KML
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
+            gdf = kml.gdf
             
             # Configurar figura en formato 4:3
-            fig, ax = plt.subplots(figsize=(12, 9))
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
             
             # Calcular límites con margen
-            minx, miny, maxx, maxy = gdf.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+            minx, miny, maxx, maxy = kml.get_bounds(4326)
+            centro_x, centro_y = kml.get_centro(4326)
             
             ancho_parcelas = (maxx - minx) * 1.8
             alto_parcelas = (maxy - miny) * 1.8
@@ -1492,16 +2304,15 @@ class OrquestadorPipeline:
             ax.set_ylim(centro_y - alto_final/2, centro_y + alto_final/2)
 
             # Dibujar parcelas en cian (solo borde, sin relleno)
-            gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2.5, zorder=2)
+            self._dibujar_contornos(ax, gdf, 'cyan', 2.5, zorder=2)
             
             # Añadir ortofoto Esri WorldImagery
-            cx.add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.Esri.WorldImagery, zorder=1)
+            _add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.Esri.WorldImagery, zorder=1)
             
             ax.set_axis_off()
             
             ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO-ORTO.jpg"
-            plt.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
-            plt.close()
+            fig.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
             self.log(f"✅ PLANO-EMPLAZAMIENTO-ORTO.jpg generado (300 DPI)")
             
         except Exception as e:
@@ -1511,7 +2322,7 @@ class OrquestadorPipeline:
     # PASO 11: PLANO CATASTRAL (1000m)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_plano_catastral(self, carpeta: Path) -> None:
+    def _generar_plano_catastral(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano catastral con encuadre fijo de 1000m usando WMS de Catastro.
         
@@ -1525,20 +2336,13 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar a UTM 30N
-            gdf = gpd.read_file(str(ruta_kml), driver='KML').to_crs(epsg=25830)
-            b = gdf.total_bounds
+            gdf = kml.gdf_25830
             
             # Calcular encuadre cuadrado de 1000m
-            centro_x = (b[0] + b[2]) / 2
-            centro_y = (b[1] + b[3]) / 2
+            centro_x, centro_y = kml.get_centro(25830)
             lado_cuadrado = 1000  # metros
             
             xmin = centro_x - (lado_cuadrado / 2)
@@ -1554,33 +2358,18 @@ class OrquestadorPipeline:
             url = (
                 f"https://ovc.catastro.meh.es/Cartografia/WMS/ServidorWMS.aspx?"
                 f"SERVICE=WMS&VERSION=1.1.1&REQUEST=GetMap&LAYERS=CATASTRO"
-                f"&SRS=EPSG:25830&BBOX={bbox_str}&WIDTH=1800&HEIGHT=1800&FORMAT=image/png"
+                f"&SRS=EPSG:25830&BBOX={bbox_str}&WIDTH={PX_CATASTRAL}&HEIGHT={PX_CATASTRAL}&FORMAT=image/png"
             )
             
-            r = self.session.get(url, timeout=30)
-            if r.status_code == 200:
-                img_mapa = Image.open(BytesIO(r.content))
-                
-                # Crear figura cuadrada
-                fig = plt.figure(figsize=(10, 10))
-                ax = fig.add_axes([0, 0, 1, 1])
-                ax.imshow(img_mapa, extent=[xmin, xmax, ymin, ymax])
-                
-                # Dibujar parcelas en cian
-                gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5)
-                
-                ax.set_axis_off()
-                ax.set_xlim(xmin, xmax)
-                ax.set_ylim(ymin, ymax)
+            with self._fetch(url, timeout=30, stream=True) as r:
+                img_mapa = self._leer_imagen(r).convert('RGB') if r.status_code == 200 else None
+            if img_mapa is not None:
+                # Dibujar parcelas en cian directamente sobre la imagen WMS
+                self._dibujar_contornos_pil(img_mapa, gdf, (xmin, ymin, xmax, ymax), (0, 255, 255))
                 
                 # Guardar como JPEG
-                buf = BytesIO()
-                plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-                plt.close()
-                buf.seek(0)
-                final_img = Image.open(buf).convert('RGB')
                 nombre_salida = carpeta / "PLANO-CATASTRAL-map.jpg"
-                final_img.save(nombre_salida, "JPEG", quality=85, optimize=True)
+                img_mapa.save(nombre_salida, "JPEG", quality=85, optimize=True, progressive=True)
                 self.log(f"   ✅ Generado correctamente")
             else:
                 self.log(f"   ❌ Error del servidor WMS")
@@ -1591,17 +2380,18 @@ class OrquestadorPipeline:
     # PASO 12: PLANOS IGN (V1 y V2)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_planos_ign(self, carpeta: Path) -> None:
+    def _generar_planos_ign(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
-        Genera planos IGN con zoom fijo 16 y dos variantes de encuadre.
+        Genera planos IGN con dos variantes de encuadre.
         
         Variantes:
-        - V1: Margen de 500m (vista cercana)
-        - V2: Margen de 3000m (vista alejada, contexto)
+        - V1: Margen de 500m, zoom 16 (vista cercana, máximo detalle de topónimos)
+        - V2: Margen de 3000m, zoom 14 (vista alejada, contexto)
         
         Características:
         - Formato 4:3 (12x9 pulgadas)
-        - Zoom 16 fijo (máximo detalle de topónimos)
+        - Zoom ajustado al encuadre: a 150 DPI el V2 no aprovecha más detalle
+          que el de zoom 14 y descarga ~15 veces menos teselas
         - 150 DPI
         - Parcelas en cian
         - Fondo: Mapa Topográfico Nacional del IGN (WMTS)
@@ -1612,22 +2402,12 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar los planos
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar a Web Mercator
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
-            gdf_3857 = gdf.to_crs(epsg=3857)
+            gdf_3857 = kml.gdf_3857
             
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
+            minx, miny, maxx, maxy = kml.get_bounds(3857)
             
             # URL del servicio WMTS del IGN
             ign_url = (
@@ -1637,11 +2417,15 @@ class OrquestadorPipeline:
                 "&TileMatrix={z}&TileCol={x}&TileRow={y}"
             )
             
+            # Una sola figura para ambas variantes (se limpia el eje en cada vuelta)
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
+            
             # Generar ambas variantes
-            for margen, nombre in [(500, "PLANO-IGN-V1.jpg"), (3000, "PLANO-IGN-V2.jpg")]:
-                self.log(f"🗺️  Generando {nombre} (margen {margen}m, zoom 16)...")
+            for margen, nombre, zoom in [(500, "PLANO-IGN-V1.jpg", 16), (3000, "PLANO-IGN-V2.jpg", 14)]:
+                self.log(f"🗺️  Generando {nombre} (margen {margen}m, zoom {zoom})...")
                 
-                fig, ax = plt.subplots(figsize=(12, 9))
+                ax.clear()
                 
                 # Calcular límites con margen
                 x_min, x_max = minx - margen, maxx + margen
@@ -1660,16 +2444,15 @@ class OrquestadorPipeline:
                     ax.set_xlim(cx_coord - ancho_f/2, cx_coord + ancho_f/2)
                     ax.set_ylim(y_min, y_max)
                 
-                # Añadir mapa IGN con zoom 16 fijo
-                cx.add_basemap(ax, source=ign_url, zorder=1, zoom=16)
+                # Añadir mapa IGN con el zoom de la variante
+                _add_basemap(ax, source=ign_url, zorder=1, zoom=zoom)
                 
                 # Dibujar parcelas en cian
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2, zorder=2)
+                self._dibujar_contornos(ax, gdf_3857, 'cyan', 2, zorder=2)
                 ax.set_axis_off()
                 
                 ruta_final = carpeta / nombre
-                plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 80})
-                plt.close()
+                fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 80})
                 self.log(f"   ✅ Generado correctamente")
         except Exception as e:
             self.log(f"❌ Error: {e}")
@@ -1678,7 +2461,7 @@ class OrquestadorPipeline:
     # PASO 13: PLANOS PROVINCIALES (3 variantes)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_planos_provinciales(self, carpeta: Path) -> None:
+    def _generar_planos_provinciales(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera planos de localización provincial con 3 estilos de mapa base.
         
@@ -1701,20 +2484,11 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar los planos
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+            gdf_3857 = kml.gdf_3857
+            centro_x, centro_y = kml.get_centro(3857)
             
             # Definir las 3 variantes de mapa base
             variantes = {
@@ -1723,10 +2497,14 @@ class OrquestadorPipeline:
                 "OSM": cx.providers.OpenStreetMap.Mapnik
             }
             
+            # Una sola figura para las 3 variantes (se limpia el eje en cada vuelta)
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
+            
             for nombre, fuente in variantes.items():
                 self.log(f"🗺️  Generando PLANO-PROVINCIAL-V1-{nombre}.jpg...")
                 
-                fig, ax = plt.subplots(figsize=(12, 9))
+                ax.clear()
                 
                 # Encuadre de 100km
                 ancho_vista = 100000  # metros
@@ -1736,10 +2514,10 @@ class OrquestadorPipeline:
                 ax.set_ylim(centro_y - alto_vista/2, centro_y + alto_vista/2)
                 
                 # Añadir mapa base con zoom 10
-                cx.add_basemap(ax, source=fuente, zoom=10, interpolation='lanczos', zorder=1)
+                _add_basemap(ax, source=fuente, zoom=10, interpolation='lanczos', zorder=1)
                 
                 # Dibujar parcelas en cian (relleno y borde)
-                gdf_3857.plot(ax=ax, color='cyan', edgecolor='cyan', linewidth=3, zorder=3)
+                self._dibujar_poligonos(ax, gdf_3857, facecolor='cyan', edgecolor='cyan', linewidth=3, zorder=3)
                 
                 # Añadir chincheta roja en el centro
                 ax.plot(centro_x, centro_y, marker='v', color='red', markersize=20, 
@@ -1749,9 +2527,8 @@ class OrquestadorPipeline:
                 
                 nombre_archivo = f"PLANO-PROVINCIAL-V1-{nombre}.jpg"
                 ruta_final = carpeta / nombre_archivo
-                plt.savefig(ruta_final, dpi=120, bbox_inches='tight', pad_inches=0, 
+                fig.savefig(ruta_final, dpi=120, bbox_inches='tight', pad_inches=0, 
                            pil_kwargs={'quality': 85, 'optimize': True, 'progressive': True})
-                plt.close()
                 self.log(f"   ✅ Generado correctamente")
         except Exception as e:
             self.log(f"❌ Error provincial: {e}")
@@ -1760,7 +2537,7 @@ class OrquestadorPipeline:
     # PASO 14: PLANOS HISTÓRICOS (MTN25, MTN50, CATASTRONES)
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_planos_historicos(self, carpeta: Path) -> None:
+    def _generar_planos_historicos(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera planos con cartografía histórica del IGN.
         
@@ -1783,20 +2560,11 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar los planos
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+            gdf_3857 = kml.gdf_3857
+            cx, cy = kml.get_centro(3857)
             
             # Encuadre de 5km
             m = 5000
@@ -1811,11 +2579,15 @@ class OrquestadorPipeline:
             
             url_wms = "https://www.ign.es/wms/primera-edicion-mtn"
             
-            for nombre_file, id_capa in capas.items():
-                self.log(f"🛰️  Capturando {nombre_file}...")
-                
-                # Parámetros de la petición WMS
-                params = {
+            # Una sola figura para las 3 capas (se limpia el eje en cada vuelta)
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
+            ancho_px, alto_px = self._tamano_wms(ax, dpi=150)
+            
+            # Las 3 capas se piden a la vez: la latencia es la de la más lenta
+            self.log(f"🛰️  Capturando {', '.join(capas)}...")
+            peticiones = {
+                nombre_file: (url_wms, {
                     "SERVICE": "WMS",
                     "VERSION": "1.3.0",
                     "REQUEST": "GetMap",
@@ -1823,22 +2595,23 @@ class OrquestadorPipeline:
                     "STYLES": "",
                     "CRS": "EPSG:3857",
                     "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                    "WIDTH": "1200",
-                    "HEIGHT": "900",
+                    "WIDTH": str(ancho_px),
+                    "HEIGHT": str(alto_px),
                     "FORMAT": "image/jpeg",
                     "TRANSPARENT": "FALSE"
-                }
-                
+                })
+                for nombre_file, id_capa in capas.items()
+            }
+            imagenes = self._imagenes_paralelo(peticiones, timeout=30)
+            
+            for nombre_file, img in imagenes.items():
                 try:
-                    response = self.session.get(url_wms, params=params, timeout=30)
-                    if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
-                        img = Image.open(BytesIO(response.content))
-                        
-                        fig, ax = plt.subplots(figsize=(12, 9))
+                    if img is not None:
+                        ax.clear()
                         ax.imshow(img, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
                         
                         # Dibujar parcelas en cian
-                        gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5, zorder=10)
+                        self._dibujar_contornos(ax, gdf_3857, 'cyan', 1.5, zorder=10)
                         
                         # Añadir chincheta roja semi-transparente
                         ax.plot(cx, cy, marker='v', color='red', markersize=18, 
@@ -1850,11 +2623,10 @@ class OrquestadorPipeline:
                         
                         nombre_archivo = f"PLANO-{nombre_file}.jpg"
                         ruta_final = carpeta / nombre_archivo
-                        plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 90})
-                        plt.close()
-                        self.log(f"   ✅ Generado correctamente")
+                        fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 90})
+                        self.log(f"   ✅ {nombre_archivo} generado correctamente")
                     else:
-                        self.log(f"   ❌ Error del servidor")
+                        self.log(f"   ❌ Error del servidor ({nombre_file})")
                 except Exception as e:
                     self.log(f"❌ Error: {e}")
         except Exception as e:
@@ -1864,7 +2636,7 @@ class OrquestadorPipeline:
     # PASO 16: PLANO DE PENDIENTES CON LEYENDA
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_plano_pendientes(self, carpeta: Path) -> None:
+    def _generar_plano_pendientes(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de pendientes del terreno con leyenda superpuesta.
         
@@ -1881,20 +2653,11 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+            gdf_3857 = kml.gdf_3857
+            cx, cy = kml.get_centro(3857)
             
             # Encuadre cercano de 500m
             m = 500
@@ -1902,6 +2665,10 @@ class OrquestadorPipeline:
             
             url_wms = "https://wms-pendientes.idee.es/pendientes"
             
+            fig = self._figura((12, 9))
+            ax = fig.subplots()
+            ancho_px, alto_px = self._tamano_wms(ax, dpi=150)
+            
             # Parámetros para el mapa de pendientes
             params_mapa = {
                 "SERVICE": "WMS",
@@ -1911,8 +2678,8 @@ class OrquestadorPipeline:
                 "STYLES": "",
                 "SRS": "EPSG:3857",
                 "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
+                "WIDTH": str(ancho_px),
+                "HEIGHT": str(alto_px),
                 "FORMAT": "image/png",
                 "TRANSPARENT": "FALSE"
             }
@@ -1930,21 +2697,19 @@ class OrquestadorPipeline:
             
             self.log(f"🛰️  Capturando Pendientes y Leyenda...")
             
-            response_mapa = self.session.get(url_wms, params=params_mapa, timeout=45)
-            response_leyenda = self.session.get(url_wms, params=params_leyenda, timeout=45)
+            # Mapa y leyenda en paralelo: la latencia es la de la petición más lenta
+            imagenes = self._imagenes_paralelo({
+                "mapa": (url_wms, params_mapa),
+                "leyenda": (url_wms, params_leyenda),
+            }, timeout=45)
+            img_mapa = imagenes["mapa"]
+            img_leyenda = imagenes["leyenda"]
             
-            if response_mapa.status_code == 200 and 'image' in response_mapa.headers.get('Content-Type', ''):
-                img_mapa = Image.open(BytesIO(response_mapa.content))
-                img_leyenda = None
-                
-                if response_leyenda.status_code == 200 and 'image' in response_leyenda.headers.get('Content-Type', ''):
-                    img_leyenda = Image.open(BytesIO(response_leyenda.content))
-                
-                fig, ax = plt.subplots(figsize=(12, 9))
+            if img_mapa is not None:
                 ax.imshow(img_mapa, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
                 
                 # Dibujar parcelas en azul
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
+                self._dibujar_contornos(ax, gdf_3857, '#0000FF', 1.5, zorder=10)
                 
                 # Chincheta roja con transparencia
                 ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22, 
@@ -1963,8 +2728,7 @@ class OrquestadorPipeline:
                 ax.set_axis_off()
                 
                 ruta_final = carpeta / "PLANO-PENDIENTES-LEYENDA.jpg"
-                plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0)
-                plt.close()
+                fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0)
                 self.log(f"   ✅ Generado correctamente")
         except Exception as e:
             self.log(f"❌ Error: {e}")
@@ -1973,7 +2737,7 @@ class OrquestadorPipeline:
     # PASO 17: PLANO RED NATURA 2000
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _generar_plano_natura2000(self, carpeta: Path) -> None:
+    def _generar_plano_natura2000(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de Red Natura 2000 sobre ortofoto PNOA con leyenda.
         
@@ -1992,20 +2756,11 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            self.log(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
         try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+            gdf_3857 = kml.gdf_3857
+            cx, cy = kml.get_centro(3857)
             
             # Encuadre de 5km
             m = 5000
@@ -2015,6 +2770,9 @@ class OrquestadorPipeline:
             url_natura = "https://wms.mapama.gob.es/sig/Biodiversidad/RedNatura/wms.aspx"
             capa_natura = "PS.ProtectedSite"
             
+            # Tamaño final del plano: 12x9 pulgadas a 150 DPI, sin márgenes
+            ancho_px, alto_px = 12 * 150, 9 * 150
+            
             # Parámetros para la ortofoto base
             params_base = {
                 "SERVICE": "WMS",
@@ -2024,8 +2782,8 @@ class OrquestadorPipeline:
                 "STYLES": "",
                 "SRS": "EPSG:3857",
                 "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
+                "WIDTH": str(ancho_px),
+                "HEIGHT": str(alto_px),
                 "FORMAT": "image/jpeg"
             }
             
@@ -2038,8 +2796,8 @@ class OrquestadorPipeline:
                 "STYLES": "",
                 "SRS": "EPSG:3857",
                 "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
+                "WIDTH": str(ancho_px),
+                "HEIGHT": str(alto_px),
                 "FORMAT": "image/png",
                 "TRANSPARENT": "TRUE"
             }
@@ -2055,51 +2813,42 @@ class OrquestadorPipeline:
             
             self.log(f"🛰️  Generando Plano Natura 2000...")
             
-            response_base = self.session.get(url_pnoa, params=params_base, timeout=45)
-            response_natura = self.session.get(url_natura, params=params_natura, timeout=45)
-            response_leyenda = self.session.get(url_natura, params=params_leyenda, timeout=45)
-            
-            if (response_base.status_code == 200 and response_natura.status_code == 200 and
-                'image' in response_base.headers.get('Content-Type', '') and
-                'image' in response_natura.headers.get('Content-Type', '')):
-                
-                img_base = Image.open(BytesIO(response_base.content))
-                img_natura = Image.open(BytesIO(response_natura.content))
-                img_leyenda = None
-                
-                if response_leyenda.status_code == 200 and 'image' in response_leyenda.headers.get('Content-Type', ''):
-                    img_leyenda = Image.open(BytesIO(response_leyenda.content))
-                
-                # Crear figura sin márgenes
-                fig = plt.figure(figsize=(12, 9))
-                ax = fig.add_axes([0, 0, 1, 1])
+            # Las tres peticiones WMS en paralelo (1 RTT en lugar de 3)
+            imagenes = self._imagenes_paralelo({
+                "base": (url_pnoa, params_base, (ancho_px, alto_px)),
+                "natura": (url_natura, params_natura),
+                "leyenda": (url_natura, params_leyenda),
+            }, timeout=45)
+            img_leyenda = imagenes["leyenda"]
+            
+            if imagenes["base"] is not None and imagenes["natura"] is not None:
+                img_base = imagenes["base"].convert('RGBA')
+                if img_base.size != (ancho_px, alto_px):
+                    img_base = img_base.resize((ancho_px, alto_px))
+                img_natura = imagenes["natura"].convert('RGBA')
+                if img_natura.size != img_base.size:
+                    img_natura = img_natura.resize(img_base.size)
                 
-                # Capa base: ortofoto PNOA
-                ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
+                # Red Natura 2000 con transparencia 70% compuesta sobre la ortofoto
+                img_natura.putalpha(img_natura.getchannel('A').point(lambda a: int(a * 0.7)))
+                img = Image.alpha_composite(img_base, img_natura).convert('RGB')
                 
-                # Capa de Red Natura 2000 con transparencia 70%
-                ax.imshow(img_natura, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], alpha=0.7)
+                # El plano se compone entero con PIL sobre la imagen ya compuesta
+                # (fondo raster a tamaño final y unos pocos contornos)
+                extent = (bbox[0], bbox[1], bbox[2], bbox[3])
                 
                 # Dibujar parcelas en azul
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
+                self._dibujar_contornos_pil(img, gdf_3857, extent, (0, 0, 255), ancho=3)
                 
-                # Chincheta roja con alta opacidad
-                ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
-                        markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=11)
+                # Chincheta roja
+                self._dibujar_chincheta_pil(img, (cx, cy), extent, (204, 0, 0))
                 
                 # Añadir leyenda reducida en esquina inferior izquierda
                 if img_leyenda:
-                    ax_leg = fig.add_axes([0.01, 0.01, 0.10, 0.12])
-                    ax_leg.imshow(img_leyenda, aspect='equal')
-                    ax_leg.axis('off')
-                
-                ax.set_xlim(bbox[0], bbox[2])
-                ax.set_ylim(bbox[1], bbox[3])
-                ax.set_axis_off()
+                    self._pegar_leyenda_pil(img, img_leyenda, (0.01, 0.01, 0.10, 0.12))
                 
                 ruta_final = carpeta / "PLANO-NATURA-2000.jpg"
-                plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0, pil_kwargs={'quality': 95})
-                plt.close()
+                img.save(ruta_final, "JPEG", quality=95, optimize=True, progressive=True)
                 self.log(f"   ✅ Generado correctamente")
         except Exception as e:
             self.log(f"❌ Error: {e}")
@@ -2108,44 +2857,66 @@ class OrquestadorPipeline:
     # PASO 18: PLANO MONTES PÚBLICOS (CMUP) 🆕
     # ═══════════════════════════════════════════════════════════════════════
 
-    def _descargar_imagen_wms(self, url: str, params: dict) -> Optional[Image.Image]:
+    def _descargar_imagen_wms(self, url: str, params: dict,
+                              tamano: Optional[Tuple[int, int]] = None,
+                              timeout: int = 60) -> Optional[Image.Image]:
         """
         Descarga una imagen desde un servicio WMS.
         
         Args:
             url: URL del servicio WMS
             params: Parámetros de la petición
+            tamano: Tamaño de uso de la imagen (ver _leer_imagen); opcional
+            timeout: Timeout de la petición en segundos
             
         Returns:
             Imagen PIL o None si hay error
         """
         try:
-            response = self.session.get(url, params=params, timeout=60)
-            if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
-                return Image.open(BytesIO(response.content))
+            with self._fetch(url, params=params, timeout=timeout, stream=True) as response:
+                if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
+                    return self._leer_imagen(response, tamano)
         except Exception as e:
             self.log(f"Error WMS: {e}")
         return None
 
-    def _descargar_cmup_wfs(self) -> Optional[gpd.GeoDataFrame]:
+    def _descargar_cmup_wfs(
+        self,
+        bbox: Tuple[float, float, float, float],
+        epsg: int = 3857
+    ) -> Optional[gpd.GeoDataFrame]:
         """
         Descarga los polígonos del Catálogo de Montes de Utilidad Pública vía WFS.
         
+        El filtro BBOX se resuelve en el servidor, que solo devuelve los montes
+        que tocan el encuadre en lugar de la capa nacional completa. El encuadre
+        se redondea al metro para que la URL (y por tanto la caché HTTP de la
+        sesión) coincida entre ejecuciones sobre las mismas parcelas.
+        
+        Las geometrías se piden ya en el CRS de destino (SRSNAME), de modo que
+        el servidor reproyecta y el plano no tiene que volver a hacerlo.
+        
+        Args:
+            bbox: Encuadre (minx, miny, maxx, maxy) en el CRS indicado
+            epsg: Código EPSG del encuadre y de las geometrías devueltas
+        
         Returns:
-            GeoDataFrame con los polígonos CMUP o None si hay error
+            GeoDataFrame con los polígonos CMUP (en EPSG:epsg) o None si hay error
         """
         url_wfs = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
         capa_wfs = "IEPF_CMUP:CMUP_Poligono"
+        bbox_str = ",".join(str(round(v)) for v in bbox)
+        srs = f"urn:ogc:def:crs:EPSG::{epsg}"
         
         try:
             url = (
                 f"{url_wfs}?SERVICE=WFS&VERSION=2.0.0&REQUEST=GetFeature&"
-                f"TYPENAME={capa_wfs}&SRSNAME=EPSG:4326"
+                f"TYPENAME={capa_wfs}&SRSNAME={srs}&BBOX={bbox_str},{srs}"
             )
             
             self.log("Descargando CMUP vía WFS...")
             
-            response = self.session.get(url, timeout=60)
+            response = self._fetch(url, timeout=60)
             response.raise_for_status()
 
             # Si el servidor devuelve un error XML, no es un GML válido
@@ -2153,8 +2924,10 @@ class OrquestadorPipeline:
                 self.log(f"El servidor WFS devolvió un error.")
                 return None
 
-            # Leer GML directamente desde la memoria para evitar problemas con archivos temporales
-            gdf = gpd.read_file(response.text, driver="GML")
+            # Leer GML directamente desde memoria (bytes) para evitar archivos temporales
+            gdf = gpd.read_file(response.content)
+            if gdf.crs is None:
+                gdf = gdf.set_crs(epsg=epsg)
             
             self.log(f"{len(gdf)} polígonos descargados...")
             return gdf
@@ -2163,7 +2936,7 @@ class OrquestadorPipeline:
             self.log(f"Error WFS: {e}")
             return None
 
-    def _generar_plano_montes_publicos(self, carpeta: Path) -> None:
+    def _generar_plano_montes_publicos(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de Montes de Utilidad Pública (CMUP/IEPF).
         
@@ -2172,40 +2945,21 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta con KML y donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
         self.log(f"🌲 Generando Plano Montes Públicos (CMUP)...")
         
-        kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        
-        if not kml.exists():
-            self.log("⚠️ KML no encontrado")
-            return
-        
         try:
-            # 1) Leer KML de las parcelas
-            gdf_kml = gpd.read_file(str(kml), driver="KML")
-            if gdf_kml.empty:
-                self.log("⚠️ KML vacío")
-                return
-            
-            gdf_kml_3857 = gdf_kml.to_crs(3857)
-            minx, miny, maxx, maxy = gdf_kml_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+            # 1) Parcelas del KML en Web Mercator
+            gdf_kml_3857 = kml.gdf_3857
+            cx, cy = kml.get_centro(3857)
             
             margin = 5000
             bbox = [cx - margin, cy - margin * 0.75, cx + margin, cy + margin * 0.75]
             
-            # 2) Descargar CMUP vía WFS
-            gdf_cmup = self._descargar_cmup_wfs()
-            if gdf_cmup is None or gdf_cmup.empty:
-                self.log("⚠️ Sin datos CMUP")
-                return
+            # 2) Tamaño final del plano: 12x9 pulgadas a 150 DPI, sin márgenes
+            ancho_px, alto_px = 12 * 150, 9 * 150
             
-            # 3) Recortar CMUP al área del KML
-            gdf_cmup = gdf_cmup.to_crs(3857)
-            gdf_clip = gpd.overlay(gdf_cmup, gdf_kml_3857, how="intersection")
-            
-            # 4) Descargar ortofoto PNOA
             url_pnoa = "https://www.ign.es/wms-inspire/pnoa-ma"
             params_base = {
                 "SERVICE": "WMS",
@@ -2215,13 +2969,11 @@ class OrquestadorPipeline:
                 "STYLES": "",
                 "SRS": "EPSG:3857",
                 "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
+                "WIDTH": str(ancho_px),
+                "HEIGHT": str(alto_px),
                 "FORMAT": "image/jpeg"
             }
-            img_base = self._descargar_imagen_wms(url_pnoa, params_base)
             
-            # 5) Descargar leyenda del WMS de CMUP
             url_wms = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
             capa_wms = "AM.ForestManagementArea"
             
@@ -2232,43 +2984,69 @@ class OrquestadorPipeline:
                 "LAYER": capa_wms,
                 "FORMAT": "image/png"
             }
-            img_leyenda = self._descargar_imagen_wms(url_wms, params_leyenda)
             
-            # 6) Dibujar plano
-            fig = plt.figure(figsize=(12, 9))
-            ax = fig.add_axes([0, 0, 1, 1])
+            # 3) CMUP (WFS), ortofoto PNOA y leyenda en paralelo: son independientes
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futuro_cmup = executor.submit(self._descargar_cmup_wfs, kml.get_bounds(3857), 3857)
+                futuro_base = executor.submit(self._descargar_imagen_wms, url_pnoa, params_base,
+                                              (ancho_px, alto_px))
+                futuro_leyenda = executor.submit(self._descargar_imagen_wms, url_wms, params_leyenda)
+            gdf_cmup = futuro_cmup.result()
+            img_base = futuro_base.result()
+            img_leyenda = futuro_leyenda.result()
+            
+            if gdf_cmup is None:
+                self.log("⚠️ Sin datos CMUP")
+                return
+            
+            # 4) Recortar CMUP al área del KML: un STRtree sobre las geometrías
+            #    descarta los montes que no tocan las parcelas y solo se intersecan
+            #    los candidatos (sin pasar por el DataFrame: solo se dibujan contornos)
+            #    (el WFS ya entrega EPSG:3857; _reproyectar solo actúa si el
+            #    servidor ignorase SRSNAME). El WFS va filtrado al encuadre de las
+            #    parcelas, así que sin montes cerca llega vacío y el plano se genera
+            #    igualmente con ortofoto, parcelas y leyenda
+            candidatos = np.empty(0, dtype=int)
+            if not gdf_cmup.empty:
+                gdf_cmup = _reproyectar(gdf_cmup, 3857)
+                mascara = kml.union_3857
+                geometrias = np.asarray(gdf_cmup.geometry.values)
+                candidatos = shapely.STRtree(geometrias).query(mascara, predicate="intersects")
+            if candidatos.size:
+                recortes = shapely.intersection(geometrias[candidatos], mascara)
+                # Vértices más próximos que un píxel (~5 m) no se ven en el plano
+                recortes = shapely.simplify(recortes, (bbox[2] - bbox[0]) / ancho_px)
+                gdf_clip = gpd.GeoSeries(recortes[~shapely.is_empty(recortes)], crs=gdf_cmup.crs)
+            else:
+                self.log("   Ningún monte público toca las parcelas")
+                gdf_clip = gpd.GeoSeries([], crs="EPSG:3857")
             
-            # Fondo: ortofoto
+            # 5) Componer el plano directamente sobre la ortofoto con PIL
+            #    (una imagen de fondo y unos pocos contornos: no hace falta matplotlib)
+            extent = (bbox[0], bbox[1], bbox[2], bbox[3])
             if img_base:
-                ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
+                img = img_base.convert('RGB')
+                if img.size != (ancho_px, alto_px):
+                    img = img.resize((ancho_px, alto_px))
+            else:
+                img = Image.new('RGB', (ancho_px, alto_px), 'white')
             
             # Polígonos CMUP reales (WFS) en verde
             if not gdf_clip.empty:
-                gdf_clip.plot(ax=ax, facecolor="none", edgecolor="#00AA00",
-                              linewidth=2.0, zorder=10)
+                self._dibujar_contornos_pil(img, gdf_clip, extent, (0, 170, 0), ancho=4)
             
             # Parcelas KML en azul
-            gdf_kml_3857.plot(ax=ax, facecolor="none", edgecolor="#0000FF",
-                              linewidth=1.5, zorder=11)
+            self._dibujar_contornos_pil(img, gdf_kml_3857, extent, (0, 0, 255), ancho=3)
             
             # Marcador rojo
-            ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
-                    markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=12)
+            self._dibujar_chincheta_pil(img, (cx, cy), extent, (204, 0, 0))
             
             # Leyenda en esquina inferior izquierda
             if img_leyenda:
-                ax_leg = fig.add_axes([0.01, 0.01, 0.12, 0.15])
-                ax_leg.imshow(img_leyenda)
-                ax_leg.axis("off")
-            
-            ax.set_xlim(bbox[0], bbox[2])
-            ax.set_ylim(bbox[1], bbox[3])
-            ax.set_axis_off()
+                self._pegar_leyenda_pil(img, img_leyenda, (0.01, 0.01, 0.12, 0.15))
             
             ruta_final = carpeta / "PLANO-MONTES-PUBLICOS.jpg"
-            plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0,
-                        pil_kwargs={'quality': 95})
-            plt.close()
+            img.save(ruta_final, "JPEG", quality=90, optimize=True, progressive=True)
             
             self.log("   ✅ Generado correctamente")
             
@@ -2279,7 +3057,105 @@ class OrquestadorPipeline:
     # PASO 19: PLANO VÍAS PECUARIAS 🆕
     # ═══════════════════════════════════════════════════════════════════════
 
-    def _generar_plano_vias_pecuarias(self, carpeta: Path) -> None:
+    def _leer_vias_pecuarias(self, gpkg_vvpp: Path, area_3857) -> gpd.GeoDataFrame:
+        """
+        Lee las vías pecuarias que tocan un área, en EPSG:3857.
+        
+        Con pyarrow se mantiene en CACHE_PARQUET una copia GeoParquet ya proyectada
+        a EPSG:3857 (se regenera si el GPKG es más reciente). Cada fila lleva sus
+        límites en columnas propias y las filas van ordenadas por curva de
+        Hilbert, así que el filtro por encuadre descarta grupos de filas enteros
+        sin decodificarlos y no hace falta reproyectar en cada ejecución.
+        
+        Sin pyarrow (o si la copia no se puede generar, lo que se recuerda hasta
+        que cambie el GPKG) se lee el GPKG con filtro espacial: el área va como
+        GeoSeries con CRS para que geopandas la reproyecte al CRS del GPKG y,
+        con pyogrio, GDAL usa su índice R-tree.
+        
+        En ambos casos solo se leen la clasificación y la geometría de las vías
+        clasificadas (ver _filtro_vias_pecuarias).
+        
+        Args:
+            gpkg_vvpp: Ruta a RGVP2024.gpkg
+            area_3857: Polígono de búsqueda en EPSG:3857
+            
+        Returns:
+            GeoDataFrame con las vías pecuarias del área en EPSG:3857
+        """
+        mtime_gpkg = gpkg_vvpp.stat().st_mtime_ns
+        if ARROW_AVAILABLE and _PARQUET_FALLIDOS.get(gpkg_vvpp) != mtime_gpkg:
+            ruta_parquet = _ruta_parquet(gpkg_vvpp)
+            try:
+                if not ruta_parquet.exists() or ruta_parquet.stat().st_mtime_ns < mtime_gpkg:
+                    self._convertir_a_parquet(gpkg_vvpp, ruta_parquet,
+                                              **self._filtro_vias_pecuarias(gpkg_vvpp))
+                minx, miny, maxx, maxy = area_3857.bounds
+                vvpp = gpd.read_parquet(ruta_parquet, filters=[
+                    ("_xmax", ">=", minx), ("_xmin", "<=", maxx),
+                    ("_ymax", ">=", miny), ("_ymin", "<=", maxy),
+                ])
+                return vvpp.drop(columns=PARQUET_LIMITES)
+            except Exception as e:
+                _PARQUET_FALLIDOS[gpkg_vvpp] = mtime_gpkg
+                self.log(f"   ⚠️ GeoParquet no disponible, se lee el GPKG: {e}")
+        
+        area = gpd.GeoSeries([area_3857], crs="EPSG:3857")
+        vvpp = _leer_capa(gpkg_vvpp, bbox=area, **self._filtro_vias_pecuarias(gpkg_vvpp))
+        return _reproyectar(vvpp, 3857)
+
+    @staticmethod
+    def _filtro_vias_pecuarias(gpkg_vvpp: Path) -> dict:
+        """
+        Argumentos de lectura para traer solo lo que dibuja el plano de vías pecuarias.
+        
+        Con pyogrio, si la capa tiene FC_CLASIF, GDAL descarta el resto de campos
+        y las vías sin clasificar (que el plano no pinta) antes de construir el
+        GeoDataFrame.
+        
+        Args:
+            gpkg_vvpp: Ruta a RGVP2024.gpkg
+            
+        Returns:
+            Diccionario con columns/where para gpd.read_file (vacío si no aplica)
+        """
+        if not PYOGRIO_AVAILABLE:
+            return {}
+        if "FC_CLASIF" not in pyogrio.read_info(str(gpkg_vvpp))["fields"]:
+            return {}
+        return {"columns": ["FC_CLASIF"], "where": "FC_CLASIF IS NOT NULL"}
+
+    def _convertir_a_parquet(self, ruta_capa: Path, ruta_parquet: Path, **lectura) -> None:
+        """
+        Escribe una capa vectorial como GeoParquet en EPSG:3857 para lecturas por encuadre.
+        
+        Las filas se ordenan por distancia de Hilbert para que cada grupo de
+        PARQUET_FILAS_GRUPO filas cubra una zona compacta, y se añaden los
+        límites de cada geometría (PARQUET_LIMITES) como columnas numéricas.
+        Se escribe en un temporal y se renombra para no dejar copias a medias.
+        
+        Args:
+            ruta_capa: Capa de origen (GPKG, SHP...)
+            ruta_parquet: Ruta del GeoParquet a generar
+            **lectura: Argumentos adicionales para gpd.read_file (columns, where...)
+        """
+        self.log(f"   Generando {ruta_parquet.name} (solo la primera vez)...")
+        ruta_parquet.parent.mkdir(parents=True, exist_ok=True)
+        gdf = _leer_capa(ruta_capa, **lectura)
+        gdf = _reproyectar(gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)], 3857)
+        gdf = gdf.iloc[np.argsort(gdf.geometry.hilbert_distance().to_numpy(), kind="stable")]
+        gdf[PARQUET_LIMITES] = gdf.geometry.bounds.to_numpy()
+        
+        # Temporal con nombre único: dos expedientes pueden generar la misma capa a la vez
+        with tempfile.NamedTemporaryFile(dir=ruta_parquet.parent, prefix=ruta_parquet.name,
+                                         suffix=".tmp", delete=False) as f:
+            temporal = Path(f.name)
+        try:
+            gdf.to_parquet(temporal, index=False, row_group_size=PARQUET_FILAS_GRUPO)
+            os.replace(temporal, ruta_parquet)
+        finally:
+            temporal.unlink(missing_ok=True)
+
+    def _generar_plano_vias_pecuarias(self, carpeta: Path, kml: KMLProyectado) -> None:
         """
         Genera plano de Vías Pecuarias desde GPKG local.
         
@@ -2288,15 +3164,10 @@ class OrquestadorPipeline:
         
         Args:
             carpeta: Carpeta con KML y donde guardar el plano
+            kml: KML maestro ya leído y proyectado (ver _cargar_kml)
         """
         self.log(f"🐄 Generando Plano Vías Pecuarias...")
         
-        kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        
-        if not kml.exists():
-            self.log("⚠️ KML no encontrado")
-            return
-        
         # Ruta al GPKG de Vías Pecuarias
         gpkg_vvpp = self.fuentes / "CAPAS_gpkg" / "afecciones" / "RGVP2024.gpkg"
         
@@ -2305,33 +3176,33 @@ class OrquestadorPipeline:
             return
         
         try:
-            # 1) Leer KML y convertir a EPSG:3857
-            self.log("   Leyendo KML...")
-            gdf = gpd.read_file(str(kml), driver="KML")
-            gdf_3857 = gdf.to_crs(epsg=3857)
+            # 1) Parcelas del KML en EPSG:3857
+            gdf_3857 = kml.gdf_3857
             
             # 2) Calcular área de búsqueda
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
+            minx, miny, maxx, maxy = kml.get_bounds(3857)
             margen = 5000  # 5km de margen
             area_busqueda = box(minx - margen, miny - margen, maxx + margen, maxy + margen)
             
             # 3) Cargar Vías Pecuarias con filtro espacial
             self.log("   Cargando Vías Pecuarias...")
-            vvpp = gpd.read_file(str(gpkg_vvpp), bbox=area_busqueda)
-            vvpp_3857 = vvpp.to_crs(epsg=3857)
+            vvpp_3857 = self._leer_vias_pecuarias(gpkg_vvpp, area_busqueda)
             
             # 4) Crear figura
-            fig = plt.figure(figsize=(12, 12))
+            fig = self._figura((12, 12))
             ax = fig.add_axes([0, 0, 1, 1])
             
             # Establecer límites antes del basemap
             ax.set_xlim(minx - margen, maxx + margen)
             ax.set_ylim(miny - margen, maxy + margen)
             
-            # 5) Añadir fondo OpenStreetMap
+            # 5) Añadir fondo OpenStreetMap (teselas de la caché en disco si ya se pidieron)
             self.log("   Añadiendo basemap...")
             try:
-                cx.add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik)
+                ancho_px, _ = self._tamano_wms(ax, dpi=150)
+                zoom = _zoom_para(maxx - minx + 2 * margen, ancho_px)
+                _add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik, zoom=zoom,
+                             attribution_size=6)
             except Exception as e:
                 self.log(f"⚠️ Error basemap: {e}...")
             
@@ -2339,41 +3210,50 @@ class OrquestadorPipeline:
             if not vvpp_3857.empty:
                 self.log(f"   Encontradas {len(vvpp_3857)} vías...")
                 
-                # Usar columna de clasificación si existe
-                columna_label = "FC_CLASIF" if "FC_CLASIF" in vvpp_3857.columns else None
+                # Color por clasificación (si existe la columna) calculado una vez
+                # por categoría; todas las vías van en una sola LineCollection
+                # Simplificar al tamaño de píxel: los vértices más finos no se ven
+                ancho_px, _ = self._tamano_wms(ax, dpi=150)
+                tolerancia = (maxx - minx + 2 * margen) / ancho_px
+                trazos, origen = _trazos(shapely.simplify(vvpp_3857.geometry.values, tolerancia))
+                if "FC_CLASIF" in vvpp_3857.columns:
+                    clases = vvpp_3857["FC_CLASIF"].to_numpy()
+                    categorias = np.unique(clases[pd.notna(clases)].astype(str))
+                    paleta = dict(zip(categorias, matplotlib.colormaps["viridis"](
+                        np.linspace(0, 1, max(len(categorias), 1)))))
+                    colores = np.array([
+                        paleta.get(str(v), (0, 0, 0, 0)) if pd.notna(v) else (0, 0, 0, 0)
+                        for v in clases
+                    ]).reshape(-1, 4)
+                    colores_trazos = colores[origen]
+                    leyenda = [Line2D([], [], color=paleta[c], linewidth=4, alpha=0.7, label=c)
+                               for c in categorias]
+                else:
+                    colores_trazos = "C0"
+                    leyenda = []
                 
-                vvpp_3857.plot(
-                    ax=ax,
-                    linewidth=4,
-                    column=columna_label,
-                    cmap="viridis",
-                    zorder=5,
-                    alpha=0.7,
-                    legend=True,
-                    legend_kwds={
-                        'loc': 'lower left',
-                        'title': 'Vías Pecuarias',
-                        'fontsize': 'large'
-                    }
-                )
+                ax.add_collection(LineCollection(
+                    trazos, colors=colores_trazos, linewidths=4, alpha=0.7, zorder=5
+                ))
+                if leyenda:
+                    ax.legend(handles=leyenda, loc="lower left", title="Vías Pecuarias",
+                              fontsize="large")
             else:
                 self.log("⚠️ Sin vías pecuarias en esta zona...")
             
             # 7) Dibujar parcela (KML) en azul
-            gdf_3857.plot(ax=ax, facecolor="none", edgecolor="blue",
-                          linewidth=3, zorder=10)
+            self._dibujar_contornos(ax, gdf_3857, "blue", 3, zorder=10)
             
             # 8) Marcador en centroide
-            centro = gdf_3857.geometry.centroid.iloc[0]
-            ax.plot(centro.x, centro.y, marker="v", color="red", markersize=25,
+            centro_x, centro_y = kml.centroide_3857
+            ax.plot(centro_x, centro_y, marker="v", color="red", markersize=25,
                     markeredgecolor="white", markeredgewidth=2, zorder=15)
             
             ax.set_axis_off()
             
             # 9) Guardar
             ruta_final = carpeta / "PLANO-VIAS-PECUARIAS.jpg"
-            plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0)
-            plt.close()
+            fig.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0)
             
             self.log("   ✅ Generado correctamente")
             
@@ -2390,11 +3270,17 @@ if __name__ == "__main__":
     Ejecuta el orquestador desde el directorio donde se encuentra el script.
     
     Uso:
-        python orquestador_completo_final.py
+        python orquestador_completo_final.py [--no-basemap]
     
     El script buscará archivos .txt en la carpeta INPUTS y generará todos
     los productos cartográficos en OUTPUTS.
     """
+    import argparse
+    parser = argparse.ArgumentParser(description='Orquestador pipeline GIS catastral')
+    parser.add_argument('--no-basemap', action='store_true',
+                        help='No descargar mapa base en los mapas de afección (modo lote)')
+    args = parser.parse_args()
+    
     base = Path(__file__).resolve().parent
     
     print(f"\n{'═'*80}")
@@ -2405,7 +3291,7 @@ if __name__ == "__main__":
     print(f"📥 Buscando archivos .txt en: {base / 'INPUTS'}")
     print(f"📤 Resultados se guardarán en: {base / 'OUTPUTS'}\n")
     
-    orquestador = OrquestadorPipeline(base)
+    orquestador = OrquestadorPipeline(base, basemap_afecciones=not args.no_basemap)
     orquestador.run()
     
     print(f"\n{'═'*80}")
@@ -2,6 +2,9 @@
 Módulo catastro4 - Wrapper para CatastroDownloader
 """
 
+import zipfile
+from pathlib import Path
+
 from referenciaspy.catastro_downloader import CatastroDownloader
 
 def procesar_y_comprimir(referencia: str, directorio_base: str = None, buffer_metros: int = None):
@@ -18,10 +21,6 @@ def procesar_y_comprimir(referencia: str, directorio_base: str = None, buffer_me
         resultados = downloader.descargar_todo(referencia, buffer_metros=buffer_metros)
         
         # Crear ZIP con los resultados
-        import zipfile
-        import os
-        from pathlib import Path
-        
         ref_dir = Path(output_dir) / referencia
         zip_path = Path(output_dir) / f"{referencia}.zip"
         
@@ -8,10 +8,19 @@ Módulo optimizado para descarga de información catastral.
 
 import requests
 import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import copy
+import importlib.util
+import io
+import logging
+import math
 import os
+import sqlite3
+import tempfile
+import threading
 from pathlib import Path
 import time
-import xml.etree.ElementTree as ET
 import json
 from io import BytesIO
 from datetime import datetime
@@ -19,48 +28,358 @@ import zipfile
 import shutil
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
+from itertools import chain
 
-# Intentar importar dependencias opcionales
+import numpy as np
+
+# Mensajes de progreso por logging: las líneas de los hilos de un lote no se
+# entremezclan y la aplicación decide dónde y con qué nivel se muestran
+logger = logging.getLogger(__name__)
+
+# lxml (parser C de libxml2) si está instalado; si no, ElementTree estándar
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+# pyproj para el buffer geodésico del BBOX; si no, aproximación esférica
+try:
+    from pyproj import Geod
+    _GEOD = Geod(ellps="WGS84")
+except ImportError:
+    _GEOD = None
+
+# DEFLATE de ISA-L (python-isal) para las entradas comprimidas del ZIP si está
+# instalado; si no, el zlib estándar (ver _ZipFileIsal)
 try:
-    from PIL import Image, ImageDraw
-    PILLOW_AVAILABLE = True
+    from isal import isal_zlib
+    ISAL_AVAILABLE = True
 except ImportError:
-    PILLOW_AVAILABLE = False
-    print("⚠ Pillow no disponible - funciones de imagen deshabilitadas")
+    ISAL_AVAILABLE = False
 
+# orjson (serializador en Rust) si está instalado; si no, json estándar
 try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import cm
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Dependencias opcionales: solo se comprueba que existan; Pillow y ReportLab
+# se importan dentro de las funciones que los usan (los flujos de solo
+# descarga no pagan la carga de sus librerías nativas)
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+if not PILLOW_AVAILABLE:
+    logger.warning("⚠ Pillow no disponible - funciones de imagen deshabilitadas")
+
+REPORTLAB_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+if not REPORTLAB_AVAILABLE:
+    logger.warning("⚠ ReportLab no disponible - generación de PDF deshabilitada")
+
+GML_NS = "http://www.opengis.net/gml/3.2"
+
+# Tamaño de bloque al volcar descargas a disco
+BLOQUE_DESCARGA = 64 * 1024
+
+# Extensiones que ya van comprimidas: en los ZIP se guardan sin DEFLATE
+# (apenas reducen y es donde se iba la CPU al comprimir)
+EXTENSIONES_COMPRIMIDAS = {'.pdf', '.png', '.jpg', '.jpeg', '.zip', '.gz', '.xz', '.zst',
+                           '.webp', '.jp2', '.tif', '.tiff'}
+
+# Cabeceras de formatos comprimidos, para ficheros con extensión poco fiable
+# (gzip, zip, xz, zstd, JPEG, PNG)
+FIRMAS_COMPRIMIDAS = (b'\x1f\x8b', b'PK\x03\x04', b'\xfd7zXZ', b'\x28\xb5\x2f\xfd',
+                      b'\xff\xd8\xff', b'\x89PNG')
+
+# Plantillas del KML de parcela (fijas; la cabecera se rellena con format_map)
+_KML_CABECERA = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>Parcela Catastral {ref}</name>
+    <description>Referencia: {ref}</description>
+    
+    <Style id="punto_style">
+      <IconStyle>
+        <scale>1.2</scale>
+                    <Icon>
+                    <href>https://maps.google.com/mapfiles/kml/paddle/red-circle.png</href>
+                </Icon>
+      </IconStyle>
+    </Style>
+    
+    <Placemark>
+      <name>Centro Parcela</name>
+      <description>
+        <![CDATA[
+        <b>Referencia:</b> {ref}<br/>
+        <b>Coordenadas:</b> {lat:.6f}°, {lon:.6f}°<br/>
+        <b>Catastro:</b> <a href="https://www1.sedecatastro.gob.es/Cartografia/mapa.aspx?refcat={ref}">Ver en Catastro</a><br/>
+        <b>Google Maps:</b> <a href="https://maps.google.com/?q={lat},{lon}">Abrir en Maps</a>
+        ]]>
+      </description>
+      <styleUrl>#punto_style</styleUrl>
+      <Point>
+        <coordinates>{lon},{lat},0</coordinates>
+      </Point>
+    </Placemark>'''
+
+_KML_POLIGONO_INICIO = b'''
+    <Style id="poligono_style">
+      <LineStyle>
+        <color>ff0000ff</color>
+        <width>3</width>
+      </LineStyle>
+      <PolyStyle>
+        <color>4d0000ff</color>
+      </PolyStyle>
+    </Style>
+    
+    <Placemark>
+      <name>Contorno Parcela</name>
+      <styleUrl>#poligono_style</styleUrl>
+      <Polygon>
+        <outerBoundaryIs>
+          <LinearRing>
+            <coordinates>'''
+
+_KML_POLIGONO_FIN = b'''
+            </coordinates>
+          </LinearRing>
+        </outerBoundaryIs>
+      </Polygon>
+    </Placemark>'''
+
+_KML_PIE = b'''
+  </Document>
+</kml>'''
+
+# Tamaño del buffer de escritura de los ZIP y del bloque de lectura por entrada
+BUFFER_ZIP = 2 * 1024 * 1024
+BLOQUE_ZIP = 1024 * 1024
+
+# Formatos del plano catastral por orden de preferencia: el PNG de paleta
+# pesa bastante menos que el RGB y el plano apenas tiene colores
+FORMATOS_PLANO = ("image/png8", "image/png")
+
+if LXML_AVAILABLE:
+    # Consultas XPath compiladas una sola vez para todas las respuestas
+    _CAT_COORD_XP = ET.XPath(".//cat:coord", namespaces={"cat": "http://www.catastro.meh.es/"})
+    _PRIMER_POS_XP = ET.XPath('(.//*[local-name()="pos"])[1]')
+else:
+    _CAT_COORD_XP = _PRIMER_POS_XP = None
+
+
+@lru_cache(maxsize=4096)
+def _buffer_geodesico(lon, lat, buffer_metros):
+    """
+    Devuelve (lon_min, lat_min, lon_max, lat_max) a buffer_metros reales del punto.
+    Las referencias de una misma zona repiten centro, así que se memoiza.
+    """
+    if _GEOD is not None:
+        # Puntos a buffer_metros hacia el este, norte, oeste y sur
+        lons, lats, _ = _GEOD.fwd([lon] * 4, [lat] * 4, [90, 0, 270, 180], [buffer_metros] * 4)
+        return lons[2], lats[3], lons[0], lats[1]
+    buffer_lat = buffer_metros / 111320
+    buffer_lon = buffer_lat / math.cos(math.radians(lat))
+    return lon - buffer_lon, lat - buffer_lat, lon + buffer_lon, lat + buffer_lat
+
+
+def _iterar_archivos(raiz):
+    """Recorre los ficheros bajo raiz con os.scandir (usa el tipo ya leído de cada entrada, sin stat extra)"""
+    pendientes = [str(raiz)]
+    while pendientes:
+        try:
+            entradas = os.scandir(pendientes.pop())
+        except FileNotFoundError:
+            continue
+        with entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    pendientes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    yield entrada.path
+
+
+def _ya_comprimido(ruta):
+    """Indica si un fichero ya va comprimido (por extensión o, si no, por su cabecera)"""
+    if os.path.splitext(ruta)[1].lower() in EXTENSIONES_COMPRIMIDAS:
+        return True
+    try:
+        with open(ruta, 'rb') as f:
+            return f.read(8).startswith(FIRMAS_COMPRIMIDAS)
+    except OSError:
+        return False
+
+
+class _ZipFileIsal(zipfile.ZipFile):
+    """ZipFile que comprime las entradas DEFLATE con ISA-L: mismo formato, bastante menos CPU que zlib"""
+    
+    def _open_to_write(self, zinfo, force_zip64=False):
+        destino = super()._open_to_write(zinfo, force_zip64)
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            # La entrada aún no ha recibido datos: se cambia el compresor zlib por el de ISA-L
+            destino._compressor = isal_zlib.compressobj(
+                isal_zlib.ISAL_DEFAULT_COMPRESSION, isal_zlib.DEFLATED, -15)
+        return destino
+
+
+ZipFile = _ZipFileIsal if ISAL_AVAILABLE else zipfile.ZipFile
+
+
+def _escribir_zip(zip_file, archivos, directorio_base):
+    """Crea un ZIP con los archivos (arcname relativo a directorio_base); GML/KML/JSON con DEFLATE, imágenes y PDF sin comprimir"""
+    # Buffer de 2 MiB sobre el fichero: zipfile hace muchas escrituras pequeñas
+    # por entrada (cabeceras, bloques comprimidos) que así se agrupan
+    with open(zip_file, 'wb', buffering=0) as raw, \
+            io.BufferedWriter(raw, buffer_size=BUFFER_ZIP) as buf, \
+            ZipFile(buf, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+        for archivo in archivos:
+            zinfo = zipfile.ZipInfo.from_file(archivo, os.path.relpath(archivo, directorio_base))
+            zinfo.compress_type = zipfile.ZIP_STORED if _ya_comprimido(archivo) else zipfile.ZIP_DEFLATED
+            # Igual que ZipFile.write pero leyendo de 1 MiB en 1 MiB (write usa 8 KiB):
+            # menos vueltas de bucle y llamadas a zlib/crc32 por entrada
+            with open(archivo, 'rb') as origen, zipf.open(zinfo, 'w') as destino:
+                shutil.copyfileobj(origen, destino, BLOQUE_ZIP)
+
+
+@lru_cache(maxsize=1)
+def _estilos_informe():
+    """Hoja de estilos del informe PDF con los estilos propios (se construye una vez por proceso)"""
     from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
+    from reportlab.lib.enums import TA_CENTER
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-    print("⚠ ReportLab no disponible - generación de PDF deshabilitada")
+    
+    styles = getSampleStyleSheet()
+    
+    # Estilos personalizados
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=colors.darkblue
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        textColor=colors.darkblue
+    )
+    return styles, title_style, heading_style
+
+
+def _escribir_json(ruta, datos):
+    """Escribe un JSON indentado en UTF-8 (orjson si está disponible)"""
+    if ORJSON_AVAILABLE:
+        Path(ruta).write_bytes(orjson.dumps(datos, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+
+
+def _parsear_xml(contenido):
+    """
+    Parsea un documento XML desde bytes (con lxml, sin límite de tamaño para GML grandes).
+    Un documento mal formado (p. ej. una página de error HTML) lanza SyntaxError con ambos parsers.
+    """
+    if LXML_AVAILABLE:
+        # Un parser por llamada: los parsers de lxml no se comparten entre hilos
+        return ET.fromstring(contenido, ET.XMLParser(huge_tree=True))
+    return ET.fromstring(contenido)
+
+
+def _textos_gml(gml_file, etiquetas):
+    """
+    Recorre un GML en streaming y devuelve (etiqueta, texto) de cada elemento
+    gml:<etiqueta> de las indicadas, en una sola pasada.
+    Los elementos ya leídos se liberan, así que no se construye el árbol completo.
+    """
+    tags = {f"{{{GML_NS}}}{etiqueta}": etiqueta for etiqueta in etiquetas}
+    if LXML_AVAILABLE:
+        eventos = ET.iterparse(str(gml_file), events=("end",), tag=list(tags), huge_tree=True)
+    else:
+        eventos = ET.iterparse(str(gml_file), events=("end",))
+    
+    for _, elem in eventos:
+        etiqueta = tags.get(elem.tag)
+        if etiqueta is None:
+            continue
+        texto = elem.text
+        elem.clear()
+        if LXML_AVAILABLE:
+            # Soltar también los hermanos anteriores que el parser mantiene enlazados
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        if texto:
+            yield etiqueta, texto
+
+
+def _primer_pos(root):
+    """Primer elemento <pos> del documento, en cualquier namespace (un solo recorrido)"""
+    if LXML_AVAILABLE:
+        encontrados = _PRIMER_POS_XP(root)
+        return encontrados[0] if encontrados else None
+    for elem in root.iter():
+        if isinstance(elem.tag, str) and (elem.tag == "pos" or elem.tag.endswith("}pos")):
+            return elem
+    return None
+
+
+def _pares(texto):
+    """Convierte el texto de un posList en un array (N, 2); un valor no numérico lanza ValueError"""
+    valores = np.array(texto.split(), dtype=np.float64)
+    return valores[:valores.size - valores.size % 2].reshape(-1, 2)
+
+
+def _buscar_todos(root, xpath, ruta, namespaces):
+    """Devuelve los elementos de la ruta, con la XPath compilada si hay lxml"""
+    if LXML_AVAILABLE:
+        return xpath(root)
+    return root.findall(ruta, namespaces)
 
 
 class CatastroDownloader:
     """
     Descargador optimizado de documentación catastral.
     Con cache HTTP y procesamiento mejorado.
+    Reutilizable entre lotes: usar como context manager o llamar a close() al terminar.
     """
     
-    def __init__(self, output_dir="descargas_catastro", cache_hours=1, max_workers=3):
+    # Formatos del plano que el WMS de Catastro ha rechazado (compartido entre instancias)
+    _formatos_rechazados = set()
+    
+    def __init__(self, output_dir="descargas_catastro", cache_hours=1, max_workers=8):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
         # Configurar cache HTTP (1 hora por defecto)
+        # Solo GET (no hay POST que cachear) y SQLite en modo WAL: con varias
+        # referencias en paralelo las lecturas no esperan a las escrituras
         self.session = requests_cache.CachedSession(
-            'catastro_cache',
+            backend=requests_cache.SQLiteCache('catastro_cache', wal=True),
             expire_after=cache_hours * 3600,
-            allowable_methods=('GET', 'POST'),
+            allowable_methods=('GET',),
             stale_if_error=True
         )
         
-        # Configuración de paralelización
+        # Configuración de paralelización (pool de hilos para toda la vida del
+        # descargador: los hilos se crean bajo demanda y se reutilizan entre lotes)
         self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='catastro')
+        
+        # Pool de conexiones acorde a los hilos (cada referencia lanza varias
+        # descargas a la vez) y reintentos ante errores transitorios del servidor
+        adapter = HTTPAdapter(
+            pool_connections=max_workers * 2,
+            pool_maxsize=max_workers * 8,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # URLs base
         self.base_urls = {
@@ -75,20 +394,43 @@ class CatastroDownloader:
         self._municipio_cache = {}
         self._coordenadas_cache = {}
         
-        print(f"✅ Descargador inicializado. Cache: {cache_hours}h, Workers: {max_workers}")
+        # Cache persistente de coordenadas (sobrevive entre ejecuciones: una
+        # consulta SQLite en lugar de 1-3 peticiones de geocodificación)
+        self._coord_db = self.output_dir / ".coordenadas_cache.sqlite"
+        self._coord_lock = threading.Lock()
+        self._coord_expira = 30 * 24 * 3600  # 30 días
+        
+        logger.info(f"✅ Descargador inicializado. Cache: {cache_hours}h, Workers: {max_workers}")
+    
+    def close(self):
+        """Libera el pool de hilos y la sesión HTTP"""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+    
+    def __enter__(self):
+        return self
     
-    def limpiar_referencia(self, ref):
-        """Limpia referencia catastral"""
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def limpiar_referencia(ref):
+        """Limpia referencia catastral (con cache)"""
         return ref.replace(" ", "").replace("-", "").strip().upper()
     
-    @lru_cache(maxsize=100)
-    def extraer_del_mun(self, ref):
-        """Extrae delegación y municipio (con cache)"""
-        ref = self.limpiar_referencia(ref)
-        if len(ref) >= 5:
-            return ref[:2], ref[2:5]
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _dividir_del_mun(ref_limpia):
+        """Separa delegación y municipio de una referencia ya limpia (con cache)"""
+        if len(ref_limpia) >= 5:
+            return ref_limpia[:2], ref_limpia[2:5]
         return "", ""
     
+    def extraer_del_mun(self, ref):
+        """Extrae delegación y municipio"""
+        return self._dividir_del_mun(self.limpiar_referencia(ref))
+    
     def obtener_coordenadas_unificado(self, referencia):
         """
         Método unificado para obtener coordenadas.
@@ -96,29 +438,82 @@ class CatastroDownloader:
         """
         ref = self.limpiar_referencia(referencia)
         
-        # Verificar cache
+        # Verificar cache (memoria y después disco)
         if ref in self._coordenadas_cache:
             return self._coordenadas_cache[ref]
         
-        metodos = [
-            self._obtener_coordenadas_json,
-            self._obtener_coordenadas_gml,
-            self._obtener_coordenadas_xml
-        ]
-        
-        for metodo in metodos:
-            try:
-                coords = metodo(ref)
+        coords = self._leer_coordenadas_cache(ref)
+        if coords:
+            self._coordenadas_cache[ref] = coords
+            return coords
+        
+        # JSON y XML dan el centroide (xcen/ycen): se piden a la vez, pero se
+        # respeta la prioridad (el XML solo cuenta si el JSON falla). El GML da
+        # un vértice del polígono, no el centro, así que solo se consulta si
+        # fallan los dos
+        centroides = [self._obtener_coordenadas_json, self._obtener_coordenadas_xml]
+        executor = ThreadPoolExecutor(max_workers=len(centroides))
+        intentos = [(metodo, executor.submit(metodo, ref).result) for metodo in centroides]
+        intentos.append((self._obtener_coordenadas_gml, lambda: self._obtener_coordenadas_gml(ref)))
+        try:
+            for metodo, obtener in intentos:
+                try:
+                    coords = obtener()
+                except Exception:
+                    continue
                 if coords:
                     self._coordenadas_cache[ref] = coords
-                    print(f"  ✓ Coordenadas obtenidas ({metodo.__name__})")
+                    self._guardar_coordenadas_cache(ref, coords)
+                    logger.info(f"  ✓ Coordenadas obtenidas ({metodo.__name__})")
                     return coords
-            except Exception as e:
-                continue
+        finally:
+            # No esperar a la consulta XML si el JSON ya respondió
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        print(f"  ✗ No se pudieron obtener coordenadas para {ref}")
+        logger.error(f"  ✗ No se pudieron obtener coordenadas para {ref}")
         return None
     
+    def _conectar_coordenadas_cache(self):
+        """Abre la base SQLite de coordenadas (una conexión por uso: sirve desde cualquier hilo)"""
+        conn = sqlite3.connect(str(self._coord_db), timeout=10)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS coordenadas "
+            "(ref TEXT PRIMARY KEY, datos TEXT NOT NULL, fecha REAL NOT NULL)"
+        )
+        return conn
+    
+    def _leer_coordenadas_cache(self, ref):
+        """Devuelve las coordenadas guardadas en disco para la referencia (o None)"""
+        try:
+            with self._coord_lock:
+                conn = self._conectar_coordenadas_cache()
+                try:
+                    fila = conn.execute(
+                        "SELECT datos FROM coordenadas WHERE ref = ? AND fecha > ?",
+                        (ref, time.time() - self._coord_expira)
+                    ).fetchone()
+                finally:
+                    conn.close()
+            return json.loads(fila[0]) if fila else None
+        except (sqlite3.Error, ValueError):
+            return None
+    
+    def _guardar_coordenadas_cache(self, ref, coords):
+        """Guarda en disco las coordenadas obtenidas para la referencia"""
+        try:
+            with self._coord_lock:
+                conn = self._conectar_coordenadas_cache()
+                try:
+                    with conn:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO coordenadas (ref, datos, fecha) VALUES (?, ?, ?)",
+                            (ref, json.dumps(coords), time.time())
+                        )
+                finally:
+                    conn.close()
+        except sqlite3.Error:
+            pass
+    
     def _obtener_coordenadas_json(self, ref):
         """Obtener coordenadas desde servicio JSON"""
         url = f"https://ovc.catastro.meh.es/OVCServWeb/OVCWcfCallejero/COVCCallejero.svc/json/Geo_RCToWGS84/{ref}"
@@ -149,31 +544,24 @@ class CatastroDownloader:
         try:
             response = self.session.get(self.base_urls['inspire_wfs'], params=params, timeout=15)
             if response.status_code == 200:
-                root = ET.fromstring(response.content)
+                root = _parsear_xml(response.content)
                 
-                # Buscar coordenadas en múltiples namespaces
-                namespaces = {
-                    "gml": "http://www.opengis.net/gml/3.2",
-                    "cp": "http://inspire.ec.europa.eu/schemas/cp/4.0",
-                    "gmd": "http://www.isotc211.org/2005/gmd",
-                }
-                
-                for ns_uri in namespaces.values():
-                    pos_list = root.findall(f".//{{{ns_uri}}}pos")
-                    if pos_list:
-                        coords_text = pos_list[0].text.strip().split()
-                        if len(coords_text) >= 2:
-                            v1, v2 = float(coords_text[0]), float(coords_text[1])
-                            
-                            # Determinar si es (lat, lon) o (lon, lat)
-                            if 36 <= v1 <= 44 and -10 <= v2 <= 5:
-                                lat, lon = v1, v2
-                            elif 36 <= v2 <= 44 and -10 <= v1 <= 5:
-                                lat, lon = v2, v1
-                            else:
-                                lat, lon = v1, v2
-                            
-                            return {"lon": lon, "lat": lat, "srs": "EPSG:4326", "fuente": "GML"}
+                # Primer <pos> del documento, sea cual sea su namespace
+                pos = _primer_pos(root)
+                if pos is not None and pos.text:
+                    coords_text = pos.text.strip().split()
+                    if len(coords_text) >= 2:
+                        v1, v2 = float(coords_text[0]), float(coords_text[1])
+                        
+                        # Determinar si es (lat, lon) o (lon, lat)
+                        if 36 <= v1 <= 44 and -10 <= v2 <= 5:
+                            lat, lon = v1, v2
+                        elif 36 <= v2 <= 44 and -10 <= v1 <= 5:
+                            lat, lon = v2, v1
+                        else:
+                            lat, lon = v1, v2
+                        
+                        return {"lon": lon, "lat": lat, "srs": "EPSG:4326", "fuente": "GML"}
         except:
             pass
         return None
@@ -186,10 +574,11 @@ class CatastroDownloader:
         try:
             response = self.session.get(url, params=params, timeout=15)
             if response.status_code == 200:
-                root = ET.fromstring(response.content)
+                root = _parsear_xml(response.content)
                 ns = {"cat": "http://www.catastro.meh.es/"}
                 
-                coord_element = root.find(".//cat:coord", ns)
+                coord_elements = _buscar_todos(root, _CAT_COORD_XP, ".//cat:coord", ns)
+                coord_element = coord_elements[0] if coord_elements else None
                 if coord_element is not None:
                     geo = coord_element.find("cat:geo", ns)
                     if geo is not None:
@@ -208,34 +597,102 @@ class CatastroDownloader:
         """
         Calcula BBOX optimizado para WMS.
         Prioriza polígono si existe, sino usa punto central.
+        Devuelve el dict de _bbox_wms con las cadenas 1.1.1/1.3.0 ya formateadas.
         """
         if coords_poligono and len(coords_poligono) > 1:
             # Calcular bbox del polígono
-            lons = [c[1] if self._es_latitud(c[0]) else c[0] for c in coords_poligono]
-            lats = [c[0] if self._es_latitud(c[0]) else c[1] for c in coords_poligono]
-            
-            lon_min, lon_max = min(lons), max(lons)
-            lat_min, lat_max = min(lats), max(lats)
+            lonlat = self._lon_lat(coords_poligono)
+            lon_min, lat_min = lonlat.min(axis=0).tolist()
+            lon_max, lat_max = lonlat.max(axis=0).tolist()
             
             # Añadir buffer (10% del tamaño)
             lon_buffer = (lon_max - lon_min) * 0.1
             lat_buffer = (lat_max - lat_min) * 0.1
             
-            return f"{lon_min - lon_buffer},{lat_min - lat_buffer},{lon_max + lon_buffer},{lat_max + lat_buffer}"
+            return self._bbox_wms((lon_min - lon_buffer, lat_min - lat_buffer,
+                                   lon_max + lon_buffer, lat_max + lat_buffer))
         
         elif coords_centrales:
             # Usar punto central con buffer fijo
             lon, lat = coords_centrales["lon"], coords_centrales["lat"]
-            buffer_lon = buffer_metros / 85000
-            buffer_lat = buffer_metros / 111000
-            
-            return f"{lon - buffer_lon},{lat - buffer_lat},{lon + buffer_lon},{lat + buffer_lat}"
+            return self._bbox_wms(_buffer_geodesico(round(lon, 6), round(lat, 6), buffer_metros))
         
         return None
     
+    @staticmethod
+    def _bbox_wms(bbox):
+        """
+        Normaliza un bbox (tupla lon/lat, cadena 'minx,miny,maxx,maxy' o dict ya normalizado)
+        a {'wms11': ..., 'wms13': ..., 'tuple': (lon_min, lat_min, lon_max, lat_max)}.
+        WMS 1.3.0 con EPSG:4326 invierte los ejes (lat, lon).
+        """
+        if isinstance(bbox, dict):
+            return bbox
+        if isinstance(bbox, str):
+            bbox = [float(x) for x in bbox.split(",")]
+        lon_min, lat_min, lon_max, lat_max = bbox
+        return {
+            'wms11': f"{lon_min},{lat_min},{lon_max},{lat_max}",
+            'wms13': f"{lat_min},{lon_min},{lat_max},{lon_max}",
+            'tuple': (lon_min, lat_min, lon_max, lat_max),
+        }
+    
     def _es_latitud(self, valor):
-        """Determina si un valor es probablemente latitud"""
-        return 36 <= valor <= 44
+        """Determina si un valor (o un array de valores) es probablemente latitud"""
+        return (valor >= 36) & (valor <= 44)
+    
+    def _lon_lat(self, coords_poligono):
+        """
+        Devuelve los vértices como array (N, 2) en orden (lon, lat).
+        El orden de ejes depende del SRS y no cambia dentro de un polígono,
+        así que se decide una sola vez con el primer vértice.
+        """
+        if coords_poligono and isinstance(coords_poligono[0][0], (list, tuple)):
+            coords_poligono = [c for anillo in coords_poligono for c in anillo]
+        coords = np.asarray(coords_poligono, dtype=np.float64).reshape(-1, 2)
+        if len(coords) and self._es_latitud(coords[0, 0]):
+            coords = coords[:, ::-1]
+        return coords
+    
+    @staticmethod
+    def _guardar_imagen(img, ruta):
+        """
+        Guarda una imagen con contorno priorizando la velocidad de codificación:
+        PNG con zlib nivel 1 y JPEG calidad 85 (4:2:0) sin pasada de optimización
+        """
+        extension = Path(ruta).suffix.lower()
+        if extension == '.png':
+            img.save(ruta, "PNG", compress_level=1)
+        elif extension in ('.jpg', '.jpeg'):
+            img.save(ruta, "JPEG", quality=85, optimize=False, progressive=False, subsampling=2)
+        else:
+            img.save(ruta)
+    
+    def _normalizar(self, coords_poligono, bbox):
+        """Posición relativa (0-1) de los vértices en el bbox (minx, miny, maxx, maxy), con y hacia abajo"""
+        minx, miny, maxx, maxy = bbox
+        lonlat = self._lon_lat(coords_poligono)
+        return np.column_stack((
+            (lonlat[:, 0] - minx) / (maxx - minx),
+            (maxy - lonlat[:, 1]) / (maxy - miny),
+        ))
+    
+    @staticmethod
+    def _escalar(normalizados, tamano):
+        """
+        Pasa posiciones relativas a píxeles de una imagen de tamano (ancho, alto).
+        Devuelve la lista plana [x0, y0, x1, y1, ...] que aceptan draw.line/polygon
+        (sin una tupla por vértice), con el anillo ya cerrado (último = primero):
+        un polígono dibujable tiene al menos 8 valores.
+        """
+        pixeles = (normalizados * np.asarray(tamano)).astype(np.int32)
+        if len(pixeles):
+            pixeles = np.vstack((pixeles, pixeles[:1]))
+        return pixeles.ravel().tolist()
+    
+    def _a_pixeles(self, coords_poligono, bbox, tamano):
+        """Convierte los vértices a píxeles (x, y), en anillo cerrado, de una imagen que cubre el bbox (minx, miny, maxx, maxy)"""
+        return self._escalar(self._normalizar(coords_poligono, bbox), tamano)
     
     def descargar_paralelo(self, referencias, callback=None):
         """
@@ -251,26 +708,27 @@ class CatastroDownloader:
         resultados = []
         total = len(referencias)
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Enviar todas las tareas
-            futures = {
-                executor.submit(self.descargar_todo, ref): ref 
-                for ref in referencias
-            }
-            
-            # Procesar resultados conforme se completan
-            for i, future in enumerate(as_completed(futures), 1):
-                ref = futures[future]
-                try:
-                    resultado = future.result(timeout=300)  # 5 minutos por referencia
-                    resultados.append((ref, resultado))
-                    
-                    if callback:
-                        callback(i, total, ref, resultado)
+        # Enviar todas las tareas al pool compartido. Cada referencia usa una copia
+        # superficial del descargador (misma sesión y caches) porque descargar_todo
+        # cambia output_dir mientras trabaja
+        futures = {
+            self._executor.submit(copy.copy(self).descargar_todo, ref): ref 
+            for ref in referencias
+        }
+        
+        # Procesar resultados conforme se completan
+        for i, future in enumerate(as_completed(futures), 1):
+            ref = futures[future]
+            try:
+                resultado = future.result(timeout=300)  # 5 minutos por referencia
+                resultados.append((ref, resultado))
                 
-                except Exception as e:
-                    print(f"✗ Error procesando {ref}: {e}")
-                    resultados.append((ref, {"error": str(e)}))
+                if callback:
+                    callback(i, total, ref, resultado)
+            
+            except Exception as e:
+                logger.error(f"✗ Error procesando {ref}: {e}")
+                resultados.append((ref, {"error": str(e)}))
         
         return resultados
     
@@ -286,9 +744,9 @@ class CatastroDownloader:
         Returns:
             Diccionario con resultados
         """
-        print(f"\n{'='*60}")
-        print(f"📥 Procesando: {referencia}")
-        print(f"{'='*60}")
+        logger.info(f"\n{'='*60}")
+        logger.info(f"📥 Procesando: {referencia}")
+        logger.info(f"{'='*60}")
         
         ref = self.limpiar_referencia(referencia)
         ref_dir = self.output_dir / ref
@@ -308,58 +766,81 @@ class CatastroDownloader:
             # 1. Obtener coordenadas
             coords = self.obtener_coordenadas_unificado(ref)
             if not coords:
-                print("  ✗ No se pudieron obtener coordenadas")
+                logger.error("  ✗ No se pudieron obtener coordenadas")
                 return resultados
             
             resultados['coordenadas'] = coords
             
-            # 2. Descargar GML de parcela
-            parcela_gml = self.descargar_parcela_gml(ref)
-            resultados['parcela_gml'] = parcela_gml
-            
-            # 3. Descargar GML de edificio (si existe)
-            edificio_gml = self.descargar_edificio_gml(ref)
-            resultados['edificio_gml'] = edificio_gml
-            
-            # 4. Extraer coordenadas del polígono
-            coords_poligono = None
-            if parcela_gml:
-                gml_file = ref_dir / f"{ref}_parcela.gml"
-                coords_poligono = self.extraer_coordenadas_gml(str(gml_file))
-            
-            # 5. Calcular BBOX
-            bbox = self.calcular_bbox_optimizado(coords, coords_poligono)
-            resultados['bbox'] = bbox
-            
-            # 6. Generar KML
-            kml_generado = self.generar_kml(ref, coords, coords_poligono)
-            resultados['kml'] = kml_generado
-            
-            # 7. Descargar plano y ortofoto
-            plano_descargado = self.descargar_plano_ortofoto(ref, bbox)
-            resultados['plano_ortofoto'] = plano_descargado
-            
-            # 8. Descargar PDF oficial
-            pdf_descargado = self.descargar_consulta_descriptiva_pdf(ref)
-            resultados['pdf_oficial'] = pdf_descargado
-            
-            # 9. Descargar capas de afecciones (si está habilitado)
-            if descargar_afecciones and bbox:
-                afecciones = self.descargar_capas_afecciones(ref, bbox)
-                resultados['capas_afecciones'] = afecciones
-            
-            # 10. Generar informe PDF (si ReportLab está disponible)
+            # Las descargas son independientes entre sí salvo el BBOX, que depende
+            # del GML de parcela: se lanzan en paralelo y el tiempo total queda en
+            # el de la más lenta en lugar de la suma de todas
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                # 2. Descargar GML de parcela
+                futuro_parcela = executor.submit(self.descargar_parcela_gml, ref)
+                
+                # 3. Descargar GML de edificio (si existe)
+                futuro_edificio = executor.submit(self.descargar_edificio_gml, ref)
+                
+                # 8. Descargar PDF oficial (no depende del BBOX)
+                futuro_pdf = executor.submit(self.descargar_consulta_descriptiva_pdf, ref)
+                
+                parcela_gml = futuro_parcela.result()
+                resultados['parcela_gml'] = parcela_gml
+                
+                # 4. Extraer coordenadas del polígono
+                coords_poligono = None
+                if parcela_gml:
+                    gml_file = ref_dir / f"{ref}_parcela.gml"
+                    coords_poligono = self.extraer_coordenadas_gml(str(gml_file))
+                
+                # 5. Calcular BBOX
+                bbox = self.calcular_bbox_optimizado(coords, coords_poligono)
+                resultados['bbox'] = bbox['wms11'] if bbox else None
+                
+                # 7. Descargar plano y ortofoto
+                futuro_plano = executor.submit(self.descargar_plano_ortofoto, ref, bbox)
+                
+                # 9. Descargar capas de afecciones (si está habilitado)
+                futuro_afecciones = None
+                if descargar_afecciones and bbox:
+                    futuro_afecciones = executor.submit(self.descargar_capas_afecciones, ref, bbox)
+                
+                # 6. Generar KML (mientras terminan las descargas)
+                kml_generado = self.generar_kml(ref, coords, coords_poligono)
+                resultados['kml'] = kml_generado
+                
+                resultados['edificio_gml'] = futuro_edificio.result()
+                resultados['plano_ortofoto'] = futuro_plano.result()
+                resultados['pdf_oficial'] = futuro_pdf.result()
+                if futuro_afecciones is not None:
+                    resultados['capas_afecciones'] = futuro_afecciones.result()
+            
+            # 10. Generar informe PDF (si ReportLab está disponible). Solo lee el GML,
+            # así que se genera en otro hilo mientras se dibujan las siluetas (con una
+            # copia del descargador, que conserva output_dir pase lo que pase aquí).
+            # El resumen de archivos se toma ahora, antes de que las siluetas
+            # empiecen a escribir imágenes en la misma carpeta
+            futuro_informe = None
             if REPORTLAB_AVAILABLE:
+                executor_informe = ThreadPoolExecutor(max_workers=1)
+                futuro_informe = executor_informe.submit(
+                    copy.copy(self).generar_informe_pdf, ref, self._resumen_archivos(ref))
+                executor_informe.shutdown(wait=False)
+            
+            def recoger_informe():
+                # Las composiciones GML que ya existan se listan en el informe:
+                # hay que esperarlo antes de generar las nuevas
+                if futuro_informe is None or 'informe_pdf' in resultados:
+                    return
                 try:
-                    informe_generado = self.generar_informe_pdf(ref)
-                    resultados['informe_pdf'] = informe_generado
+                    resultados['informe_pdf'] = futuro_informe.result()
                 except Exception as e:
-                    print(f"  ⚠ Error generando informe PDF: {e}")
+                    logger.warning(f"  ⚠ Error generando informe PDF: {e}")
                     resultados['informe_pdf'] = False
             
             # 11. Superponer contornos en TODAS las imágenes
             if PILLOW_AVAILABLE and coords_poligono and bbox:
-                print(f"  🎨 Aplicando siluetas a todas las imágenes...")
+                logger.info(f"  🎨 Aplicando siluetas a todas las imágenes...")
                 
                 # Primero usar la función específica para imágenes conocidas
                 contorno_superpuesto = self.superponer_contorno_parcela(ref, bbox)
@@ -370,33 +851,36 @@ class CatastroDownloader:
                 resultados['contorno_completo'] = contorno_completo
                 
                 if contorno_completo:
-                    print(f"  ✅ Siluetas aplicadas a todas las imágenes disponibles")
+                    logger.info(f"  ✅ Siluetas aplicadas a todas las imágenes disponibles")
                 else:
-                    print(f"  ⚠ No se encontraron imágenes adicionales para procesar")
+                    logger.warning(f"  ⚠ No se encontraron imágenes adicionales para procesar")
                 
                 # 12. APLICAR SILUETAS A IMÁGENES ESPECÍFICAS PARA PDFs
                 try:
                     self._aplicar_siluetas_imagenes_pdf(ref, coords_poligono, bbox)
                     resultados['siluetas_pdf'] = True
-                    print(f"  ✅ Siluetas aplicadas a imágenes para PDFs")
+                    logger.info(f"  ✅ Siluetas aplicadas a imágenes para PDFs")
                 except Exception as pdf_sil_e:
-                    print(f"  ⚠ Error aplicando siluetas a PDFs: {pdf_sil_e}")
+                    logger.warning(f"  ⚠ Error aplicando siluetas a PDFs: {pdf_sil_e}")
                     resultados['siluetas_pdf'] = False
                 
                 # 13. Crear composiciones GML + capas de intersección
+                recoger_informe()
                 try:
                     composiciones_gml = self.crear_composicion_gml_intersecciones(ref, bbox)
                     resultados['composiciones_gml'] = composiciones_gml
                     
                     if composiciones_gml:
-                        print(f"  ✅ Composiciones GML + intersecciones generadas")
+                        logger.info(f"  ✅ Composiciones GML + intersecciones generadas")
                     else:
-                        print(f"  ⚠ No se generaron composiciones GML")
+                        logger.warning(f"  ⚠ No se generaron composiciones GML")
                         
                 except Exception as comp_e:
-                    print(f"  ⚠ Error generando composiciones GML: {comp_e}")
+                    logger.warning(f"  ⚠ Error generando composiciones GML: {comp_e}")
                     resultados['composiciones_gml'] = False
             
+            recoger_informe()
+            
             # 13. Crear ZIP si se solicita
             if crear_zip:
                 zip_path = self.crear_zip_referencia(ref, str(old_dir))
@@ -409,7 +893,7 @@ class CatastroDownloader:
             self._mostrar_resumen(resultados)
             
         except Exception as e:
-            print(f"  ✗ Error en procesamiento: {e}")
+            logger.error(f"  ✗ Error en procesamiento: {e}")
             import traceback
             traceback.print_exc()
             resultados['error'] = str(e)
@@ -420,14 +904,48 @@ class CatastroDownloader:
         
         return resultados
     
+    @staticmethod
+    def _volcar_bloques(bloques, filename):
+        """
+        Escribe en disco los bloques de una respuesta descargada con stream=True; devuelve los bytes escritos.
+        Se escribe a un .tmp y se renombra al final: una descarga cortada nunca deja un fichero a medias.
+        El .tmp tiene nombre único: dos descargas simultáneas de la misma referencia no lo comparten.
+        """
+        f = tempfile.NamedTemporaryFile(dir=filename.parent, prefix=filename.name, suffix='.tmp', delete=False)
+        temporal = Path(f.name)
+        tamano = 0
+        try:
+            with f:
+                for bloque in bloques:
+                    f.write(bloque)
+                    tamano += len(bloque)
+            os.replace(temporal, filename)
+        finally:
+            temporal.unlink(missing_ok=True)
+        return tamano
+    
+    @staticmethod
+    def _gml_completo(filename):
+        """Comprueba que un GML ya descargado termina en el cierre de FeatureCollection (no está truncado)"""
+        try:
+            with open(filename, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 64))
+                return b'FeatureCollection>' in f.read()
+        except OSError:
+            return False
+    
     def descargar_parcela_gml(self, referencia):
         """Descarga GML de parcela"""
         ref = self.limpiar_referencia(referencia)
         filename = self.output_dir / f"{ref}_parcela.gml"
         
         if filename.exists():
-            print(f"  ↩ GML ya existe: {filename.name}")
-            return True
+            if self._gml_completo(filename):
+                logger.info(f"  ↩ GML ya existe: {filename.name}")
+                return True
+            logger.warning(f"  ⚠ GML existente incompleto, se vuelve a descargar: {filename.name}")
+            filename.unlink()
         
         params = {
             'service': 'wfs',
@@ -439,24 +957,25 @@ class CatastroDownloader:
         }
         
         try:
-            response = self.session.get(self.base_urls['inspire_wfs'], params=params, timeout=30)
-            
-            if response.status_code == 200:
-                # Verificar que no sea un error
-                if b'ExceptionReport' in response.content:
-                    print(f"  ⚠ Parcela GML no disponible")
+            with self.session.get(self.base_urls['inspire_wfs'], params=params,
+                                  timeout=30, stream=True) as response:
+                if response.status_code == 200:
+                    # Verificar que no sea un error (el informe de excepción va al inicio)
+                    bloques = response.iter_content(chunk_size=BLOQUE_DESCARGA)
+                    primero = next(bloques, b'')
+                    if b'ExceptionReport' in primero:
+                        logger.warning(f"  ⚠ Parcela GML no disponible")
+                        return False
+                    
+                    self._volcar_bloques(chain([primero], bloques), filename)
+                    logger.info(f"  ✓ Parcela GML descargada: {filename.name}")
+                    return True
+                else:
+                    logger.error(f"  ✗ Error HTTP {response.status_code}")
                     return False
                 
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ Parcela GML descargada: {filename.name}")
-                return True
-            else:
-                print(f"  ✗ Error HTTP {response.status_code}")
-                return False
-                
         except Exception as e:
-            print(f"  ✗ Error: {e}")
+            logger.error(f"  ✗ Error: {e}")
             return False
     
     def descargar_edificio_gml(self, referencia):
@@ -465,8 +984,11 @@ class CatastroDownloader:
         filename = self.output_dir / f"{ref}_edificio.gml"
         
         if filename.exists():
-            print(f"  ↩ Edificio GML ya existe: {filename.name}")
-            return True
+            if self._gml_completo(filename):
+                logger.info(f"  ↩ Edificio GML ya existe: {filename.name}")
+                return True
+            logger.warning(f"  ⚠ Edificio GML existente incompleto, se vuelve a descargar: {filename.name}")
+            filename.unlink()
         
         params = {
             'service': 'wfs',
@@ -478,23 +1000,24 @@ class CatastroDownloader:
         }
         
         try:
-            response = self.session.get(self.base_urls['inspire_wfs'], params=params, timeout=30)
-            
-            if response.status_code == 200:
-                if b'ExceptionReport' in response.content:
-                    print(f"  ⚠ Edificio GML no disponible (puede ser solo parcela)")
+            with self.session.get(self.base_urls['inspire_wfs'], params=params,
+                                  timeout=30, stream=True) as response:
+                if response.status_code == 200:
+                    bloques = response.iter_content(chunk_size=BLOQUE_DESCARGA)
+                    primero = next(bloques, b'')
+                    if b'ExceptionReport' in primero:
+                        logger.warning(f"  ⚠ Edificio GML no disponible (puede ser solo parcela)")
+                        return False
+                    
+                    self._volcar_bloques(chain([primero], bloques), filename)
+                    logger.info(f"  ✓ Edificio GML descargado: {filename.name}")
+                    return True
+                else:
+                    logger.error(f"  ✗ Error HTTP {response.status_code}")
                     return False
                 
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ Edificio GML descargado: {filename.name}")
-                return True
-            else:
-                print(f"  ✗ Error HTTP {response.status_code}")
-                return False
-                
         except Exception as e:
-            print(f"  ✗ Error: {e}")
+            logger.error(f"  ✗ Error: {e}")
             return False
     
     def descargar_consulta_descriptiva_pdf(self, referencia):
@@ -505,7 +1028,7 @@ class CatastroDownloader:
         filename = self.output_dir / f"{ref}_consulta_oficial.pdf"
         
         if filename.exists():
-            print(f"  ↩ PDF oficial ya existe: {filename.name}")
+            logger.info(f"  ↩ PDF oficial ya existe: {filename.name}")
             return True
         
         url = f"{self.base_urls['sedecatastro']}/CYCBienInmueble/SECImprimirCroquisYDatos.aspx"
@@ -516,39 +1039,54 @@ class CatastroDownloader:
         }
         
         try:
-            response = self.session.get(url, params=params, timeout=30)
-            
-            if (response.status_code == 200 and 
-                'application/pdf' in response.headers.get('Content-Type', '')):
-                
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ PDF oficial descargado: {filename.name}")
-                return True
-            else:
-                print(f"  ✗ PDF no disponible (Status: {response.status_code})")
-                return False
+            with self.session.get(url, params=params, timeout=30, stream=True) as response:
+                if (response.status_code == 200 and 
+                    'application/pdf' in response.headers.get('Content-Type', '')):
+                    
+                    self._volcar_bloques(response.iter_content(chunk_size=BLOQUE_DESCARGA), filename)
+                    logger.info(f"  ✓ PDF oficial descargado: {filename.name}")
+                    return True
+                else:
+                    logger.error(f"  ✗ PDF no disponible (Status: {response.status_code})")
+                    return False
                 
         except Exception as e:
-            print(f"  ✗ Error: {e}")
+            logger.error(f"  ✗ Error: {e}")
             return False
     
-    def descargar_plano_ortofoto(self, referencia, bbox_wgs84):
+    def descargar_plano_ortofoto(self, referencia, bbox):
         """Descarga plano catastral y ortofoto"""
         ref = self.limpiar_referencia(referencia)
         
-        print("  🗺️  Descargando plano y ortofoto...")
+        logger.info("  🗺️  Descargando plano y ortofoto...")
         
-        # Preparar BBOX para diferentes versiones WMS
-        coords = [float(x) for x in bbox_wgs84.split(",")]
-        bbox_wms11 = bbox_wgs84
-        bbox_wms13 = f"{coords[1]},{coords[0]},{coords[3]},{coords[2]}"  # miny,minx,maxy,maxx
+        bbox = self._bbox_wms(bbox)
         
         resultados = {
             'plano_catastro': False,
             'ortofoto_pnoa': False,
             'composicion': False
         }
+        plano_bytes = None
+        
+        # La ortofoto (IGN) no depende del plano (Catastro): se pide en paralelo
+        params_orto = {
+            "SERVICE": "WMS",
+            "VERSION": "1.3.0",
+            "REQUEST": "GetMap",
+            "LAYERS": "OI.OrthoimageCoverage",
+            "STYLES": "",
+            "CRS": "EPSG:4326",
+            "BBOX": bbox['wms13'],
+            "WIDTH": "1600",
+            "HEIGHT": "1600",
+            "FORMAT": "image/jpeg",
+        }
+        executor_orto = ThreadPoolExecutor(max_workers=1)
+        futuro_orto = executor_orto.submit(
+            self.session.get, self.base_urls['ign_pnoa'], params=params_orto, timeout=60
+        )
+        executor_orto.shutdown(wait=False)
         
         # 1. Descargar plano catastral (WMS 1.1.1)
         try:
@@ -559,184 +1097,135 @@ class CatastroDownloader:
                 "LAYERS": "Catastro",
                 "STYLES": "",
                 "SRS": "EPSG:4326",
-                "BBOX": bbox_wms11,
+                "BBOX": bbox['wms11'],
                 "WIDTH": "1600",
                 "HEIGHT": "1600",
-                "FORMAT": "image/png",
                 "TRANSPARENT": "FALSE",
             }
             
-            response = self.session.get(self.base_urls['catastro_wms'], params=params, timeout=60)
+            formatos = [f for f in FORMATOS_PLANO if f not in self._formatos_rechazados] or ["image/png"]
+            for formato in formatos:
+                params["FORMAT"] = formato
+                response = self.session.get(self.base_urls['catastro_wms'], params=params, timeout=60)
+                if (response.status_code == 200 and
+                        response.headers.get('Content-Type', '').startswith('image/')):
+                    break
+                # Solo se descarta el formato para siguientes planos si el WMS lo
+                # rechaza expresamente (ServiceException code="InvalidFormat");
+                # cualquier otro fallo se trata como puntual y se reintenta en PNG
+                if formato != "image/png" and b"InvalidFormat" in response.content:
+                    self._formatos_rechazados.add(formato)
             
             if response.status_code == 200 and len(response.content) > 1000:
+                plano_bytes = response.content
                 plano_file = self.output_dir / f"{ref}_plano_catastro.png"
                 with open(plano_file, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ Plano catastral descargado")
+                    f.write(plano_bytes)
+                logger.info(f"  ✓ Plano catastral descargado")
                 resultados['plano_catastro'] = True
             else:
-                print(f"  ✗ Error descargando plano")
+                logger.error(f"  ✗ Error descargando plano")
         
         except Exception as e:
-            print(f"  ✗ Error plano: {e}")
+            logger.error(f"  ✗ Error plano: {e}")
         
         # 2. Descargar ortofoto PNOA (WMS 1.3.0)
         try:
-            params = {
-                "SERVICE": "WMS",
-                "VERSION": "1.3.0",
-                "REQUEST": "GetMap",
-                "LAYERS": "OI.OrthoimageCoverage",
-                "STYLES": "",
-                "CRS": "EPSG:4326",
-                "BBOX": bbox_wms13,
-                "WIDTH": "1600",
-                "HEIGHT": "1600",
-                "FORMAT": "image/jpeg",
-            }
-            
-            response = self.session.get(self.base_urls['ign_pnoa'], params=params, timeout=60)
+            response = futuro_orto.result()
             
             if response.status_code == 200 and len(response.content) > 5000:
+                orto_bytes = response.content
                 orto_file = self.output_dir / f"{ref}_ortofoto_pnoa.jpg"
                 with open(orto_file, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ Ortofoto PNOA descargada")
+                    f.write(orto_bytes)
+                logger.info(f"  ✓ Ortofoto PNOA descargada")
                 resultados['ortofoto_pnoa'] = True
                 
-                # 3. Crear composición si ambas imágenes existen
-                if resultados['plano_catastro'] and PILLOW_AVAILABLE:
+                # 3. Crear composición si ambas imágenes existen (desde los bytes
+                #    ya descargados, sin volver a leer los ficheros recién escritos)
+                if plano_bytes and PILLOW_AVAILABLE:
                     try:
-                        plano_path = self.output_dir / f"{ref}_plano_catastro.png"
-                        orto_path = self.output_dir / f"{ref}_ortofoto_pnoa.jpg"
+                        from PIL import Image, ImageDraw
                         
-                        with Image.open(plano_path) as img_plano:
-                            with Image.open(orto_path) as img_orto:
+                        with Image.open(BytesIO(plano_bytes)) as img_plano:
+                            with Image.open(BytesIO(orto_bytes)) as img_orto:
                                 # Asegurar mismo tamaño
-                                img_orto = img_orto.resize(img_plano.size)
+                                if img_orto.size != img_plano.size:
+                                    img_orto = img_orto.resize(img_plano.size)
                                 
-                                # Crear composición (60% ortofoto, 40% plano)
-                                composicion = Image.blend(
-                                    img_orto.convert("RGBA"),
-                                    img_plano.convert("RGBA"),
-                                    alpha=0.4
-                                )
+                                # Crear composición (60% ortofoto, 40% plano) en aritmética
+                                # entera sobre uint16: una sola pasada, sin buffers RGBA
+                                orto = np.asarray(img_orto.convert("RGB"), dtype=np.uint16)
+                                plano = np.asarray(img_plano.convert("RGB"), dtype=np.uint16)
+                                mezcla = ((orto * 154 + plano * 102) >> 8).astype(np.uint8)
+                                composicion = Image.fromarray(mezcla).convert("RGBA")
                                 
                                 comp_file = self.output_dir / f"{ref}_plano_con_ortofoto.png"
-                                composicion.save(comp_file, "PNG")
-                                print(f"  ✓ Composición creada")
+                                composicion.save(comp_file, "PNG", compress_level=1)
+                                logger.info(f"  ✓ Composición creada")
                                 
                                 # INMEDIATAMENTE aplicar silueta a la composición
-                                if coords_poligono and bbox_wgs84:
+                                if coords_poligono:
                                     try:
                                         # Convertir coordenadas a píxeles para la composición
-                                        coords_bbox = [float(x) for x in bbox_wgs84.split(",")]
-                                        minx, miny, maxx, maxy = coords_bbox
-                                        width, height = composicion.size
-                                        
-                                        pixels = []
-                                        for coord in coords_poligono:
-                                            if self._es_latitud(coord[0]):
-                                                lat, lon = coord[0], coord[1]
-                                            else:
-                                                lon, lat = coord[0], coord[1]
-                                            
-                                            x = int(((lon - minx) / (maxx - minx)) * width)
-                                            y = int(((maxy - lat) / (maxy - miny)) * height)
-                                            pixels.append((x, y))
+                                        pixels = self._a_pixeles(coords_poligono, bbox['tuple'], composicion.size)
                                         
                                         # Dibujar silueta en la composición
-                                        if len(pixels) > 2:
+                                        if len(pixels) >= 8:
                                             overlay = Image.new('RGBA', composicion.size, (0, 0, 0, 0))
                                             draw = ImageDraw.Draw(overlay)
                                             
                                             # Línea principal (roja brillante)
-                                            draw.line(pixels + [pixels[0]], fill=(255, 0, 0), width=4)
+                                            draw.line(pixels, fill=(255, 0, 0), width=4)
                                             # Línea secundaria (blanca) para contraste
-                                            draw.line(pixels + [pixels[0]], fill=(255, 255, 255), width=2)
+                                            draw.line(pixels, fill=(255, 255, 255), width=2)
                                             
                                             composicion_con_contorno = Image.alpha_composite(composicion, overlay)
                                             comp_contorno_file = self.output_dir / f"{ref}_plano_con_ortofoto_contorno.png"
-                                            composicion_con_contorno.convert('RGB').save(comp_contorno_file, quality=95)
-                                            print(f"  ✓ Silueta aplicada a composición")
+                                            self._guardar_imagen(composicion_con_contorno.convert('RGB'), comp_contorno_file)
+                                            logger.info(f"  ✓ Silueta aplicada a composición")
                                     except Exception as contour_e:
-                                        print(f"  ⚠ Error aplicando silueta a composición: {contour_e}")
+                                        logger.warning(f"  ⚠ Error aplicando silueta a composición: {contour_e}")
                     
                     except Exception as e:
-                        print(f"  ⚠ Error creando composición: {e}")
+                        logger.warning(f"  ⚠ Error creando composición: {e}")
         
         except Exception as e:
-            print(f"  ✗ Error ortofoto: {e}")
+            logger.error(f"  ✗ Error ortofoto: {e}")
         
         return resultados
     
-    def descargar_capas_afecciones(self, referencia, bbox_wgs84):
+    def descargar_capas_afecciones(self, referencia, bbox):
         """Descarga capas de afecciones territoriales"""
         ref = self.limpiar_referencia(referencia)
         
-        print("  🏞️  Descargando capas de afecciones...")
+        logger.info("  🏞️  Descargando capas de afecciones...")
         
-        # Preparar BBOX
-        coords = [float(x) for x in bbox_wgs84.split(",")]
-        bbox_wms13 = f"{coords[1]},{coords[0]},{coords[3]},{coords[2]}"
+        bbox = self._bbox_wms(bbox)
         
         capas = {
             'catastro_parcelas': {
                 'url': self.base_urls['catastro_wms'],
                 'version': '1.1.1',
                 'layers': 'Catastro',
-                'bbox': bbox_wgs84,
+                'bbox': bbox['wms11'],
                 'desc': 'Plano catastral'
             },
             'planeamiento': {
                 'url': f"{self.base_urls['idee']}/IDEE-Planeamiento/IDEE-Planeamiento",
                 'version': '1.3.0',
                 'layers': 'PlaneamientoGeneral',
-                'bbox': bbox_wms13,
+                'bbox': bbox['wms13'],
                 'desc': 'Planeamiento urbanístico'
             }
         }
         
-        descargadas = []
-        
-        for nombre, config in capas.items():
-            try:
-                params = {
-                    'SERVICE': 'WMS',
-                    'VERSION': config['version'],
-                    'REQUEST': 'GetMap',
-                    'LAYERS': config['layers'],
-                    'STYLES': '',
-                    'CRS': 'EPSG:4326' if config['version'] == '1.3.0' else 'SRS',
-                    'BBOX': config['bbox'],
-                    'WIDTH': '1200',
-                    'HEIGHT': '1200',
-                    'FORMAT': 'image/png',
-                    'TRANSPARENT': 'TRUE'
-                }
-                
-                if config['version'] == '1.1.1':
-                    params['SRS'] = 'EPSG:4326'
-                    del params['CRS']
-                
-                response = self.session.get(config['url'], params=params, timeout=45)
-                
-                if response.status_code == 200 and len(response.content) > 1000:
-                    archivo = self.output_dir / f"{ref}_afeccion_{nombre}.png"
-                    with open(archivo, 'wb') as f:
-                        f.write(response.content)
-                    
-                    descargadas.append({
-                        'nombre': nombre,
-                        'descripcion': config['desc'],
-                        'archivo': str(archivo)
-                    })
-                    print(f"    ✓ {config['desc']}")
-                else:
-                    print(f"    ⚠ {config['desc']}: Sin datos")
-            
-            except Exception as e:
-                print(f"    ⚠ {config['desc']}: Error - {str(e)[:50]}")
+        # Cada capa es un GetMap independiente (servidores distintos): se piden a la vez
+        with ThreadPoolExecutor(max_workers=len(capas)) as executor:
+            resultados = executor.map(
+                lambda capa: self._descargar_capa_afeccion(ref, *capa), capas.items()
+            )
+            descargadas = [capa for capa in resultados if capa]
         
         # Guardar informe
         if descargadas:
@@ -747,43 +1236,81 @@ class CatastroDownloader:
             }
             
             informe_file = self.output_dir / f"{ref}_afecciones_info.json"
-            with open(informe_file, 'w', encoding='utf-8') as f:
-                json.dump(informe, f, indent=2, ensure_ascii=False)
+            _escribir_json(informe_file, informe)
             
-            print(f"  ✓ Informe de afecciones guardado")
+            logger.info(f"  ✓ Informe de afecciones guardado")
         
         return len(descargadas) > 0
     
+    def _descargar_capa_afeccion(self, ref, nombre, config):
+        """Descarga una capa de afección (GetMap PNG); devuelve su entrada para el informe o None"""
+        try:
+            params = {
+                'SERVICE': 'WMS',
+                'VERSION': config['version'],
+                'REQUEST': 'GetMap',
+                'LAYERS': config['layers'],
+                'STYLES': '',
+                'CRS': 'EPSG:4326' if config['version'] == '1.3.0' else 'SRS',
+                'BBOX': config['bbox'],
+                'WIDTH': '1200',
+                'HEIGHT': '1200',
+                'FORMAT': 'image/png',
+                'TRANSPARENT': 'TRUE'
+            }
+            
+            if config['version'] == '1.1.1':
+                params['SRS'] = 'EPSG:4326'
+                del params['CRS']
+            
+            archivo = self.output_dir / f"{ref}_afeccion_{nombre}.png"
+            with self.session.get(config['url'], params=params, timeout=45, stream=True) as response:
+                tamano = 0
+                if response.status_code == 200:
+                    tamano = self._volcar_bloques(
+                        response.iter_content(chunk_size=BLOQUE_DESCARGA), archivo
+                    )
+                    # Una imagen tan pequeña es una respuesta vacía o un error del WMS
+                    if tamano <= 1000:
+                        archivo.unlink()
+            
+            if tamano > 1000:
+                logger.info(f"    ✓ {config['desc']}")
+                return {
+                    'nombre': nombre,
+                    'descripcion': config['desc'],
+                    'archivo': str(archivo)
+                }
+            logger.warning(f"    ⚠ {config['desc']}: Sin datos")
+        
+        except Exception as e:
+            logger.warning(f"    ⚠ {config['desc']}: Error - {str(e)[:50]}")
+        
+        return None
+    
     def extraer_coordenadas_gml(self, gml_file):
         """Extrae coordenadas de archivo GML"""
         try:
-            tree = ET.parse(gml_file)
-            root = tree.getroot()
+            bloques = []
+            puntos = []
             
-            coords = []
-            namespaces = {'gml': 'http://www.opengis.net/gml/3.2'}
-            
-            # Buscar posList
-            for pos_list in root.findall('.//gml:posList', namespaces):
-                if pos_list.text:
-                    partes = pos_list.text.strip().split()
-                    for i in range(0, len(partes), 2):
-                        if i + 1 < len(partes):
-                            coords.append((float(partes[i]), float(partes[i+1])))
+            # posList y pos en la misma pasada; los pos solo se usan si no hay posList
+            for etiqueta, texto in _textos_gml(gml_file, ('posList', 'pos')):
+                if etiqueta == 'posList':
+                    bloques.append(_pares(texto))
+                else:
+                    puntos.append(_pares(texto)[:1])
             
-            # Si no hay posList, buscar pos
-            if not coords:
-                for pos in root.findall('.//gml:pos', namespaces):
-                    if pos.text:
-                        partes = pos.text.strip().split()
-                        if len(partes) >= 2:
-                            coords.append((float(partes[0]), float(partes[1])))
+            if not any(len(b) for b in bloques):
+                bloques = puntos
             
-            if coords:
-                return coords
+            if bloques:
+                coords = np.concatenate(bloques)
+                if len(coords):
+                    return list(zip(coords[:, 0].tolist(), coords[:, 1].tolist()))
             
         except Exception as e:
-            print(f"  ⚠ Error extrayendo coordenadas GML: {e}")
+            logger.warning(f"  ⚠ Error extrayendo coordenadas GML: {e}")
         
         return None
     
@@ -794,100 +1321,43 @@ class CatastroDownloader:
         
         lon, lat = coords['lon'], coords['lat']
         
-        # Cabecera KML
-        kml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-  <Document>
-    <name>Parcela Catastral {ref}</name>
-    <description>Referencia: {ref}</description>
-    
-    <Style id="punto_style">
-      <IconStyle>
-        <scale>1.2</scale>
-                    <Icon>
-                    <href>https://maps.google.com/mapfiles/kml/paddle/red-circle.png</href>
-                </Icon>
-      </IconStyle>
-    </Style>
-    
-    <Placemark>
-      <name>Centro Parcela</name>
-      <description>
-        <![CDATA[
-        <b>Referencia:</b> {ref}<br/>
-        <b>Coordenadas:</b> {lat:.6f}°, {lon:.6f}°<br/>
-        <b>Catastro:</b> <a href="https://www1.sedecatastro.gob.es/Cartografia/mapa.aspx?refcat={ref}">Ver en Catastro</a><br/>
-        <b>Google Maps:</b> <a href="https://maps.google.com/?q={lat},{lon}">Abrir en Maps</a>
-        ]]>
-      </description>
-      <styleUrl>#punto_style</styleUrl>
-      <Point>
-        <coordinates>{lon},{lat},0</coordinates>
-      </Point>
-    </Placemark>'''
+        # Cabecera KML (el documento se monta por fragmentos en bytes y se escribe de una vez)
+        partes = [_KML_CABECERA.format_map({'ref': ref, 'lat': lat, 'lon': lon}).encode('utf-8')]
         
         # Añadir polígono si existe
         if coords_poligono and len(coords_poligono) > 2:
-            kml += '''
-    <Style id="poligono_style">
-      <LineStyle>
-        <color>ff0000ff</color>
-        <width>3</width>
-      </LineStyle>
-      <PolyStyle>
-        <color>4d0000ff</color>
-      </PolyStyle>
-    </Style>
-    
-    <Placemark>
-      <name>Contorno Parcela</name>
-      <styleUrl>#poligono_style</styleUrl>
-      <Polygon>
-        <outerBoundaryIs>
-          <LinearRing>
-            <coordinates>'''
+            partes.append(_KML_POLIGONO_INICIO)
             
-            # Añadir coordenadas
-            for coord in coords_poligono:
-                # Determinar orden (lat, lon) o (lon, lat)
-                if self._es_latitud(coord[0]):
-                    lat_c, lon_c = coord[0], coord[1]
-                else:
-                    lon_c, lat_c = coord[0], coord[1]
-                
-                kml += f"\n              {lon_c},{lat_c},0"
-            
-            # Cerrar polígono
-            first = coords_poligono[0]
-            if self._es_latitud(first[0]):
-                lat_c, lon_c = first[0], first[1]
-            else:
-                lon_c, lat_c = first[0], first[1]
+            # Añadir coordenadas, repitiendo el primer vértice para cerrar el polígono
+            vertices = self._lon_lat(coords_poligono).tolist()
+            partes.append("".join(
+                f"\n              {lon_c},{lat_c},0" for lon_c, lat_c in vertices + vertices[:1]
+            ).encode('ascii'))
             
-            kml += f"\n              {lon_c},{lat_c},0"
-            kml += '''
-            </coordinates>
-          </LinearRing>
-        </outerBoundaryIs>
-      </Polygon>
-    </Placemark>'''
+            partes.append(_KML_POLIGONO_FIN)
         
         # Cerrar documento
-        kml += '''
-  </Document>
-</kml>'''
+        partes.append(_KML_PIE)
         
         try:
-            with open(kml_file, 'w', encoding='utf-8') as f:
-                f.write(kml)
-            print(f"  ✓ KML generado: {kml_file.name}")
+            with open(kml_file, 'wb') as f:
+                f.write(b"".join(partes))
+            logger.info(f"  ✓ KML generado: {kml_file.name}")
             return True
         except Exception as e:
-            print(f"  ✗ Error generando KML: {e}")
+            logger.error(f"  ✗ Error generando KML: {e}")
             return False
     
-    def generar_informe_pdf(self, referencia):
-        """Genera informe PDF completo con información estructurada"""
+    def _resumen_archivos(self, ref):
+        """Número de archivos de la referencia en output_dir y su tamaño total en bytes"""
+        archivos = list(self.output_dir.glob(f"{ref}*"))
+        return len(archivos), sum(f.stat().st_size for f in archivos if f.is_file())
+    
+    def generar_informe_pdf(self, referencia, resumen_archivos=None):
+        """
+        Genera informe PDF completo con información estructurada.
+        resumen_archivos: (número, bytes) de los archivos generados; si no se indica, se calcula al generar
+        """
         if not REPORTLAB_AVAILABLE:
             return False
         
@@ -897,35 +1367,15 @@ class CatastroDownloader:
         try:
             from reportlab.lib.pagesizes import A4
             from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
             from reportlab.lib.units import inch
             from reportlab.lib import colors
-            from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
             
             # Configuración del documento
             doc = SimpleDocTemplate(str(pdf_file), pagesize=A4, 
                                   rightMargin=72, leftMargin=72,
                                   topMargin=72, bottomMargin=18)
             
-            styles = getSampleStyleSheet()
-            
-            # Estilos personalizados
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                textColor=colors.darkblue
-            )
-            
-            heading_style = ParagraphStyle(
-                'CustomHeading',
-                parent=styles['Heading2'],
-                fontSize=14,
-                spaceAfter=12,
-                textColor=colors.darkblue
-            )
+            styles, title_style, heading_style = _estilos_informe()
             
             story = []
             
@@ -950,14 +1400,10 @@ class CatastroDownloader:
                 coords = self.extraer_coordenadas_gml(str(gml_file))
                 if coords:
                     # Calcular centroide aproximado
-                    all_coords = [coord for ring in coords for coord in ring]
-                    if all_coords:
-                        lons = [coord[0] for coord in all_coords if not self._es_latitud(coord[0])]
-                        lats = [coord[0] for coord in all_coords if self._es_latitud(coord[0])]
-                        if lons and lats:
-                            center_lon = sum(lons) / len(lons)
-                            center_lat = sum(lats) / len(lats)
-                            datos_basicos.append(['Centro Aproximado:', f'Lat: {center_lat:.6f}, Lon: {center_lon:.6f}'])
+                    lonlat = self._lon_lat(coords)
+                    if len(lonlat):
+                        center_lon, center_lat = lonlat.mean(axis=0).tolist()
+                        datos_basicos.append(['Centro Aproximado:', f'Lat: {center_lat:.6f}, Lon: {center_lon:.6f}'])
             
             tabla_datos = Table(datos_basicos, colWidths=[2*inch, 4*inch])
             tabla_datos.setStyle(TableStyle([
@@ -1049,12 +1495,13 @@ class CatastroDownloader:
             story.append(PageBreak())
             story.append(Paragraph("🔍 INFORMACIÓN ADICIONAL", heading_style))
             
+            numero_archivos, tamano_archivos = resumen_archivos or self._resumen_archivos(ref)
             adicional_info = [
                 'Este informe ha sido generado automáticamente por el sistema de análisis territorial.',
                 'Toda la información ha sido obtenida de fuentes oficiales: Catastro, PNOA, y capas territoriales.',
                 'Las siluetas garantizan la identificación visual clara del recinto en todas las imágenes.',
-                f'Número total de archivos generados: {len(list(self.output_dir.glob(f"{ref}*")))}',
-                f'Tamaño total estimado: {sum(f.stat().st_size for f in self.output_dir.glob(f"{ref}*") if f.is_file()) / 1024 / 1024:.1f} MB',
+                f'Número total de archivos generados: {numero_archivos}',
+                f'Tamaño total estimado: {tamano_archivos / 1024 / 1024:.1f} MB',
             ]
             
             for info in adicional_info:
@@ -1073,11 +1520,11 @@ class CatastroDownloader:
             
             # Generar el PDF
             doc.build(story)
-            print(f"  ✓ Informe PDF mejorado generado: {pdf_file.name}")
+            logger.info(f"  ✓ Informe PDF mejorado generado: {pdf_file.name}")
             return True
             
         except Exception as e:
-            print(f"  ⚠ Error generando PDF mejorado: {e}")
+            logger.warning(f"  ⚠ Error generando PDF mejorado: {e}")
             return False
     
     def superponer_contorno_parcela(self, referencia, bbox_wgs84):
@@ -1085,6 +1532,8 @@ class CatastroDownloader:
         if not PILLOW_AVAILABLE:
             return False
         
+        from PIL import Image, ImageDraw
+        
         ref = self.limpiar_referencia(referencia)
         gml_file = self.output_dir / f"{ref}_parcela.gml"
         
@@ -1131,6 +1580,9 @@ class CatastroDownloader:
         ]
         
         exitos = 0
+        # Todas las imágenes cubren el mismo bbox: la proyección se calcula una
+        # vez y en cada imagen solo se escala a su tamaño
+        normalizados = self._normalizar(coords_poligono, self._bbox_wms(bbox_wgs84)['tuple'])
         
         for img_in, img_out in imagenes:
             img_path = self.output_dir / img_in
@@ -1145,59 +1597,46 @@ class CatastroDownloader:
                     width, height = img.size
                     
                     # Convertir coordenadas a píxeles
-                    coords_bbox = [float(x) for x in bbox_wgs84.split(",")]
-                    minx, miny, maxx, maxy = coords_bbox
-                    
-                    pixels = []
-                    for coord in coords_poligono:
-                        # Determinar lat/lon
-                        if self._es_latitud(coord[0]):
-                            lat, lon = coord[0], coord[1]
-                        else:
-                            lon, lat = coord[0], coord[1]
-                        
-                        # Normalizar a coordenadas de imagen
-                        x = int(((lon - minx) / (maxx - minx)) * width)
-                        y = int(((maxy - lat) / (maxy - miny)) * height)
-                        
-                        pixels.append((x, y))
+                    pixels = self._escalar(normalizados, img.size)
                     
                     # Dibujar contorno con mejor visibilidad y estilo
-                    if len(pixels) > 2:
+                    if len(pixels) >= 8:
                         # Crear capa de dibujo con transparencia
                         overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
                         draw = ImageDraw.Draw(overlay)
                         
                         # Dibujar línea principal (roja brillante)
-                        draw.line(pixels + [pixels[0]], fill=(255, 0, 0), width=4)
+                        draw.line(pixels, fill=(255, 0, 0), width=4)
                         
                         # Dibujar línea secundaria (blanca) para mejor contraste
-                        draw.line(pixels + [pixels[0]], fill=(255, 255, 255), width=2)
+                        draw.line(pixels, fill=(255, 255, 255), width=2)
                         
                         # Combinar con imagen original
-                        img_with_contour = Image.alpha_composite(img.convert('RGBA'), overlay)
+                        img_with_contour = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
                         
                         # 1. Guardar versión con sufijo _contorno
                         final_output = out_path.with_suffix('.png') if out_path.suffix.lower() == '.jpg' else out_path
-                        img_with_contour.convert('RGB').save(final_output, quality=95)
+                        self._guardar_imagen(img_with_contour, final_output)
                         
                         # 2. SOBREESCRIBIR la imagen original para que todas las fotos tengan contorno
-                        img_with_contour.convert('RGB').save(img_path, quality=95)
+                        self._guardar_imagen(img_with_contour, img_path)
                         
                         # Si el archivo original era JPG y creamos PNG, también guardar versión JPG
                         if out_path.suffix.lower() == '.jpg' and final_output.suffix.lower() == '.png':
-                            img_with_contour.convert('RGB').save(out_path, quality=90)
+                            self._guardar_imagen(img_with_contour, out_path)
                         
                         exitos += 1
-                        print(f"  ✓ Contorno superpuesto en {img_in}")
+                        logger.info(f"  ✓ Contorno superpuesto en {img_in}")
             
             except Exception as e:
-                print(f"  ⚠ Error superponiendo {img_in}: {e}")
+                logger.warning(f"  ⚠ Error superponiendo {img_in}: {e}")
         
         return exitos > 0
     
     def superponer_contorno_en_todas_imagenes(self, referencia, bbox_wgs84):
         """Superpone contorno en TODAS las imágenes encontradas en el directorio"""
+        from PIL import Image, ImageDraw
+        
         ref = self.limpiar_referencia(referencia)
         gml_file = self.output_dir / f"{ref}_parcela.gml"
         
@@ -1226,15 +1665,14 @@ class CatastroDownloader:
                     imagenes_encontradas.append((img_path, out_path))
         
         if not imagenes_encontradas:
-            print(f"  ⚠ No se encontraron imágenes para procesar")
+            logger.warning(f"  ⚠ No se encontraron imágenes para procesar")
             return False
         
-        print(f"  📸 Procesando {len(imagenes_encontradas)} imágenes encontradas...")
+        logger.info(f"  📸 Procesando {len(imagenes_encontradas)} imágenes encontradas...")
         
         # Procesar cada imagen encontrada
         exitos = 0
-        coords_bbox = [float(x) for x in bbox_wgs84.split(",")]
-        minx, miny, maxx, maxy = coords_bbox
+        normalizados = self._normalizar(coords_poligono, self._bbox_wms(bbox_wgs84)['tuple'])
         
         for img_path, out_path in imagenes_encontradas:
             try:
@@ -1242,46 +1680,39 @@ class CatastroDownloader:
                     width, height = img.size
                     
                     # Convertir coordenadas a píxeles
-                    pixels = []
-                    for coord in coords_poligono:
-                        if self._es_latitud(coord[0]):
-                            lat, lon = coord[0], coord[1]
-                        else:
-                            lon, lat = coord[0], coord[1]
-                        
-                        x = int(((lon - minx) / (maxx - minx)) * width)
-                        y = int(((maxy - lat) / (maxy - miny)) * height)
-                        pixels.append((x, y))
+                    pixels = self._escalar(normalizados, img.size)
                     
                     # Dibujar contorno con mejor visibilidad
-                    if len(pixels) > 2:
+                    if len(pixels) >= 8:
                         overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
                         draw = ImageDraw.Draw(overlay)
                         
                         # Línea principal (roja brillante)
-                        draw.line(pixels + [pixels[0]], fill=(255, 0, 0), width=4)
+                        draw.line(pixels, fill=(255, 0, 0), width=4)
                         # Línea secundaria (blanca) para contraste
-                        draw.line(pixels + [pixels[0]], fill=(255, 255, 255), width=2)
+                        draw.line(pixels, fill=(255, 255, 255), width=2)
                         
-                        img_with_contour = Image.alpha_composite(img.convert('RGBA'), overlay)
+                        img_with_contour = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
                         
                         # 1. Guardar versión _contorno
-                        img_with_contour.convert('RGB').save(out_path, quality=95)
+                        self._guardar_imagen(img_with_contour, out_path)
                         
                         # 2. SOBREESCRIBIR original
-                        img_with_contour.convert('RGB').save(img_path, quality=95)
+                        self._guardar_imagen(img_with_contour, img_path)
                         
                         exitos += 1
-                        print(f"    ✓ Contorno en {img_path.name}")
+                        logger.info(f"    ✓ Contorno en {img_path.name}")
             
             except Exception as e:
-                print(f"    ⚠ Error procesando {img_path.name}: {e}")
+                logger.warning(f"    ⚠ Error procesando {img_path.name}: {e}")
         
-        print(f"  ✅ Contornos superpuestos en {exitos}/{len(imagenes_encontradas)} imágenes")
+        logger.info(f"  ✅ Contornos superpuestos en {exitos}/{len(imagenes_encontradas)} imágenes")
         return exitos > 0
     
     def _aplicar_siluetas_imagenes_pdf(self, ref, coords_poligono, bbox_wgs84):
         """Aplica siluetas a imágenes específicas que se usan en PDFs"""
+        from PIL import Image, ImageDraw
+        
         ref = self.limpiar_referencia(ref)
         
         # Imágenes específicas que deben tener silueta para PDFs
@@ -1295,6 +1726,7 @@ class CatastroDownloader:
         ]
         
         exitos = 0
+        normalizados = self._normalizar(coords_poligono, self._bbox_wms(bbox_wgs84)['tuple'])
         
         for img_name in imagenes_pdf:
             img_path = self.output_dir / img_name
@@ -1309,61 +1741,46 @@ class CatastroDownloader:
                         if not output_path.exists():
                             # Aplicar silueta
                             with Image.open(img_path) as img:
-                                width, height = img.size
-                                
                                 # Convertir coordenadas a píxeles
-                                coords_bbox = [float(x) for x in bbox_wgs84.split(",")]
-                                minx, miny, maxx, maxy = coords_bbox
-                                
-                                pixels = []
-                                for coord in coords_poligono:
-                                    for ring_coord in coord if isinstance(coord[0], (list, tuple)) else [coord]:
-                                        if self._es_latitud(ring_coord[0]):
-                                            lat, lon = ring_coord[0], ring_coord[1]
-                                        else:
-                                            lon, lat = ring_coord[0], ring_coord[1]
-                                        
-                                        x = int(((lon - minx) / (maxx - minx)) * width)
-                                        y = int(((maxy - lat) / (maxy - miny)) * height)
-                                        pixels.append((x, y))
+                                pixels = self._escalar(normalizados, img.size)
                                 
                                 # Dibujar silueta
-                                if len(pixels) > 2:
+                                if len(pixels) >= 8:
                                     overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
                                     draw = ImageDraw.Draw(overlay)
                                     
                                     # Línea principal (roja brillante)
-                                    draw.line(pixels + [pixels[0]], fill=(255, 0, 0), width=4)
+                                    draw.line(pixels, fill=(255, 0, 0), width=4)
                                     # Línea secundaria (blanca) para contraste
-                                    draw.line(pixels + [pixels[0]], fill=(255, 255, 255), width=2)
+                                    draw.line(pixels, fill=(255, 255, 255), width=2)
                                     
                                     img_with_contour = Image.alpha_composite(img.convert('RGBA'), overlay)
-                                    img_with_contour.convert('RGB').save(output_path, quality=95)
+                                    self._guardar_imagen(img_with_contour.convert('RGB'), output_path)
                                     
-                                    print(f"    ✓ Silueta aplicada a {img_name}")
+                                    logger.info(f"    ✓ Silueta aplicada a {img_name}")
                                     exitos += 1
                     
                 except Exception as e:
-                    print(f"    ⚠ Error aplicando silueta a {img_name}: {e}")
+                    logger.warning(f"    ⚠ Error aplicando silueta a {img_name}: {e}")
         
         return exitos > 0
     
     def crear_composicion_gml_intersecciones(self, referencia, bbox_wgs84, capas_interseccion=None):
         """Crea composiciones visuales del GML con capas de intersección"""
         if not PILLOW_AVAILABLE:
-            print("  ⚠ Pillow no disponible, no se pueden crear composiciones")
+            logger.warning("  ⚠ Pillow no disponible, no se pueden crear composiciones")
             return False
         
         ref = self.limpiar_referencia(referencia)
         gml_file = self.output_dir / f"{ref}_parcela.gml"
         
         if not gml_file.exists():
-            print("  ⚠ No existe GML de parcela")
+            logger.warning("  ⚠ No existe GML de parcela")
             return False
         
         coords_poligono = self.extraer_coordenadas_gml(str(gml_file))
         if not coords_poligono:
-            print("  ⚠ No se pudieron extraer coordenadas del GML")
+            logger.warning("  ⚠ No se pudieron extraer coordenadas del GML")
             return False
         
         # Si no se proporcionan capas, buscar automáticamente
@@ -1371,10 +1788,10 @@ class CatastroDownloader:
             capas_interseccion = self._buscar_capas_interseccion(ref)
         
         if not capas_interseccion:
-            print("  ⚠ No se encontraron capas de intersección")
+            logger.warning("  ⚠ No se encontraron capas de intersección")
             return False
         
-        print(f"  🎨 Creando composiciones con {len(capas_interseccion)} capas...")
+        logger.info(f"  🎨 Creando composiciones con {len(capas_interseccion)} capas...")
         
         exitos = 0
         
@@ -1384,7 +1801,7 @@ class CatastroDownloader:
                 # Buscar imagen de la capa de intersección
                 imagen_capa = self._buscar_imagen_capa(ref, capa)
                 if not imagen_capa:
-                    print(f"    ⚠ No se encontró imagen para la capa: {capa}")
+                    logger.warning(f"    ⚠ No se encontró imagen para la capa: {capa}")
                     continue
                 
                 # Crear composición
@@ -1395,12 +1812,12 @@ class CatastroDownloader:
                 
                 if resultado:
                     exitos += 1
-                    print(f"    ✓ Composición creada: {capa}")
+                    logger.info(f"    ✓ Composición creada: {capa}")
                 
             except Exception as e:
-                print(f"    ⚠ Error creando composición con {capa}: {e}")
+                logger.warning(f"    ⚠ Error creando composición con {capa}: {e}")
         
-        print(f"  ✅ Composiciones creadas: {exitos}/{len(capas_interseccion)}")
+        logger.info(f"  ✅ Composiciones creadas: {exitos}/{len(capas_interseccion)}")
         return exitos > 0
     
     def _buscar_capas_interseccion(self, ref):
@@ -1423,7 +1840,7 @@ class CatastroDownloader:
                     capas_csv = df['capa'].unique().tolist()
                     capas_encontradas.extend(capas_csv)
             except Exception as e:
-                print(f"    ⚠ Error leyendo CSV de afecciones: {e}")
+                logger.warning(f"    ⚠ Error leyendo CSV de afecciones: {e}")
         
         return list(set(capas_encontradas))  # Eliminar duplicados
     
@@ -1451,6 +1868,8 @@ class CatastroDownloader:
     def _crear_composicion_individual(self, ref, coords_poligono, bbox_wgs84, imagen_capa, nombre_capa):
         """Crea una composición individual del GML con una capa específica con estilo mejorado"""
         try:
+            from PIL import Image, ImageDraw
+            
             # Abrir imagen de la capa
             with Image.open(imagen_capa) as img_capa:
                 # Convertir a RGBA si es necesario
@@ -1462,25 +1881,14 @@ class CatastroDownloader:
                 draw = ImageDraw.Draw(overlay)
                 
                 # Convertir coordenadas GML a píxeles
-                coords_bbox = [float(x) for x in bbox_wgs84.split(",")]
-                minx, miny, maxx, maxy = coords_bbox
+                minx, miny, maxx, maxy = self._bbox_wms(bbox_wgs84)['tuple']
                 width, height = img_capa.size
                 
-                pixels = []
-                for coord in coords_poligono:
-                    for ring_coord in coord if isinstance(coord[0], (list, tuple)) else [coord]:
-                        if self._es_latitud(ring_coord[0]):
-                            lat, lon = ring_coord[0], ring_coord[1]
-                        else:
-                            lon, lat = ring_coord[0], ring_coord[1]
-                        
-                        x = int(((lon - minx) / (maxx - minx)) * width)
-                        y = int(((maxy - lat) / (maxy - miny)) * height)
-                        pixels.append((x, y))
+                pixels = self._a_pixeles(coords_poligono, (minx, miny, maxx, maxy), (width, height))
                 
                 # Dibujar GML con estilo destacado y profesional
-                if len(pixels) > 2:
-                    fill_pixels = pixels + [pixels[0]]
+                if len(pixels) >= 8:
+                    fill_pixels = pixels
                     
                     # 1. Relleno semitransparente para mejor visibilidad
                     try:
@@ -1555,7 +1963,7 @@ class CatastroDownloader:
                     overlay = Image.alpha_composite(overlay, text_overlay)
                     
                 except Exception as text_e:
-                    print(f"      ⚠ Error añadiendo texto/leyenda: {text_e}")
+                    logger.warning(f"      ⚠ Error añadiendo texto/leyenda: {text_e}")
                 
                 # Combinar imágenes
                 composicion = Image.alpha_composite(img_capa, overlay)
@@ -1592,12 +2000,12 @@ class CatastroDownloader:
                     composicion_con_wm.convert('RGB').save(comp_file, quality=95)
                     
                 except Exception as wm_e:
-                    print(f"      ⚠ Error añadiendo marca de agua: {wm_e}")
+                    logger.warning(f"      ⚠ Error añadiendo marca de agua: {wm_e}")
                 
                 return True
                 
         except Exception as e:
-            print(f"      ⚠ Error en composición individual: {e}")
+            logger.warning(f"      ⚠ Error en composición individual: {e}")
             return False
     
     def crear_zip_referencia(self, referencia, directorio_base):
@@ -1611,18 +2019,14 @@ class CatastroDownloader:
         zip_file = Path(directorio_base) / f"{ref}_completo.zip"
         
         try:
-            with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for archivo in dir_referencia.rglob('*'):
-                    if archivo.is_file():
-                        arcname = archivo.relative_to(directorio_base)
-                        zipf.write(archivo, arcname)
+            _escribir_zip(zip_file, _iterar_archivos(dir_referencia), directorio_base)
             
             tamaño_mb = zip_file.stat().st_size / (1024 * 1024)
-            print(f"  ✓ ZIP creado: {zip_file.name} ({tamaño_mb:.1f} MB)")
+            logger.info(f"  ✓ ZIP creado: {zip_file.name} ({tamaño_mb:.1f} MB)")
             return str(zip_file)
         
         except Exception as e:
-            print(f"  ✗ Error creando ZIP: {e}")
+            logger.error(f"  ✗ Error creando ZIP: {e}")
             return None
     
     def _mostrar_resumen(self, resultados):
@@ -1666,6 +2070,32 @@ class CatastroDownloader:
         print(f"{'='*60}")
 
 
+# Descargadores compartidos por directorio de salida: reutilizan sesión HTTP,
+# pool de conexiones y pool de hilos entre llamadas
+_DESCARGADORES = {}
+_DESCARGADORES_LOCK = threading.Lock()
+
+
+def _obtener_descargador(output_dir, max_workers=8):
+    """Devuelve el CatastroDownloader compartido para (output_dir, max_workers), creándolo la primera vez"""
+    clave = (str(Path(output_dir).resolve()), max_workers)
+    with _DESCARGADORES_LOCK:
+        if clave not in _DESCARGADORES:
+            _DESCARGADORES[clave] = CatastroDownloader(output_dir=output_dir, max_workers=max_workers)
+        return _DESCARGADORES[clave]
+
+
+def _workers_lote():
+    """
+    Hilos para un lote: LOTE_WORKERS del entorno o, por defecto, 4 por CPU (máx. 32).
+    Cada referencia pasa la mayor parte del tiempo esperando a los servidores WMS/WFS.
+    """
+    try:
+        return max(1, int(os.environ["LOTE_WORKERS"]))
+    except (KeyError, ValueError):
+        return min(32, (os.cpu_count() or 4) * 4)
+
+
 def procesar_y_comprimir(referencia, directorio_base="descargas_catastro",
                          organize_by_type=False, generate_pdf=True,
                          template_html=None, css_path=None,
@@ -1692,8 +2122,9 @@ def procesar_y_comprimir(referencia, directorio_base="descargas_catastro",
             for subdir in subdirs:
                 (Path(directorio_base) / subdir).mkdir(exist_ok=True, parents=True)
         
-        # Crear descargador
-        downloader = CatastroDownloader(output_dir=directorio_base)
+        # Descargador compartido; copia superficial porque descargar_todo
+        # cambia output_dir mientras trabaja
+        downloader = copy.copy(_obtener_descargador(directorio_base))
         
         # Procesar referencia
         resultados = downloader.descargar_todo(
@@ -1706,14 +2137,14 @@ def procesar_y_comprimir(referencia, directorio_base="descargas_catastro",
         zip_path = resultados.get('zip_path')
         
         if zip_path:
-            print(f"\n✅ Proceso completado: {referencia}")
-            print(f"📁 Archivos en: {directorio_base}/{referencia}")
-            print(f"📦 ZIP: {zip_path}")
+            logger.info(f"\n✅ Proceso completado: {referencia}")
+            logger.info(f"📁 Archivos en: {directorio_base}/{referencia}")
+            logger.info(f"📦 ZIP: {zip_path}")
         
         return zip_path, resultados
     
     except Exception as e:
-        print(f"❌ Error en procesar_y_comprimir: {e}")
+        logger.error(f"❌ Error en procesar_y_comprimir: {e}")
         import traceback
         traceback.print_exc()
         return None
@@ -1722,7 +2153,7 @@ def procesar_y_comprimir(referencia, directorio_base="descargas_catastro",
 def procesar_lista_y_comprimir(lista_referencias, directorio_base="descargas_catastro",
                                organize_by_type=False, generate_pdf=True,
                                template_html=None, css_path=None,
-                               descargar_afecciones=True):
+                               descargar_afecciones=True, max_workers=None):
     """
     Procesa múltiples referencias.
     
@@ -1734,26 +2165,27 @@ def procesar_lista_y_comprimir(lista_referencias, directorio_base="descargas_cat
         template_html: Plantilla HTML
         css_path: Hoja de estilos
         descargar_afecciones: Descargar afecciones
+        max_workers: Referencias simultáneas (por defecto, LOTE_WORKERS o según CPUs)
     
     Returns:
         Ruta del ZIP de lote
     """
     try:
-        print(f"\n📋 Iniciando procesamiento de lote ({len(lista_referencias)} referencias)")
+        logger.info(f"\n📋 Iniciando procesamiento de lote ({len(lista_referencias)} referencias)")
         
         # Crear directorio base
         Path(directorio_base).mkdir(exist_ok=True)
         
-        # Crear descargador
-        downloader = CatastroDownloader(
-            output_dir=directorio_base,
-            max_workers=min(4, len(lista_referencias))
-        )
+        # Descargador compartido (descargar_paralelo ya trabaja con copias)
+        downloader = _obtener_descargador(directorio_base, max_workers or _workers_lote())
         
         # Función de callback para mostrar progreso
         def callback_progreso(actual, total, ref, resultado):
             porcentaje = (actual / total) * 100
-            print(f"  [{actual}/{total}] {ref} - {'✅' if resultado.get('exitosa') else '❌'}")
+            if resultado.get('exitosa'):
+                logger.info(f"  [{actual}/{total}] {ref} - ✅")
+            else:
+                logger.warning(f"  [{actual}/{total}] {ref} - ❌")
         
         # Procesar en paralelo
         resultados = downloader.descargar_paralelo(
@@ -1765,28 +2197,25 @@ def procesar_lista_y_comprimir(lista_referencias, directorio_base="descargas_cat
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         zip_lote = Path(directorio_base) / f"lote_{timestamp}_{len(lista_referencias)}_refs.zip"
         
-        with zipfile.ZipFile(zip_lote, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for ref, resultado in resultados:
-                if resultado.get('exitosa'):
-                    dir_ref = Path(directorio_base) / ref
-                    if dir_ref.exists():
-                        for archivo in dir_ref.rglob('*'):
-                            if archivo.is_file():
-                                arcname = archivo.relative_to(directorio_base)
-                                zipf.write(archivo, arcname)
+        archivos = (
+            archivo
+            for ref, resultado in resultados if resultado.get('exitosa')
+            for archivo in _iterar_archivos(Path(directorio_base) / ref)
+        )
+        _escribir_zip(zip_lote, archivos, directorio_base)
         
         tamaño_mb = zip_lote.stat().st_size / (1024 * 1024)
-        print(f"\n✅ Lote completado")
-        print(f"📦 ZIP de lote: {zip_lote.name} ({tamaño_mb:.1f} MB)")
+        logger.info(f"\n✅ Lote completado")
+        logger.info(f"📦 ZIP de lote: {zip_lote.name} ({tamaño_mb:.1f} MB)")
         
         # Resumen
         exitosas = sum(1 for _, r in resultados if r.get('exitosa'))
-        print(f"📊 Resultados: {exitosas}/{len(lista_referencias)} exitosas")
+        logger.info(f"📊 Resultados: {exitosas}/{len(lista_referencias)} exitosas")
         
         return str(zip_lote)
     
     except Exception as e:
-        print(f"❌ Error en procesar_lista_y_comprimir: {e}")
+        logger.error(f"❌ Error en procesar_lista_y_comprimir: {e}")
         import traceback
         traceback.print_exc()
         return None
@@ -1794,6 +2223,7 @@ def procesar_lista_y_comprimir(lista_referencias, directorio_base="descargas_cat
 
 # Ejemplo de uso
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("=" * 60)
     print("DESCARGADOR CATASTRAL OPTIMIZADO v2.0")
     print("=" * 60)
@@ -1806,6 +2236,8 @@ if __name__ == "__main__":
     parser.add_argument('--archivo', help='Archivo con lista de referencias')
     parser.add_argument('--output', help='Directorio de salida', default='descargas_catastro')
     parser.add_argument('--cache', help='Horas de cache HTTP', type=int, default=1)
+    parser.add_argument('--workers', help='Referencias simultáneas en lotes (por defecto LOTE_WORKERS o según CPUs)',
+                        type=int, default=None)
     
     args = parser.parse_args()
     
@@ -1827,7 +2259,8 @@ if __name__ == "__main__":
         if referencias:
             zip_lote = procesar_lista_y_comprimir(
                 lista_referencias=referencias,
-                directorio_base=args.output
+                directorio_base=args.output,
+                max_workers=args.workers
             )
             
             if zip_lote:
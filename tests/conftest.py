@@ -0,0 +1,17 @@
+"""
+Configuración de pytest para la carpeta tests/.
+
+Los scripts de diagnóstico (debug_*, test_descarga, test_afecciones_api...) se
+ejecutan a mano con python y necesitan red o servidor en marcha, así que no se
+recogen como pruebas; pytest solo ejecuta las pruebas unitarias.
+"""
+
+collect_ignore = [
+    "debug_layers.py",
+    "debug_parsing.py",
+    "test_afecciones_api.py",
+    "test_db_gis.py",
+    "test_descarga.py",
+    "test_mapama_integration.py",
+    "test_sintaxis.py",
+]
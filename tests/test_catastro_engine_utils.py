@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Pruebas unitarias de las utilidades de src/core/catastro_engine.py.
+Se omiten si faltan las dependencias del motor (requests, numpy...).
+"""
+
+import zipfile
+
+import pytest
+
+np = pytest.importorskip("numpy")
+engine = pytest.importorskip("src.core.catastro_engine")
+
+GML = f"""<?xml version="1.0" encoding="UTF-8"?>
+<FeatureCollection xmlns:gml="{engine.GML_NS}">
+  <member>
+    <gml:Point><gml:pos>40.4165 -3.7035</gml:pos></gml:Point>
+    <gml:LinearRing>
+      <gml:posList>40.0 -3.0 40.0 -3.1 40.1 -3.1 40.0 -3.0</gml:posList>
+    </gml:LinearRing>
+    <gml:LinearRing><gml:posList></gml:posList></gml:LinearRing>
+  </member>
+</FeatureCollection>
+"""
+
+
+@pytest.fixture
+def gml_file(tmp_path):
+    ruta = tmp_path / "parcela.gml"
+    ruta.write_text(GML, encoding="utf-8")
+    return ruta
+
+
+def test_textos_gml(gml_file):
+    textos = list(engine._textos_gml(gml_file, ("pos", "posList")))
+
+    # En orden de documento y sin los elementos vacíos
+    assert textos == [
+        ("pos", "40.4165 -3.7035"),
+        ("posList", "40.0 -3.0 40.0 -3.1 40.1 -3.1 40.0 -3.0"),
+    ]
+
+
+def test_textos_gml_filtra_etiquetas(gml_file):
+    assert [e for e, _ in engine._textos_gml(gml_file, ("posList",))] == ["posList"]
+
+
+def test_pares():
+    pares = engine._pares("40.0 -3.0 40.0 -3.1\n 40.1 -3.1")
+    assert pares.shape == (3, 2)
+    np.testing.assert_array_equal(pares[-1], [40.1, -3.1])
+
+
+def test_pares_descarta_valor_suelto():
+    assert engine._pares("1 2 3").tolist() == [[1.0, 2.0]]
+
+
+def test_pares_texto_no_numerico():
+    with pytest.raises(ValueError):
+        engine._pares("40.0 -3.0 <html>")
+
+
+@pytest.fixture
+def downloader():
+    # Sin __init__: los métodos probados no usan la sesión HTTP ni la caché
+    return object.__new__(engine.CatastroDownloader)
+
+
+def test_lon_lat_invierte_si_empieza_por_latitud(downloader):
+    coords = downloader._lon_lat([(40.41, -3.70), (40.42, -3.71)])
+    np.testing.assert_array_equal(coords, [[-3.70, 40.41], [-3.71, 40.42]])
+
+
+def test_lon_lat_respeta_orden_lon_lat(downloader):
+    coords = downloader._lon_lat([(-3.70, 40.41), (-3.71, 40.42)])
+    np.testing.assert_array_equal(coords, [[-3.70, 40.41], [-3.71, 40.42]])
+
+
+def test_lon_lat_aplana_anillos(downloader):
+    coords = downloader._lon_lat([[(40.0, -3.0), (40.1, -3.1)], [(40.2, -3.2)]])
+    assert coords.shape == (3, 2)
+    np.testing.assert_array_equal(coords[:, 0], [-3.0, -3.1, -3.2])
+
+
+def test_bbox_wms_desde_tupla_y_cadena():
+    esperado = {
+        'wms11': "-3.71,40.41,-3.7,40.42",
+        'wms13': "40.41,-3.71,40.42,-3.7",
+        'tuple': (-3.71, 40.41, -3.7, 40.42),
+    }
+    assert engine.CatastroDownloader._bbox_wms((-3.71, 40.41, -3.7, 40.42)) == esperado
+    assert engine.CatastroDownloader._bbox_wms("-3.71,40.41,-3.7,40.42") == esperado
+
+
+def test_bbox_wms_dict_ya_normalizado():
+    bbox = engine.CatastroDownloader._bbox_wms((0, 1, 2, 3))
+    assert engine.CatastroDownloader._bbox_wms(bbox) is bbox
+
+
+@pytest.fixture
+def archivos_ref(tmp_path):
+    ref = tmp_path / "1234567AB1234A0001XY"
+    ref.mkdir()
+    (ref / "parcela.gml").write_text(GML * 50, encoding="utf-8")
+    (ref / "plano.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(2000))
+    return sorted(str(p) for p in ref.iterdir())
+
+
+def _comprobar_zip(zip_file):
+    with zipfile.ZipFile(zip_file) as zipf:
+        assert zipf.testzip() is None
+        entradas = {info.filename: info for info in zipf.infolist()}
+        assert sorted(entradas) == [
+            "1234567AB1234A0001XY/parcela.gml",
+            "1234567AB1234A0001XY/plano.png",
+        ]
+        assert entradas["1234567AB1234A0001XY/parcela.gml"].compress_type == zipfile.ZIP_DEFLATED
+        assert entradas["1234567AB1234A0001XY/plano.png"].compress_type == zipfile.ZIP_STORED
+        assert zipf.read("1234567AB1234A0001XY/parcela.gml").decode("utf-8") == GML * 50
+
+
+def test_escribir_zip_zlib(tmp_path, archivos_ref, monkeypatch):
+    monkeypatch.setattr(engine, "ZipFile", zipfile.ZipFile)
+    engine._escribir_zip(tmp_path / "lote.zip", archivos_ref, tmp_path)
+    _comprobar_zip(tmp_path / "lote.zip")
+
+
+def test_escribir_zip_isal(tmp_path, archivos_ref, monkeypatch):
+    isal_zlib = pytest.importorskip("isal.isal_zlib")
+    assert engine.ISAL_AVAILABLE and engine.ZipFile is engine._ZipFileIsal
+
+    # Solo la entrada DEFLATE pasa por el compresor de ISA-L
+    llamadas = []
+    compressobj = isal_zlib.compressobj
+
+    def espia(*args):
+        llamadas.append(args)
+        return compressobj(*args)
+
+    monkeypatch.setattr(isal_zlib, "compressobj", espia)
+    engine._escribir_zip(tmp_path / "lote.zip", archivos_ref, tmp_path)
+
+    assert len(llamadas) == 1
+    _comprobar_zip(tmp_path / "lote.zip")
+
+
+def test_escribir_zip_detecta_cabecera(tmp_path):
+    """Sin extensión conocida, la entrada se guarda sin comprimir si la cabecera es de JPEG"""
+    foto = tmp_path / "foto"
+    foto.write_bytes(b"\xff\xd8\xff\xe0" + bytes(2000))
+    texto = tmp_path / "datos"
+    texto.write_bytes(bytes(2000))
+
+    engine._escribir_zip(tmp_path / "lote.zip", [str(foto), str(texto)], tmp_path)
+
+    with zipfile.ZipFile(tmp_path / "lote.zip") as zipf:
+        assert zipf.getinfo("foto").compress_type == zipfile.ZIP_STORED
+        assert zipf.getinfo("datos").compress_type == zipfile.ZIP_DEFLATED
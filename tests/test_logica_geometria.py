@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Pruebas unitarias de las utilidades geométricas de backend/services/logica.py.
+Se omiten si faltan las dependencias GIS.
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+gpd = pytest.importorskip("geopandas")
+shapely = pytest.importorskip("shapely")
+logica = pytest.importorskip("backend.services.logica")
+
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Polygon, box
+
+
+EXTERIOR = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+HUECO = [(4, 4), (6, 4), (6, 6), (4, 6), (4, 4)]
+
+
+def test_anillos_exterior_e_interiores():
+    """Cada anillo (exterior y huecos) sale como un array (n, 2) independiente"""
+    anillos = logica._anillos(gpd.GeoSeries([Polygon(EXTERIOR, [HUECO])]))
+
+    assert len(anillos) == 2
+    np.testing.assert_array_equal(anillos[0], EXTERIOR)
+    np.testing.assert_array_equal(anillos[1], HUECO)
+
+
+def test_anillos_multipoligono():
+    multi = MultiPolygon([box(0, 0, 1, 1), box(2, 2, 3, 3)])
+    anillos = logica._anillos(gpd.GeoSeries([multi, box(5, 5, 6, 6)]))
+
+    assert len(anillos) == 3
+    assert all(anillo.shape == (5, 2) for anillo in anillos)
+    np.testing.assert_array_equal(anillos[2].min(axis=0), [5, 5])
+
+
+def test_anillos_vacio():
+    assert logica._anillos(gpd.GeoSeries([])) == []
+
+
+def _area_con_signo(anillo):
+    x, y = np.asarray(anillo).T
+    return (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def test_rellenos_orientan_los_huecos():
+    """Exterior antihorario y hueco horario (regla nonzero), sea cual sea la orientación de entrada"""
+    horario = Polygon(EXTERIOR[::-1], [HUECO[::-1]])
+    trayectos = logica._rellenos(gpd.GeoSeries([Polygon(EXTERIOR, [HUECO]), horario]))
+
+    assert len(trayectos) == 2
+    for trayecto in trayectos:
+        exterior, hueco = trayecto.to_polygons()
+        assert _area_con_signo(exterior) == pytest.approx(100)
+        assert _area_con_signo(hueco) == pytest.approx(-4)
+
+
+def test_rellenos_separa_multipoligonos():
+    multi = MultiPolygon([box(0, 0, 1, 1), box(2, 2, 3, 3)])
+    assert len(logica._rellenos(gpd.GeoSeries([multi, box(5, 5, 6, 6)]))) == 3
+
+
+def test_trazos_lineas_y_multilineas():
+    """Cada parte de una multilínea es un trazo con el índice de su registro"""
+    geoms = [
+        LineString([(0, 0), (1, 1)]),
+        MultiLineString([[(2, 2), (3, 3)], [(4, 4), (5, 5), (6, 6)]]),
+    ]
+    trazos, origen = logica._trazos(geoms)
+
+    assert len(trazos) == 3
+    assert origen.tolist() == [0, 1, 1]
+    np.testing.assert_array_equal(trazos[0], [[0, 0], [1, 1]])
+    np.testing.assert_array_equal(trazos[2], [[4, 4], [5, 5], [6, 6]])
+
+
+def test_trazos_poligono_con_hueco():
+    """De un polígono se toma el contorno: anillo exterior e interior por separado"""
+    trazos, origen = logica._trazos([box(20, 20, 21, 21), Polygon(EXTERIOR, [HUECO])])
+
+    assert origen.tolist() == [0, 1, 1]
+    np.testing.assert_array_equal(trazos[1], EXTERIOR)
+    np.testing.assert_array_equal(trazos[2], HUECO)
+
+
+def test_trazos_vacio():
+    trazos, origen = logica._trazos(gpd.GeoSeries([]))
+    assert trazos == []
+    assert origen.size == 0
+
+
+def test_trazos_igual_que_anillos_en_poligonos():
+    geoms = gpd.GeoSeries([box(0, 0, 1, 1), Polygon(EXTERIOR, [HUECO])])
+    trazos, _ = logica._trazos(geoms)
+    anillos = logica._anillos(geoms)
+    assert len(trazos) == len(anillos) == 3
+    for trazo, anillo in zip(trazos, anillos):
+        np.testing.assert_array_equal(trazo, anillo)
+
+
+@pytest.fixture
+def kml():
+    pytest.importorskip("pyproj")
+    # Parcela de ~100 m x 100 m cerca de Madrid
+    gdf = gpd.GeoDataFrame(geometry=[box(-3.7040, 40.4160, -3.7028, 40.4169)], crs="EPSG:4326")
+    return logica.KMLProyectado(
+        gdf=gdf,
+        gdf_3857=gdf.to_crs(epsg=3857),
+        gdf_25830=gdf.to_crs(epsg=25830),
+    )
+
+
+def test_kml_proyectado_limites_por_epsg(kml):
+    assert kml.get_bounds(4326) == pytest.approx((-3.7040, 40.4160, -3.7028, 40.4169))
+
+    # Web Mercator: x = R·lon (radianes)
+    minx, miny, maxx, maxy = kml.get_bounds(3857)
+    assert minx == pytest.approx(6378137 * np.radians(-3.7040), abs=0.01)
+    assert maxx == pytest.approx(6378137 * np.radians(-3.7028), abs=0.01)
+    assert miny < maxy
+
+    # UTM 30N: la parcela mide unos 100 m de lado
+    minx, miny, maxx, maxy = kml.get_bounds(25830)
+    assert 400000 < minx < 500000
+    assert maxx - minx == pytest.approx(102, abs=3)
+    assert maxy - miny == pytest.approx(100, abs=2)
+
+
+def test_kml_proyectado_centros(kml):
+    for epsg in (4326, 3857, 25830):
+        minx, miny, maxx, maxy = kml.get_bounds(epsg)
+        assert kml.get_centro(epsg) == pytest.approx(((minx + maxx) / 2, (miny + maxy) / 2))
+
+    # Una sola parcela rectangular: el centroide coincide con el centro del encuadre
+    assert kml.centroide_3857 == pytest.approx(kml.get_centro(3857), abs=1.0)
+
+
+def test_kml_proyectado_epsg_desconocido(kml):
+    with pytest.raises(KeyError):
+        kml.get_bounds(4258)